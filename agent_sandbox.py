@@ -0,0 +1,312 @@
+"""agent_sandbox.py
+
+Champlain College CSI-480, Fall 2017
+The following code was adapted by Joshua Auerbach (jauerbach@champlain.edu)
+from the UC Berkeley Pacman Projects (see license and attribution below).
+
+----------------------
+Licensing Information:  You are free to use or extend these projects for
+educational purposes provided that (1) you do not distribute or publish
+solutions, (2) you retain this notice, and (3) you provide clear
+attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+
+Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+The core projects and autograders were primarily created by John DeNero
+(denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+Student side autograding was added by Brad Miller, Nick Hay, and
+Pieter Abbeel (pabbeel@cs.berkeley.edu).
+"""
+
+"""
+Runs capture teams in worker processes of their own.
+
+A SandboxedAgent stands in for one agent of a team.  The team module is
+loaded in a worker process (a TeamWorker), which keeps both of the team's
+agents, so that whatever they share stays shared, and answers calls over
+a pipe.  The game sends the full GameState (and its food count for
+capture.TOTAL_FOOD) once, to register_initial_state, and after that only
+a compact tuple of what changes during a game (see compact_state), which
+the worker turns back into a GameState on the layout it already has.
+
+Each call is timed in the game's process with time.perf_counter and waits
+on the pipe for at most the time left, so move limits are enforced to well
+under a millisecond without signals.  That also means games with sandboxed
+agents can run in any thread.  An agent that runs out of time has its
+team's worker stopped, since its game is lost anyway.
+
+Observations are made in the game's process with make_observation, as
+CaptureAgent.observation_function does, so the sonar noise comes from the
+game's random numbers.  A team that overrides observation_function has it
+run in the worker instead, where the observation is kept for the
+get_action that follows.  Each worker seeds its own random numbers from
+the game's, which makes a game with sandboxed agents repeatable, but not
+the same game as with the agents in the game's process.
+
+Example:
+python capture.py -r my_team -b baseline_team --sandbox -c
+"""
+
+import multiprocessing
+import random
+import sys
+import time
+import traceback
+
+import capture
+from game import BitGrid, Configuration, grid_bits
+from util import TimeoutFunctionException
+
+
+def compact_state(state):
+    """
+    Returns the parts of a capture GameState that change during a game, as
+    a tuple of plain values that pickles small: no layout, teams or agent
+    start positions.
+    """
+    data = state.data
+    agents = []
+    for agent_state in data.agent_states:
+        configuration = agent_state.configuration
+        if configuration == None:
+            position = direction = None
+        else:
+            position, direction = configuration.pos, configuration.direction
+        agents.append((position, direction, agent_state.is_pacman, agent_state.scared_timer,
+                       agent_state.num_carrying, agent_state.num_returned))
+    return (tuple(agents), grid_bits(data.food), tuple(data.capsules), data.score, data.timeleft,
+            data._win, data._lose, data._food_eaten, data._food_added, data._capsule_eaten,
+            data._agent_moved, list(state.agent_distances))
+
+
+def expand_state(compact, template):
+    """
+    Returns the GameState described by compact_state on the layout and
+    teams of template (a state of the same game).
+    """
+    (agents, food_bits, capsules, score, timeleft, win, lose, food_eaten, food_added,
+     capsule_eaten, agent_moved, agent_distances) = compact
+    state = capture.GameState(template)
+    data = state.data
+    food = BitGrid(template.data.food.width, template.data.food.height)
+    food.bits = food_bits
+    data.food = food
+    data.capsules = list(capsules)
+    for index, (position, direction, is_pacman, scared_timer, num_carrying, num_returned) in enumerate(agents):
+        agent_state = data.get_mutable_agent_state(index)
+        if position == None:
+            agent_state.configuration = None
+        else:
+            agent_state.configuration = Configuration(position, direction)
+        agent_state.is_pacman = is_pacman
+        agent_state.scared_timer = scared_timer
+        agent_state.num_carrying = num_carrying
+        agent_state.num_returned = num_returned
+    data.score = score
+    data.timeleft = timeleft
+    data._win = win
+    data._lose = lose
+    data._food_eaten = food_eaten
+    data._food_added = food_added
+    data._capsule_eaten = capsule_eaten
+    data._agent_moved = agent_moved
+    state.agent_distances = agent_distances
+    return state
+
+
+def run_worker(connection, is_red, factory, agent_args, seed, module_name):
+    """
+    The loop of a worker process: loads the team, keeps both of its
+    agents, and answers (agent position, method name, argument) messages
+    with ('ok', result) or ('error', traceback text) until it gets None.
+    """
+    random.seed(seed)
+    try:
+        agents = capture.load_agents(is_red, factory, True, agent_args, module_name)
+        if None in agents:
+            raise Exception('The team "' + factory + '" could not be loaded')
+    except Exception:
+        connection.send(('error', traceback.format_exc()))
+        return
+    # which agents have an observation_function of their own to run here
+    own_observations = [('observation_function' in dir(agent) and
+                         not getattr(agent.observation_function, 'copies_state', False)) for agent in agents]
+    connection.send(('ok', own_observations))
+
+    template = None
+    observations = [None] * len(agents)
+    while True:
+        message = connection.recv()
+        if message == None:
+            break
+        position, name, argument = message
+        agent = agents[position]
+        try:
+            if name == 'register_initial_state':
+                template, total_food = argument
+                # the state may come from capture run as __main__ as well
+                for module in set([capture, sys.modules[type(template).__module__]]):
+                    module.TOTAL_FOOD = total_food
+                result = agent.register_initial_state(template)
+            elif name == 'observation_function':
+                # kept here, for the get_action that follows
+                observations[position] = agent.observation_function(expand_state(argument, template))
+                result = None
+            elif argument == None:
+                result = getattr(agent, name)(observations[position])
+            else:
+                result = getattr(agent, name)(expand_state(argument, template))
+            connection.send(('ok', result))
+        except Exception:
+            connection.send(('error', traceback.format_exc()))
+    connection.close()
+
+
+class TeamWorker:
+    """
+    The worker process that runs both agents of a team, so that anything
+    the team module shares between its agents stays shared.
+    """
+
+    def __init__(self, is_red, factory, agent_args, module_name=None):
+        if module_name == None:
+            module_name = 'player' + str(int(is_red))
+        self.factory = factory
+        self.connection, worker_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=run_worker,
+                                               args=(worker_connection, is_red, factory, agent_args,
+                                                     random.randrange(2 ** 32), module_name))
+        self.process.daemon = True
+        self.process.start()
+        worker_connection.close()
+        status, result = self.connection.recv()
+        if status == 'error':
+            self.close()
+            raise Exception('The team "%s" failed to load in its worker process:\n%s' % (factory, result))
+        self.own_observations = result
+
+    def call(self, position, name, argument, timeout=None):
+        """
+        Calls method name of the agent at position in the team with
+        argument and returns its result, raising TimeoutFunctionException
+        (and stopping the worker) if it takes longer than timeout seconds.
+        """
+        if self.process == None:
+            raise Exception('The team "%s" has no worker process' % self.factory)
+        start_time = time.perf_counter()
+        self.connection.send((position, name, argument))
+        if timeout != None:
+            remaining = timeout - (time.perf_counter() - start_time)
+            if remaining <= 0 or not self.connection.poll(remaining):
+                self.close()
+                raise TimeoutFunctionException()
+        status, result = self.connection.recv()
+        if status == 'error':
+            raise Exception('The team "%s" raised an exception in its worker process:\n%s' % (self.factory, result))
+        return result
+
+    def close(self):
+        "Stops the worker process"
+        if self.process == None:
+            return
+        try:
+            self.connection.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(0.1)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+        self.process = None
+
+
+class RemoteObservation:
+    """
+    Stands in for an observation that a team's own observation_function
+    made, and that is kept in its worker process.
+    """
+    pass
+
+
+class SandboxedAgent:
+    """
+    One agent of a team, running in its team's TeamWorker.  Game calls
+    register_initial_state, observation_function, get_action and final as
+    on any agent, or call_with_timeout to have them timed here.
+    """
+
+    def __init__(self, index, worker, position):
+        self.index = index
+        self.worker = worker
+        self.position = position
+        # time taken by the last call, in seconds
+        self.last_call_time = 0
+
+    def call_with_timeout(self, name, timeout, state):
+        """
+        Calls the agent's method name with state in the worker and returns
+        its result, raising TimeoutFunctionException if it takes longer
+        than timeout seconds (None waits for as long as it takes).
+        """
+        start_time = time.perf_counter()
+        try:
+            if name == 'observation_function':
+                return self.observe(state, timeout)
+            if name == 'register_initial_state':
+                argument = (state, state.data.layout.total_food)
+            elif isinstance(state, RemoteObservation):
+                argument = None
+            else:
+                argument = compact_state(state)
+            return self.worker.call(self.position, name, argument, timeout)
+        finally:
+            self.last_call_time = time.perf_counter() - start_time
+
+    def observe(self, game_state, timeout=None):
+        """
+        Makes the agent's observation of game_state: here, as
+        CaptureAgent.observation_function does, unless the team has an
+        observation_function of its own, which then runs in the worker.
+        """
+        if not self.worker.own_observations[self.position]:
+            return game_state.make_observation(self.index)
+        self.worker.call(self.position, 'observation_function', compact_state(game_state), timeout)
+        return RemoteObservation()
+
+    def register_initial_state(self, game_state):
+        return self.call_with_timeout('register_initial_state', None, game_state)
+
+    def observation_function(self, game_state):
+        return self.call_with_timeout('observation_function', None, game_state)
+    # the game's state is only read, to make an observation or a compact copy
+    observation_function.copies_state = True
+
+    def get_action(self, game_state):
+        return self.call_with_timeout('get_action', None, game_state)
+
+    def final(self, game_state):
+        return self.call_with_timeout('final', None, game_state)
+
+    def close(self):
+        "Stops the worker process of the agent's team"
+        self.worker.close()
+
+
+def load_agents(is_red, factory, cmd_line_args, module_name=None):
+    """
+    Like capture.load_agents, but returns SandboxedAgents, with the team
+    loaded in a worker process of its own.
+    """
+    index_addend = 0
+    if not is_red:
+        index_addend = 1
+    print("Loading Team in a worker process:", factory)
+    worker = TeamWorker(is_red, factory, cmd_line_args, module_name)
+    return [SandboxedAgent(2 * position + index_addend, worker, position) for position in range(2)]
+
+
+def close_agents(agents):
+    "Stops the worker processes of any SandboxedAgents in agents"
+    for agent in agents:
+        if isinstance(agent, SandboxedAgent):
+            agent.close()
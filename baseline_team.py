@@ -56,7 +56,17 @@ def create_team(first_index, second_index, is_red,
 class ReflexCaptureAgent(CaptureAgent):
     """
     A base class for reflex agents that chooses score-maximizing actions
+
+    Each agent class lists its features in a util.FeatureSchema, writes
+    them by slot in fill_features and gives its weights in the weights
+    attribute, so that all of the legal actions can be scored together by
+    evaluate_actions.  A subclass that overrides evaluate, get_features or
+    get_weights instead (say for weights that depend on the action) is
+    scored one action at a time with its own evaluate.
     """
+    feature_schema = util.register_feature_schema('baseline_team.ReflexCaptureAgent', ['successor_score'])
+    SUCCESSOR_SCORE = feature_schema.slot('successor_score')
+    weights = {'successor_score': 1.0}
 
     def register_initial_state(self, game_state):
         self.start = game_state.get_agent_position(self.index)
@@ -70,7 +80,7 @@ class ReflexCaptureAgent(CaptureAgent):
 
         # You can profile your evaluation time by uncommenting these lines
         # start = time.time()
-        values = [self.evaluate(game_state, a) for a in actions]
+        values = self.evaluate_actions(game_state, actions)
         # print 'eval time for agent %d: %.4f' % (self.index, time.time() - start)
 
         max_value = max(values)
@@ -111,21 +121,45 @@ class ReflexCaptureAgent(CaptureAgent):
         weights = self.get_weights(game_state, action)
         return features * weights
 
+    def evaluate_actions(self, game_state, actions):
+        """
+        Returns evaluate(game_state, action) for every action, computed as
+        one product of a matrix of features (a row per action) with the
+        weights.
+        """
+        agent_class = type(self)
+        if (agent_class.evaluate is not ReflexCaptureAgent.evaluate or
+                agent_class.get_features is not ReflexCaptureAgent.get_features or
+                agent_class.get_weights is not ReflexCaptureAgent.get_weights):
+            # a subclass that scores actions its own way
+            return [self.evaluate(game_state, a) for a in actions]
+        fill = lambda row, action: self.fill_features(row, game_state, action)
+        return self.feature_schema.evaluate_all(fill, actions, self.weights)
+
     def get_features(self, game_state, action):
         """
-        Returns a counter of features for the state
+        Returns a util.FeatureVector of features for the state
+        """
+        row = [0] * len(self.feature_schema.names)
+        self.fill_features(row, game_state, action)
+        return self.feature_schema.vector(row)
+
+    def fill_features(self, row, game_state, action):
+        """
+        Writes the features for taking action into row, at the slots of
+        self.feature_schema (row starts out all zeros)
         """
-        features = util.Counter()
         successor = self.get_successor(game_state, action)
-        features['successor_score'] = self.get_score(successor)
-        return features
+        row[self.SUCCESSOR_SCORE] = self.get_score(successor)
 
     def get_weights(self, game_state, action):
         """
         Normally, weights do not depend on the gamestate.  They can be either
-        a counter or a dictionary.
+        a counter or a dictionary.  Set the weights attribute for fixed
+        weights, or override this for weights that depend on the state or
+        the action.
         """
-        return {'successor_score': 1.0}
+        return self.weights
 
 
 class OffensiveReflexAgent(ReflexCaptureAgent):
@@ -134,23 +168,23 @@ class OffensiveReflexAgent(ReflexCaptureAgent):
     we give you to get an idea of what an offensive agent might look like,
     but it is by no means the best or only way to build an offensive agent.
     """
+    feature_schema = util.register_feature_schema('baseline_team.OffensiveReflexAgent',
+                                                  ['successor_score', 'distance_to_food'])
+    SUCCESSOR_SCORE = feature_schema.slot('successor_score')
+    DISTANCE_TO_FOOD = feature_schema.slot('distance_to_food')
+    weights = {'successor_score': 100, 'distance_to_food': -1}
 
-    def get_features(self, game_state, action):
-        features = util.Counter()
+    def fill_features(self, row, game_state, action):
         successor = self.get_successor(game_state, action)
         food_list = self.get_food(successor).as_list()
-        features['successor_score'] = -len(food_list)  # self.get_score(successor)
+        row[self.SUCCESSOR_SCORE] = -len(food_list)  # self.get_score(successor)
 
         # Compute distance to the nearest food
 
         if len(food_list) > 0:  # This should always be True,  but better safe than sorry
             my_pos = successor.get_agent_state(self.index).get_position()
             min_distance = min([self.get_maze_distance(my_pos, food) for food in food_list])
-            features['distance_to_food'] = min_distance
-        return features
-
-    def get_weights(self, game_state, action):
-        return {'successor_score': 100, 'distance_to_food': -1}
+            row[self.DISTANCE_TO_FOOD] = min_distance
 
 
 class DefensiveReflexAgent(ReflexCaptureAgent):
@@ -160,34 +194,37 @@ class DefensiveReflexAgent(ReflexCaptureAgent):
     could be like.  It is not the best or only way to make
     such an agent.
     """
-
-    def get_features(self, game_state, action):
-        features = util.Counter()
+    feature_schema = util.register_feature_schema('baseline_team.DefensiveReflexAgent',
+                                                  ['num_invaders', 'on_defense', 'invader_distance',
+                                                   'stop', 'reverse'])
+    NUM_INVADERS = feature_schema.slot('num_invaders')
+    ON_DEFENSE = feature_schema.slot('on_defense')
+    INVADER_DISTANCE = feature_schema.slot('invader_distance')
+    STOP = feature_schema.slot('stop')
+    REVERSE = feature_schema.slot('reverse')
+    weights = {'num_invaders': -1000, 'on_defense': 100, 'invader_distance': -10, 'stop': -100, 'reverse': -2}
+
+    def fill_features(self, row, game_state, action):
         successor = self.get_successor(game_state, action)
 
         my_state = successor.get_agent_state(self.index)
         my_pos = my_state.get_position()
 
         # Computes whether we're on defense (1) or offense (0)
-        features['on_defense'] = 1
+        row[self.ON_DEFENSE] = 1
         if my_state.is_pacman:
-            features['on_defense'] = 0
+            row[self.ON_DEFENSE] = 0
 
         # Computes distance to invaders we can see
         enemies = [successor.get_agent_state(i) for i in self.get_opponents(successor)]
         invaders = [a for a in enemies if a.is_pacman and a.get_position() != None]
-        features['num_invaders'] = len(invaders)
+        row[self.NUM_INVADERS] = len(invaders)
         if len(invaders) > 0:
             dists = [self.get_maze_distance(my_pos, a.get_position()) for a in invaders]
-            features['invader_distance'] = min(dists)
+            row[self.INVADER_DISTANCE] = min(dists)
 
         if action == Directions.STOP:
-            features['stop'] = 1
+            row[self.STOP] = 1
         rev = Directions.REVERSE[game_state.get_agent_state(self.index).configuration.direction]
         if action == rev:
-            features['reverse'] = 1
-
-        return features
-
-    def get_weights(self, game_state, action):
-        return {'num_invaders': -1000, 'on_defense': 100, 'invader_distance': -10, 'stop': -100, 'reverse': -2}
+            row[self.REVERSE] = 1
@@ -29,14 +29,20 @@ import sys
 from game import Directions
 import game
 from util import nearest_point
-from tracking import ExactInference
+import tracking
+
+# the NumPy belief updates give exactly the same beliefs, just faster
+if tracking._NUMPY_ENABLED:
+    InferenceEngine = tracking.VectorizedExactInference
+else:
+    InferenceEngine = tracking.ExactInference
 
 #################
 # Team creation #
 #################
 
 def create_team(first_index, second_index, is_red,
-               first='OffensiveReflexAgent', second='DefensiveReflexAgent'):
+               first='OffensiveReflexAgent', second='DefensiveReflexAgent', particles='0'):
     """
     This function should return a list of two agents that will form the
     team, initialized using first_index and second_index as their agent
@@ -50,10 +56,18 @@ def create_team(first_index, second_index, is_red,
     For the nightly contest, however, your team will be created without
     any extra arguments, so you should make sure that the default
     behavior is what you want for the nightly contest.
+
+    With particles=N (e.g. --red_opts particles=500) the opponents are tracked
+    by particle filters of N particles instead of by exact inference.
     """
-    inferences = []
-    return [eval(first)(first_index, inferences, True), 
-            eval(second)(second_index, inferences)]
+    if int(particles) > 0:
+        def inference_initializer(opponent, distancer, game_state):
+            return tracking.ParticleFilterInference(opponent, distancer, game_state, int(particles))
+    else:
+        inference_initializer = InferenceEngine
+    tracker = tracking.TeamTracker(inference_initializer)
+    return [eval(first)(first_index, tracker, True), 
+            eval(second)(second_index, tracker)]
 
 ##########
 # Agents #
@@ -64,30 +78,27 @@ class ReflexCaptureAgent(CaptureAgent):
     A base class for reflex agents that chooses score-maximizing actions
     """
 
-    def __init__(self, index, inferences, inference_initializer=False):
-        self.inferences = inferences
-        self.inference_initializer = inference_initializer
+    def __init__(self, index, tracker, tracker_initializer=False):
+        self.tracker = tracker
+        self.tracker_initializer = tracker_initializer
         CaptureAgent.__init__(self, index)
 
     def register_initial_state(self, game_state):
         self.start = game_state.get_agent_position(self.index)
         CaptureAgent.register_initial_state(self, game_state)
-        if self.inference_initializer:
-            self.inferences[:] = [ExactInference(opponent, self.distancer, game_state) 
-                             for opponent in self.get_opponents(game_state)]
+        if self.tracker_initializer:
+            self.tracker.initialize(game_state, self.distancer, self.get_opponents(game_state))
 
     def choose_action(self, game_state):
         """
         Picks among the actions with the highest Q(s,a).
         """
 
-        for inference in self.inferences:
-            # first elapse the time, then process the current observation
-            inference.elapse_time(game_state)
-            inference.observe_state(game_state, self.index)
+        # elapse the time for the opponents that moved, then process the current observation
+        self.tracker.update(game_state, self.index)
 
         # comment out the following to not display the belief distributions
-        self.display_distributions_over_positions([inference.get_belief_distribution() for inference in self.inferences])
+        self.display_distributions_over_positions(self.tracker.get_belief_distributions())
         actions = game_state.get_legal_actions(self.index)
 
         # You can profile your evaluation time by uncommenting these lines
@@ -137,7 +148,7 @@ class ReflexCaptureAgent(CaptureAgent):
         """
         Returns a counter of features for the state
         """
-        features = util.Counter()
+        features = util.FastCounter()
         successor = self.get_successor(game_state, action)
         features['successor_score'] = self.get_score(successor)
         return features
@@ -158,7 +169,7 @@ class OffensiveReflexAgent(ReflexCaptureAgent):
     """
 
     def get_features(self, game_state, action):
-        features = util.Counter()
+        features = util.FastCounter()
         successor = self.get_successor(game_state, action)
         food_list = self.get_food(successor).as_list()
         features['successor_score'] = -len(food_list)  # self.get_score(successor)
@@ -184,7 +195,7 @@ class DefensiveReflexAgent(ReflexCaptureAgent):
     """
 
     def get_features(self, game_state, action):
-        features = util.Counter()
+        features = util.FastCounter()
         successor = self.get_successor(game_state, action)
 
         my_state = successor.get_agent_state(self.index)
@@ -204,11 +215,8 @@ class DefensiveReflexAgent(ReflexCaptureAgent):
         features['num_invaders'] = len(invaders)
 
         if len(invaders) > 0:
-            invader_inferences = []
-            for index in invader_indices:
-                invader_inferences += [inference for inference in self.inferences if inference.index == index]
-            dists = [self.get_maze_distance(my_pos, inference.get_most_likely_position()) 
-                        for inference in invader_inferences]
+            dists = [self.get_maze_distance(my_pos, self.tracker.get_most_likely_position(index)) 
+                        for index in invader_indices]
             features['invader_distance'] = min(dists)
 
         if action == Directions.STOP:
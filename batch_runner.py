@@ -0,0 +1,335 @@
+"""batch_runner.py
+
+Champlain College CSI-480, Fall 2017
+The following code was adapted by Joshua Auerbach (jauerbach@champlain.edu)
+from the UC Berkeley Pacman Projects (see license and attribution below).
+
+----------------------
+Licensing Information:  You are free to use or extend these projects for
+educational purposes provided that (1) you do not distribute or publish
+solutions, (2) you retain this notice, and (3) you provide clear
+attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+
+Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+The core projects and autograders were primarily created by John DeNero
+(denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+Student side autograding was added by Brad Miller, Nick Hay, and
+Pieter Abbeel (pabbeel@cs.berkeley.edu).
+"""
+
+"""
+Plays many headless capture games in parallel.
+
+A job is one game: a red team, a blue team, a layout and a random seed.
+Jobs are spread over a pool of worker processes; each worker loads every
+team it is asked for once and reuses the agents for later games (just like
+capture.py does for -n games), except after a game that crashed or timed
+out, when they are loaded again.  Results are written one line per game,
+in the order games finish, to a JSONL file (or CSV if the output file ends
+in .csv).
+
+The random numbers are seeded from the job after its teams are loaded, so
+a job with the same seed replays the same game as long as the agents do
+not carry anything of their own over from the games before it in the same
+process (as with capture.py -n).
+
+With --replay_dir, each game is written to that directory as replay-<job>
+while it is played (see replay.py).  With --profile_dir, each game is also
+timed phase by phase (see game_profiler.py) and its report written to that
+directory as profile-<job>.json.
+
+Run python batch_runner.py --help for the options.
+"""
+
+import contextlib
+import csv
+import functools
+import io
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+import traceback
+
+import capture
+import layout
+import text_display
+
+RESULT_FIELDS = ['job', 'red', 'blue', 'layout', 'seed', 'length', 'score', 'winner', 'moves',
+                 'agent_times', 'agent_time_warnings', 'crashed', 'timed_out', 'game_time', 'error']
+
+
+def make_job(job_id, red, blue, layout_name, seed, length=1200):
+    "Returns the description of a single game, as passed to run_job"
+    return {'job': job_id, 'red': red, 'blue': blue, 'layout': layout_name,
+            'seed': seed, 'length': length}
+
+
+def read_jobs(filename, length=1200):
+    """
+    Reads jobs from a file with one "red blue layout seed" line per game.
+    Blank lines and lines starting with # are ignored.
+    """
+    jobs = []
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            red, blue, layout_name, seed = line.split()
+            jobs.append(make_job(len(jobs), red, blue, layout_name, int(seed), length))
+    return jobs
+
+
+def load_layout(layout_name, seed):
+    """
+    Loads a layout the way capture.py does, except that a plain RANDOM
+    layout is generated from the job's seed so that it can be replayed.
+    """
+    if layout_name == 'RANDOM':
+        layout_name = 'RANDOM%d' % seed
+    if layout_name.startswith('RANDOM'):
+        return layout.Layout(capture.random_layout(int(layout_name[6:])).split('\n'))
+    l = layout.get_layout(layout_name)
+    if l == None:
+        raise Exception("The layout " + layout_name + " cannot be found")
+    return l
+
+
+# Agents loaded by this worker process, keyed by (team module, is_red)
+_loaded_agents = {}
+# Number of teams this worker process has loaded, for module names
+_teams_loaded = 0
+
+
+def get_agents(red, blue):
+    "Returns the four agents for a game, loading each team only once per process"
+    global _teams_loaded
+    teams = []
+    for factory, is_red in [(red, True), (blue, False)]:
+        key = (factory, is_red)
+        if key not in _loaded_agents:
+            # every team gets its own module, so teams loaded earlier are not clobbered
+            module_name = 'batch_player%d_%d' % (_teams_loaded, int(is_red))
+            _teams_loaded += 1
+            _loaded_agents[key] = capture.load_agents(is_red, factory, True, {}, module_name)
+        teams.append(_loaded_agents[key])
+    red_agents, blue_agents = teams
+    return sum([list(el) for el in zip(red_agents, blue_agents)], [])
+
+
+def forget_agents(red, blue):
+    """
+    Drops the agents of a game that did not finish properly (their final
+    was never called), so that the next game loads them afresh
+    """
+    _loaded_agents.pop((red, True), None)
+    _loaded_agents.pop((blue, False), None)
+
+
+def run_job(job, catch_exceptions=False, profile_dir=None, replay_dir=None):
+    """
+    Plays the game described by job with no graphics and returns its
+    result as a dictionary with the keys in RESULT_FIELDS.  If profile_dir
+    or replay_dir are given, the game's profile report or replay is
+    written there.
+    """
+    result = dict(job)
+    result['error'] = None
+    start_time = time.time()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            l = load_layout(job['layout'], job['seed'])
+            agents = get_agents(job['red'], job['blue'])
+            # seeded after loading, so that whatever loading a team draws
+            # does not depend on which jobs the process has run before
+            random.seed(job['seed'])
+            rules = capture.CaptureRules(quiet=True)
+            game = rules.new_game(l, agents, text_display.NullGraphics(), job['length'],
+                                  True, catch_exceptions)
+            if profile_dir != None:
+                import game_profiler
+                game.profiler = game_profiler.GameProfiler(len(agents))
+                game.profiler.start_game()
+            if replay_dir != None:
+                import replay
+                game.recorder = replay.ReplayWriter(os.path.join(replay_dir, 'replay-%d' % job['job']), game,
+                                                    job['red'], job['blue'], job['seed'])
+            try:
+                game.run()
+            finally:
+                if replay_dir != None:
+                    game.recorder.close(game)
+            if profile_dir != None:
+                game.profiler.end_game()
+                game.profiler.write_report(os.path.join(profile_dir, 'profile-%d.json' % job['job']), game)
+    except Exception:
+        result['error'] = traceback.format_exc()
+        result['game_time'] = time.time() - start_time
+        forget_agents(job['red'], job['blue'])
+        return result
+    if game.agent_crashed:
+        forget_agents(job['red'], job['blue'])
+
+    score = game.state.data.score
+    result['score'] = score
+    result['winner'] = 'Red' if score > 0 else 'Blue' if score < 0 else 'Tie'
+    result['moves'] = len(game.move_history)
+    result['agent_times'] = game.total_agent_times
+    result['agent_time_warnings'] = game.total_agent_time_warnings
+    result['crashed'] = game.agent_crashed
+    result['timed_out'] = game.agent_timeout
+    result['game_time'] = time.time() - start_time
+    return result
+
+
+class ResultWriter:
+    """
+    Appends results to a JSONL file, or a CSV file if the name ends in .csv,
+    flushing after every game so that finished games survive a crash.
+    """
+
+    def __init__(self, filename, append=False):
+        self.csv = filename.endswith('.csv')
+        write_header = True
+        ends_with_newline = True
+        if append and os.path.exists(filename):
+            with open(filename, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    write_header = False
+                    f.seek(-1, os.SEEK_END)
+                    ends_with_newline = f.read(1) == b'\n'
+        self.file = open(filename, 'a' if append else 'w', newline='' if self.csv else None)
+        if not ends_with_newline:
+            # the last result was cut off part way, so start on a fresh line
+            self.file.write('\n')
+        if self.csv:
+            self.writer = csv.DictWriter(self.file, RESULT_FIELDS, extrasaction='ignore')
+            if write_header:
+                self.writer.writeheader()
+
+    def write(self, result):
+        if self.csv:
+            row = dict(result)
+            for key in ['agent_times', 'agent_time_warnings']:
+                if row.get(key) != None:
+                    row[key] = ' '.join(str(x) for x in row[key])
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(result, sort_keys=True) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def run_jobs(jobs, output, processes=None, catch_exceptions=False, append=False, callback=None, profile_dir=None,
+             replay_dir=None):
+    """
+    Plays all jobs over a pool of processes, writing each result to the
+    output file as soon as its game finishes.  callback, if given, is
+    called with each result as well.  Returns the list of results in the
+    order they finished.
+    """
+    for directory in [profile_dir, replay_dir]:
+        if directory != None and not os.path.isdir(directory):
+            os.makedirs(directory)
+    job_function = functools.partial(run_job, catch_exceptions=catch_exceptions, profile_dir=profile_dir,
+                                     replay_dir=replay_dir)
+    writer = ResultWriter(output, append)
+    results = []
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(job_function, jobs):
+            writer.write(result)
+            results.append(result)
+            if callback != None:
+                callback(result)
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        writer.close()
+    return results
+
+
+def print_summary(results):
+    "Prints the same summary as capture.run_games for a batch of results"
+    scores = [r['score'] for r in results if r['error'] == None]
+    errors = len(results) - len(scores)
+    if errors:
+        print('%d game(s) failed, see the error field of the output' % errors)
+    if not scores:
+        return
+    print('Average Score:', sum(scores) / float(len(scores)))
+    print('Red Win Rate:  %d/%d (%.2f)' % ([s > 0 for s in scores].count(True), len(scores),
+                                           [s > 0 for s in scores].count(True) / float(len(scores))))
+    print('Blue Win Rate: %d/%d (%.2f)' % ([s < 0 for s in scores].count(True), len(scores),
+                                           [s < 0 for s in scores].count(True) / float(len(scores))))
+
+
+def read_command(argv):
+    """
+    Processes the command used to run the batch runner from the command line.
+    """
+    from optparse import OptionParser
+    usage_str = """
+                USAGE:      python batch_runner.py <options>
+                EXAMPLES:   (1) python batch_runner.py -r baseline_team -b my_team -n 500 -o results.jsonl
+                - plays 500 games on default_capture with seeds 0..499
+                (2) python batch_runner.py -l RANDOM -n 100 -p 8 -o results.csv
+                - plays 100 games, each on the random maze generated from its seed
+                (3) python batch_runner.py --jobs jobs.txt -o results.jsonl
+                - plays the games listed in jobs.txt, one "red blue layout seed" per line
+                """
+    parser = OptionParser(usage_str)
+
+    parser.add_option('-r', '--red', help=capture.default('Red team'),
+                      default='baseline_team')
+    parser.add_option('-b', '--blue', help=capture.default('Blue team'),
+                      default='baseline_team')
+    parser.add_option('-l', '--layout', dest='layout',
+                      help=capture.default('the LAYOUT_FILE for every game; RANDOM uses each game\'s seed as the maze seed'),
+                      metavar='LAYOUT_FILE', default='default_capture')
+    parser.add_option('-n', '--num_games', type='int',
+                      help=capture.default('Number of games to play'), default=1)
+    parser.add_option('-s', '--seed', type='int',
+                      help=capture.default('Seed of the first game, later games count up from it'), default=0)
+    parser.add_option('--jobs', default=None,
+                      help='File of games to play, one "red blue layout seed" per line (overrides -r, -b, -l, -n, -s)')
+    parser.add_option('-i', '--time', type='int', dest='time',
+                      help=capture.default('TIME limit of a game in moves'), default=1200, metavar='TIME')
+    parser.add_option('-p', '--processes', type='int', default=None,
+                      help='Number of worker processes [Default: one per core]')
+    parser.add_option('-o', '--output', default='results.jsonl',
+                      help=capture.default('File results are written to (.jsonl or .csv)'))
+    parser.add_option('-c', '--catch_exceptions', action='store_true', default=False,
+                      help='Catch exceptions and enforce time limits')
+    parser.add_option('--profile_dir', default=None,
+                      help='Directory to write a timing report of each game to (see game_profiler.py)')
+    parser.add_option('--replay_dir', default=None,
+                      help='Directory to write the replay of each game to (see replay.py)')
+
+    options, otherjunk = parser.parse_args(argv)
+    assert len(otherjunk) == 0, "Unrecognized options: " + str(otherjunk)
+
+    if options.jobs != None:
+        jobs = read_jobs(options.jobs, options.time)
+    else:
+        jobs = [make_job(i, options.red, options.blue, options.layout, options.seed + i, options.time)
+                for i in range(options.num_games)]
+    return {'jobs': jobs, 'output': options.output, 'processes': options.processes,
+            'catch_exceptions': options.catch_exceptions, 'profile_dir': options.profile_dir,
+            'replay_dir': options.replay_dir}
+
+
+if __name__ == '__main__':
+    args = read_command(sys.argv[1:])
+    print('Playing %d games, writing results to %s' % (len(args['jobs']), args['output']))
+    results = run_jobs(**args)
+    print_summary(results)
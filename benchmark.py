@@ -0,0 +1,541 @@
+"""benchmark.py
+
+Champlain College CSI-480, Fall 2017
+The following code was adapted by Joshua Auerbach (jauerbach@champlain.edu)
+from the UC Berkeley Pacman Projects (see license and attribution below).
+
+----------------------
+Licensing Information:  You are free to use or extend these projects for
+educational purposes provided that (1) you do not distribute or publish
+solutions, (2) you retain this notice, and (3) you provide clear
+attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+
+Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+The core projects and autograders were primarily created by John DeNero
+(denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+Student side autograding was added by Brad Miller, Nick Hay, and
+Pieter Abbeel (pabbeel@cs.berkeley.edu).
+"""
+
+"""
+Timing comparisons for the performance sensitive parts of the framework.
+
+Usage:
+python benchmark.py                  - runs every benchmark
+python benchmark.py distances        - runs only the named benchmark(s)
+"""
+
+import os
+import sys
+import time
+
+import layout
+
+
+def all_layouts():
+    "Returns (name, Layout) pairs for every layout in the layouts directory"
+    names = sorted(f for f in os.listdir('layouts') if f.endswith('.lay'))
+    return [(name[:-len('.lay')], layout.get_layout(name)) for name in names]
+
+
+def time_call(function, *args):
+    "Returns (seconds, result) for a single call of function(*args)"
+    start_time = time.time()
+    result = function(*args)
+    return time.time() - start_time, result
+
+
+def benchmark_distances():
+    """
+    Compares the BFS all-pairs maze distance computation against the
+    original per-source UCS on every layout, checking that both produce
+    the same table.
+    """
+    import distance_calculator
+    print('%-20s %8s %10s %10s %8s' % ('layout', 'cells', 'ucs (s)', 'bfs (s)', 'speedup'))
+    for name, l in all_layouts():
+        ucs_time, ucs_distances = time_call(distance_calculator.compute_distances_ucs, l)
+        bfs_time, bfs_distances = time_call(distance_calculator.compute_distances, l)
+        if ucs_distances != bfs_distances:
+            raise Exception('Distance tables differ on layout ' + name)
+        print('%-20s %8d %10.3f %10.3f %7.1fx' % (name, len(l.walls.as_list(False)),
+                                                  ucs_time, bfs_time, ucs_time / bfs_time))
+
+
+def benchmark_distance_cache():
+    """
+    Times loading maze distances with an empty on-disk distance cache
+    against loading them again once the cache has been filled, for both
+    Distancer backends.
+    """
+    import shutil
+    import tempfile
+    import distance_calculator
+    directory = tempfile.mkdtemp()
+    old_cache = distance_calculator.distance_cache
+    distance_calculator.distance_cache = distance_calculator.DistanceCache(directory)
+    distancers = [('dict', distance_calculator.Distancer, distance_calculator.distance_map)]
+    if distance_calculator._NUMPY_ENABLED:
+        distancers.append(('matrix', distance_calculator.MatrixDistancer, distance_calculator.distance_matrix_map))
+    try:
+        print('%-20s %-8s %10s %10s' % ('layout', 'backend', 'cold (s)', 'warm (s)'))
+        for name, l in all_layouts():
+            for backend, distancer_class, memory_map in distancers:
+                path = distance_calculator.distance_cache.path(l.walls)
+                if os.path.exists(path):
+                    os.remove(path)
+                times = []
+                for run in range(2):
+                    memory_map.clear()
+                    times.append(time_call(distancer_class(l).get_maze_distances)[0])
+                print('%-20s %-8s %10.4f %10.4f' % (name, backend, times[0], times[1]))
+    finally:
+        distance_calculator.distance_cache = old_cache
+        shutil.rmtree(directory)
+
+
+def initial_capture_state(l, length=1200):
+    "Returns the starting capture GameState for a layout with four agents"
+    import capture
+    state = capture.GameState()
+    state.initialize(l, 4)
+    state.data.timeleft = length
+    return state
+
+
+def benchmark_successors(steps=20000, seed=1):
+    """
+    Measures capture GameState.generate_successor throughput by playing
+    random legal moves (restarting whenever a game ends) on every layout.
+    """
+    import random
+    print('%-20s %14s' % ('layout', 'successors/s'))
+    for name, l in all_layouts():
+        random.seed(seed)
+        start_state = initial_capture_state(l)
+        state = start_state
+        agent_index = 0
+        start_time = time.time()
+        for step in range(steps):
+            action = random.choice(state.get_legal_actions(agent_index))
+            state = state.generate_successor(agent_index, action)
+            agent_index = (agent_index + 1) % 4
+            if state.is_over() or state.data.timeleft <= 0:
+                state = start_state
+        print('%-20s %14.0f' % (name, steps / (time.time() - start_time)))
+
+
+def run_capture_game(red, blue, layout_name, length=1200, seed=1):
+    """
+    Plays one quiet capture game between the red and blue team modules
+    with a fixed random seed, and returns the finished Game.
+    """
+    import contextlib
+    import io
+    import random
+    import capture
+    import text_display
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        red_agents = capture.load_agents(True, red, True, {})
+        blue_agents = capture.load_agents(False, blue, True, {})
+        agents = sum([list(el) for el in zip(red_agents, blue_agents)], [])
+        rules = capture.CaptureRules(quiet=True)
+        game = rules.new_game(layout.get_layout(layout_name), agents, text_display.NullGraphics(),
+                              length, False, False)
+        game.run()
+    return game
+
+
+def benchmark_deep_copy(layout_name='default_capture'):
+    """
+    Profiles a full 1200 move baseline_team game and reports how much of
+    the wall time goes to GameState.deep_copy (and to re-parsing layouts).
+    """
+    import cProfile
+    import pstats
+    import capture
+    import game
+    total_time, g = time_call(run_capture_game, 'baseline_team', 'baseline_team', layout_name)
+    moves = len(g.move_history)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    run_capture_game('baseline_team', 'baseline_team', layout_name)
+    profiler.disable()
+    stats = pstats.Stats(profiler).stats
+
+    def cumulative(function):
+        for (filename, line, name), (_, calls, _, cumulative_time, _) in stats.items():
+            if name == function.__name__ and line == function.__code__.co_firstlineno \
+                    and os.path.basename(filename) == os.path.basename(function.__code__.co_filename):
+                return calls, cumulative_time
+        return 0, 0.0
+
+    print('%s: %d moves in %.2fs (%.3f ms per move), profiled:' % (layout_name, moves, total_time,
+                                                                   1000 * total_time / moves))
+    print('%-26s %8s %10s %14s' % ('function', 'calls', 'total (s)', 'per move (ms)'))
+    for label, function in [('GameState.deep_copy', capture.GameState.deep_copy),
+                            ('GameStateData.deep_copy', game.GameStateData.deep_copy),
+                            ('Layout.__init__', layout.Layout.__init__)]:
+        calls, cumulative_time = cumulative(function)
+        print('%-26s %8d %10.3f %14.3f' % (label, calls, cumulative_time, 1000 * cumulative_time / moves))
+
+
+def track_random_walk(inference, state, distancer, steps=200, seed=1):
+    """
+    Has inference (tracking agent 1 from agent 0's noisy sonar readings)
+    follow agent 1 walking randomly from its start position.  Returns the
+    milliseconds per turn and the mean maze distance between the most
+    likely position and the true one.
+    """
+    import random
+    import capture
+    import game
+    import util
+    random.seed(seed)
+    walls = state.get_walls()
+    observer_position = state.get_agent_position(0)
+    position = state.get_agent_position(1)
+    total_time = 0.0
+    total_error = 0
+    for step in range(steps):
+        position = random.choice(game.Actions.get_legal_neighbors(position, walls))
+        reading = int(util.manhattan_distance(position, observer_position) +
+                      random.choice(capture.SONAR_NOISE_VALUES))
+        start_time = time.time()
+        inference.elapse_time(state)
+        inference.observe(reading, state, 0)
+        total_time += time.time() - start_time
+        total_error += distancer.get_distance(inference.get_most_likely_position(), position)
+    return 1000 * total_time / steps, total_error / float(steps)
+
+
+def tracking_setup(l):
+    "Returns the starting GameState and a Distancer with maze distances for l"
+    import distance_calculator
+    state = initial_capture_state(l)
+    distancer = distance_calculator.Distancer(l)
+    distancer.get_maze_distances()
+    return state, distancer
+
+
+def benchmark_tracking():
+    """
+    Times ExactInference against VectorizedExactInference following an
+    opponent's random walk, checking that both end with the same beliefs.
+    """
+    import tracking
+    if not tracking._NUMPY_ENABLED:
+        print('numpy is not installed')
+        return
+    print('%-20s %14s %14s %8s' % ('layout', 'exact (ms)', 'numpy (ms)', 'speedup'))
+    for name, l in all_layouts():
+        state, distancer = tracking_setup(l)
+        times = []
+        beliefs = []
+        for inference_class in [tracking.ExactInference, tracking.VectorizedExactInference]:
+            inference = inference_class(1, distancer, state)
+            times.append(track_random_walk(inference, state, distancer)[0])
+            beliefs.append(inference.get_belief_distribution())
+        if beliefs[0] != beliefs[1]:
+            raise Exception('Beliefs differ on layout ' + name)
+        print('%-20s %14.3f %14.3f %7.1fx' % (name, times[0], times[1], times[0] / times[1]))
+
+
+def benchmark_particles(particle_counts=(100, 300, 1000, 3000)):
+    """
+    Compares ParticleFilterInference with different numbers of particles
+    against exact inference following an opponent's random walk: the time
+    per turn and the mean maze distance from the most likely position to
+    the opponent.
+    """
+    import tracking
+    if not tracking._NUMPY_ENABLED:
+        print('numpy is not installed')
+        return
+    print('%-20s %10s %10s %10s' % ('layout', 'particles', 'ms/turn', 'error'))
+    for name, l in all_layouts():
+        state, distancer = tracking_setup(l)
+        inference = tracking.VectorizedExactInference(1, distancer, state)
+        print('%-20s %10s %10.3f %10.2f' % ((name, 'exact') + track_random_walk(inference, state, distancer)))
+        for num_particles in particle_counts:
+            inference = tracking.ParticleFilterInference(1, distancer, state, num_particles)
+            print('%-20s %10d %10.3f %10.2f' % ((name, num_particles) +
+                                                track_random_walk(inference, state, distancer)))
+
+
+def benchmark_counters(repeats=100000):
+    """
+    Micro-benchmarks the numeric operations of util.Counter against
+    util.FastCounter and util.FeatureVector on a baseline sized feature
+    set, then times the baseline agents' evaluate loop.
+    """
+    import timeit
+    import util
+    names = ('successor_score', 'distance_to_food', 'num_invaders', 'invader_distance', 'stop')
+    weights = {'successor_score': 100, 'distance_to_food': -1, 'num_invaders': -1000,
+               'invader_distance': -10, 'stop': -100}
+    values = [-18, 7, 1, 4.0, 1]
+    vectors = [('Counter', util.Counter(zip(names, values))),
+               ('FastCounter', util.FastCounter(zip(names, values))),
+               ('FeatureVector', util.FeatureVector(names, values))]
+    operations = [('features * weights', lambda v: v * weights),
+                  ('arg_max', lambda v: v.arg_max()),
+                  ('total_count', lambda v: v.total_count()),
+                  ('copy + normalize', lambda v: v.copy().normalize()),
+                  ('read missing key', lambda v: v['missing'])]
+    print('%-20s %12s %12s %14s   (us per call)' % ('operation', 'Counter', 'FastCounter', 'FeatureVector'))
+    for label, operation in operations:
+        times = []
+        for kind, vector in vectors:
+            times.append(1e6 * timeit.timeit(lambda: operation(vector), number=repeats) / repeats)
+        print('%-20s %12.3f %12.3f %14.3f' % ((label,) + tuple(times)))
+    vector = util.FeatureVector(names, values)
+    weight_vector = util.FeatureVector(names, [weights[name] for name in names])
+    print('%-20s %12s %12s %14.3f' % ('FV * FV weights', '', '',
+                                       1e6 * timeit.timeit(lambda: vector * weight_vector, number=repeats) / repeats))
+    benchmark_evaluate()
+
+
+def benchmark_evaluate(team='baseline_team', layout_name='default_capture', steps=300, seed=1, rounds=7):
+    """
+    Times the baseline agents scoring their legal actions along a random
+    game one evaluate call at a time against scoring them together with
+    evaluate_actions, checking that both give the same values.
+    """
+    import contextlib
+    import io
+    import random
+    import capture
+    l = layout.get_layout(layout_name)
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        agents = capture.load_agents(True, team, True, {})
+    state = initial_capture_state(l)
+    for agent in agents:
+        agent.register_initial_state(state)
+    states = []
+    for step in range(steps):
+        agent_index = step % 4
+        states.append(state)
+        state = state.generate_successor(agent_index, random.choice(state.get_legal_actions(agent_index)))
+
+    evaluations = [lambda agent, state, actions: [agent.evaluate(state, a) for a in actions],
+                   lambda agent, state, actions: agent.evaluate_actions(state, actions)]
+    # the two take turns for several rounds and the best round of each
+    # counts, since one pass is short enough for noise to swamp the gap
+    times = [[], []]
+    for round in range(rounds):
+        values = []
+        for i, evaluation in enumerate(evaluations):
+            values.append([])
+            start_time = time.perf_counter()
+            for state in states:
+                for agent in agents:
+                    values[-1].append(evaluation(agent, state, state.get_legal_actions(agent.index)))
+            times[i].append(time.perf_counter() - start_time)
+        if values[0] != values[1]:
+            raise Exception('evaluate and evaluate_actions disagree')
+    times = [min(t) for t in times]
+    print('%s: %d action sets, best of %d rounds: evaluate per action %.4fs, evaluate_actions %.4fs (%.1f%% faster)' %
+          (team, len(values[0]), rounds, times[0], times[1], 100 * (times[0] - times[1]) / times[0]))
+
+
+def benchmark_rollouts(layout_name='default_capture', depth=5, iterations=50, steps=200, seed=1):
+    """
+    Times depth step random rollouts of one agent (as my_team's Monte Carlo
+    search plays them) from states along a random game, copying the state
+    and calling generate_successor against resetting and applying moves on
+    a rollout.RolloutSimulator, checking that both reach the same states.
+    """
+    import random
+    import rollout
+    from game import Directions
+    l = layout.get_layout(layout_name)
+    random.seed(seed)
+    state = initial_capture_state(l)
+    states = []
+    for step in range(steps):
+        agent_index = step % 4
+        if agent_index == 0:
+            states.append(state)
+        state = state.generate_successor(agent_index, random.choice(state.get_legal_actions(agent_index)))
+
+    def choose(actions, direction):
+        actions = list(actions)
+        actions.remove(Directions.STOP)
+        reverse = Directions.REVERSE[direction]
+        if reverse in actions and len(actions) > 1:
+            actions.remove(reverse)
+        return random.choice(actions)
+
+    def copy_rollouts(state):
+        ends = []
+        for i in range(iterations):
+            search_state = state.deep_copy()
+            for d in range(depth):
+                direction = search_state.get_agent_state(0).configuration.direction
+                search_state = search_state.generate_successor(0, choose(search_state.get_legal_actions(0), direction))
+            ends.append((search_state.get_agent_position(0), search_state.get_blue_food().count()))
+        return ends
+
+    simulator = rollout.RolloutSimulator(states[0])
+
+    def simulator_rollouts(state):
+        ends = []
+        simulator.load(state)
+        for i in range(iterations):
+            simulator.reset()
+            for d in range(depth):
+                direction = simulator.get_agent_state(0).get_direction()
+                simulator.apply(0, choose(simulator.get_legal_actions(0), direction))
+            ends.append((simulator.get_agent_position(0), simulator.get_blue_food().count()))
+        return ends
+
+    times = []
+    ends = []
+    for rollouts in [copy_rollouts, simulator_rollouts]:
+        random.seed(seed)
+        start_time = time.time()
+        ends.append([rollouts(state) for state in states])
+        times.append(time.time() - start_time)
+    if ends[0] != ends[1]:
+        raise Exception('RolloutSimulator and generate_successor rollouts disagree')
+    count = len(states) * iterations
+    print('%-20s %14s %14s' % ('', 'rollouts/s', 'steps/s'))
+    for name, seconds in zip(['deep_copy', 'RolloutSimulator'], times):
+        print('%-20s %14.0f %14.0f' % (name, count / seconds, count * depth / seconds))
+
+
+def benchmark_mcts(time_limit=0.5, seed=1):
+    """
+    Measures how many MonteCarloTreeSearch iterations fit in time_limit
+    seconds from the start of every layout, and how many distinct
+    positions the transposition table holds afterwards.
+    """
+    import random
+    import mcts
+    print('%-20s %14s %10s' % ('layout', 'iterations/s', 'nodes'))
+    for name, l in all_layouts():
+        random.seed(seed)
+        state = initial_capture_state(l)
+        search = mcts.MonteCarloTreeSearch(state, 0, time_limit=time_limit)
+        search.search(state)
+        print('%-20s %14.0f %10d' % (name, search.iterations / time_limit, len(search.table)))
+
+
+def benchmark_hashing(steps=5000, seed=1):
+    """
+    Times hashing the capture GameStates along a random game on every
+    layout: the hash kept up to date through generate_successor, against
+    the old hash that went over the whole food grid and capsule list.
+    Also checks that equal states hash the same.
+    """
+    import random
+    from game import Grid
+    print('%-20s %12s %12s' % ('layout', 'old (us)', 'zobrist (us)'))
+    for name, l in all_layouts():
+        random.seed(seed)
+        state = initial_capture_state(l)
+        states = []
+        for step in range(steps):
+            agent_index = step % 4
+            state = state.generate_successor(agent_index, random.choice(state.get_legal_actions(agent_index)))
+            states.append(state)
+            if state.is_over():
+                break
+        for state in states[:100]:
+            if hash(state) != hash(state.deep_copy()):
+                raise Exception('Equal states hash differently on layout ' + name)
+
+        # the food as the Grid the old hash walked over
+        grids = []
+        for state in states:
+            food = Grid(state.data.food.width, state.data.food.height)
+            for x, y in state.data.food.as_list():
+                food[x][y] = True
+            grids.append(food)
+
+        def old_hash(data, food):
+            return int((hash(tuple(data.agent_states)) + 13 * hash(food) +
+                        113 * hash(tuple(data.capsules)) + 7 * hash(data.score)) % 1048575)
+        old_time, old_hashes = time_call(lambda: [old_hash(state.data, food) for state, food in zip(states, grids)])
+        new_time, new_hashes = time_call(lambda: [hash(state) for state in states])
+        print('%-20s %12.2f %12.2f' % (name, 1e6 * old_time / len(states), 1e6 * new_time / len(states)))
+
+
+def benchmark_observations(steps=1000, seed=1):
+    """
+    Times producing each agent's observation along a random game on every
+    layout the way Game.run used to (deep copying the state, and then deep
+    copying it again in make_observation) against make_observation on the
+    game's own state, which copies only what the observation owns.
+    """
+    import random
+    import capture
+    from util import manhattan_distance
+    print('%-20s %12s %12s' % ('layout', 'copies (us)', 'view (us)'))
+    for name, l in all_layouts():
+        random.seed(seed)
+        state = initial_capture_state(l)
+        states = []
+        for step in range(steps):
+            agent_index = step % 4
+            state = state.generate_successor(agent_index, random.choice(state.get_legal_actions(agent_index)))
+            states.append((state, (agent_index + 1) % 4))
+            if state.is_over():
+                break
+
+        def copied_observation(state, index):
+            observation = state.deep_copy().deep_copy()
+            position = observation.get_agent_position(index)
+            observation.agent_distances = [capture.noisy_distance(position, observation.get_agent_position(i))
+                                           for i in range(observation.get_num_agents())]
+            if index in observation.red_team:
+                team, other_team = observation.red_team, observation.blue_team
+            else:
+                team, other_team = observation.blue_team, observation.red_team
+            for enemy in other_team:
+                enemy_position = observation.get_agent_position(enemy)
+                if min(manhattan_distance(enemy_position, observation.get_agent_position(teammate))
+                       for teammate in team) > capture.SIGHT_RANGE:
+                    observation.data.agent_states[enemy].configuration = None
+            return observation
+
+        times = []
+        observations = []
+        for observe in [copied_observation, capture.GameState.make_observation]:
+            random.seed(seed)
+            seconds, result = time_call(lambda: [observe(state, index) for state, index in states])
+            observations.append(result)
+            times.append(seconds)
+        for old, new in zip(*observations):
+            if old != new or old.agent_distances != new.agent_distances:
+                raise Exception('Observations differ on layout ' + name)
+        print('%-20s %12.1f %12.1f' % (name, 1e6 * times[0] / len(states), 1e6 * times[1] / len(states)))
+
+
+BENCHMARKS = {
+    'distances': benchmark_distances,
+    'distance_cache': benchmark_distance_cache,
+    'successors': benchmark_successors,
+    'deep_copy': benchmark_deep_copy,
+    'tracking': benchmark_tracking,
+    'particles': benchmark_particles,
+    'counters': benchmark_counters,
+    'evaluate': benchmark_evaluate,
+    'rollouts': benchmark_rollouts,
+    'mcts': benchmark_mcts,
+    'hashing': benchmark_hashing,
+    'observations': benchmark_observations,
+}
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or sorted(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print('Unknown benchmark %s, choose from: %s' % (name, ', '.join(sorted(BENCHMARKS))))
+            sys.exit(2)
+    for name in names:
+        print('\n*** %s' % name)
+        BENCHMARKS[name]()
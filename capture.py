@@ -52,6 +52,7 @@ from game import Actions
 from util import nearest_point
 from util import manhattan_distance
 from game import Grid
+from game import BitGrid
 from game import Configuration
 from game import Agent
 from game import reconstitute_grid
@@ -115,7 +116,7 @@ class GameState:
         # Find appropriate rules for the agent
         AgentRules.apply_action(state, action, agent_index)
         AgentRules.check_death(state, agent_index)
-        AgentRules.decrement_timer(state.data.agent_states[agent_index])
+        AgentRules.decrement_timer(state.data.get_mutable_agent_state(agent_index))
 
         # Book keeping
         state.data._agent_moved = agent_index
@@ -241,9 +242,13 @@ class GameState:
     def __init__(self, prev_state=None):
         """
         Generates a new state by copying information from its predecessor.
+
+        Agent states, food and capsules are shared with the predecessor until
+        they change (see GameStateData.copy_on_write), so use deep_copy if you
+        need to modify the new state directly.
         """
         if prev_state != None:  # Initial state
-            self.data = GameStateData(prev_state.data)
+            self.data = prev_state.data.copy_on_write()
             self.blue_team = prev_state.blue_team
             self.red_team = prev_state.red_team
             self.data.timeleft = prev_state.data.timeleft
@@ -266,7 +271,19 @@ class GameState:
         return state
 
     def make_observation(self, index):
-        state = self.deep_copy()
+        """
+        Returns the state as agent index observes it: the sonar readings
+        are added, and enemies that neither it nor a teammate can see have
+        their configurations removed.
+
+        The observation is built as a copy-on-write view of this state
+        (see GameStateData.copy_on_write) and then given copies of its own
+        of the food, capsules and agent states, which is much cheaper than
+        deep_copy but just as safe: an agent can change its observation in
+        place without changing the game.
+        """
+        state = GameState(self)
+        state.data.detach()
 
         # Adds the sonar signal
         pos = state.get_agent_position(index)
@@ -289,7 +306,7 @@ class GameState:
                 if util.manhattan_distance(enemy_pos, state.get_agent_position(teammate)) <= SIGHT_RANGE:
                     seen = True
             if not seen:
-                state.data.agent_states[enemy].configuration = None
+                state.data.get_mutable_agent_state(enemy).configuration = None
         return state
 
     def __eq__(self, other):
@@ -334,6 +351,14 @@ class GameState:
 
 def half_grid(grid, red):
     halfway = grid.width / 2
+    if isinstance(grid, BitGrid):
+        halfgrid = grid.copy()
+        if red:
+            halfgrid.bits &= grid.columns_mask(0, int(halfway))
+        else:
+            halfgrid.bits &= grid.columns_mask(int(halfway), grid.width)
+        return halfgrid
+
     halfgrid = Grid(grid.width, grid.height, False)
     if red:
         xrange = list(range(int(halfway)))
@@ -480,12 +505,14 @@ class AgentRules:
         """
         Edits the state to reflect the results of the action.
         """
-        legal = AgentRules.get_legal_actions(state, agent_index)
-        if action not in legal:
+        # filter_for_allowed_actions allows every possible action, so this is
+        # the same check as action in get_legal_actions, without the list
+        config = state.data.agent_states[agent_index].configuration
+        if not Actions.is_possible_action(config, action, state.data.layout.walls):
             raise Exception("Illegal action " + str(action))
 
         # Update Configuration
-        agent_state = state.data.agent_states[agent_index]
+        agent_state = state.data.get_mutable_agent_state(agent_index)
         speed = 1.0
         # if agent_state.is_pacman: speed = 0.5
         vector = Actions.direction_to_vector(action, speed)
@@ -540,16 +567,14 @@ class AgentRules:
                 team_indices_func = state.get_red_team_indices
 
             # go increase the variable for the pacman who ate this
-            agents = [state.data.agent_states[agent_index] for agent_index in team_indices_func()]
-            for agent in agents:
-                if agent.get_position() == position:
-                    agent.num_carrying += 1
+            for agent_index in team_indices_func():
+                if state.data.agent_states[agent_index].get_position() == position:
+                    state.data.get_mutable_agent_state(agent_index).num_carrying += 1
                     break  # the above should only be true for one agent...
 
             # do all the score and food grid maintainenace
             #state.data.score_change += score
-            state.data.food = state.data.food.copy()
-            state.data.food[x][y] = False
+            state.data.set_food(x, y, False)
             state.data._food_eaten = position
             #if (is_red and state.get_blue_food().count() == MIN_FOOD) or (not is_red and state.get_red_food().count() == MIN_FOOD):
             #  state.data._win = True
@@ -560,7 +585,7 @@ class AgentRules:
         else:
             my_capsules = state.get_red_capsules()
         if(position in my_capsules):
-            state.data.capsules.remove(position)
+            state.data.remove_capsule(position)
             state.data._capsule_eaten = position
 
             # Reset all ghosts' scared timers
@@ -569,14 +594,14 @@ class AgentRules:
             else:
                 other_team = state.get_red_team_indices()
             for index in other_team:
-                state.data.agent_states[index].scared_timer = SCARED_TIME
+                state.data.get_mutable_agent_state(index).scared_timer = SCARED_TIME
 
     consume = staticmethod(consume)
 
     def decrement_timer(state):
         timer = state.scared_timer
         if timer == 1:
-            state.configuration.pos = nearest_point(state.configuration.pos)
+            state.configuration = Configuration(nearest_point(state.configuration.pos), state.configuration.direction)
         state.scared_timer = max(0, timer - 1)
     decrement_timer = staticmethod(decrement_timer)
 
@@ -643,7 +668,6 @@ class AgentRules:
             return True
 
         num_to_dump = agent_state.num_carrying
-        state.data.food = state.data.food.copy()
         food_added = []
 
         def gen_successors(x, y):
@@ -667,7 +691,7 @@ class AgentRules:
             x = int(x)
             y = int(y)
             if (all_good(state, x, y)):
-                state.data.food[x][y] = True
+                state.data.set_food(x, y, True)
                 food_added.append((x, y))
                 num_to_dump -= 1
 
@@ -682,7 +706,7 @@ class AgentRules:
     dump_food_from_death = staticmethod(dump_food_from_death)
 
     def check_death(state, agent_index):
-        agent_state = state.data.agent_states[agent_index]
+        agent_state = state.data.get_mutable_agent_state(agent_index)
         if state.is_on_red_team(agent_index):
             other_team = state.get_blue_team_indices()
         else:
@@ -712,6 +736,7 @@ class AgentRules:
                         if state.is_on_red_team(agent_index):
                             score = -score
                         state.data.score_change += score
+                        other_agent_state = state.data.get_mutable_agent_state(index)
                         other_agent_state.is_pacman = False
                         other_agent_state.configuration = other_agent_state.start
                         other_agent_state.scared_timer = 0
@@ -726,6 +751,7 @@ class AgentRules:
                 if manhattan_distance(pac_pos, agent_state.get_position()) <= COLLISION_TOLERANCE:
                     #award points to the other team for killing Pacmen
                     if agent_state.scared_timer <= 0:
+                        other_agent_state = state.data.get_mutable_agent_state(index)
                         AgentRules.dump_food_from_death(state, other_agent_state, agent_index)
 
                         score = KILL_POINTS
@@ -824,13 +850,21 @@ def read_command(argv):
     parser.add_option('-f', '--fix_random_seed', action='store_true',
                     help='Fixes the random seed to always play the same game', default=False)
     parser.add_option('--record', action='store_true',
-                    help='Writes game histories to a file (named by the time they were played)', default=False)
+                    help='Writes each game to replay-<game> as it is played (see replay.py)', default=False)
     parser.add_option('--replay', default=None,
                     help='Replays a recorded game file.')
+    parser.add_option('--replay_start', type='int', default=0,
+                    help=default('Move to start a replay from'))
     parser.add_option('-x', '--num_training', dest='num_training', type='int',
                     help=default('How many episodes are training (suppresses output)'), default=0)
     parser.add_option('-c', '--catch_exceptions', action='store_true', default=False,
                     help='Catch exceptions and enforce time limits')
+    parser.add_option('--sandbox', action='store_true', default=False,
+                    help='Run each agent in a worker process of its own (see agent_sandbox.py)')
+    parser.add_option('--profile', action='store_true', default=False,
+                    help='Times each phase of every move and writes a report of each game to profile-<game>.json')
+    parser.add_option('--profile_agents', action='store_true', default=False,
+                    help='Same as --profile, and also runs the agents under cProfile (see game_profiler.py)')
 
     options, otherjunk = parser.parse_args(argv)
     assert len(otherjunk) == 0, "Unrecognized options: " + str(otherjunk)
@@ -867,8 +901,14 @@ def read_command(argv):
     # Special case: recorded games don't use the run_games method or args structure
     if options.replay != None:
         print('Replaying recorded game %s.' % options.replay)
+        import replay
+        if replay.is_replay_file(options.replay):
+            replay.play_replay(options.replay, args['display'], options.replay_start)
+            sys.exit(0)
+        # a game recorded as a pickle, before replay.py
         import pickle
-        recorded = pickle.load(open(options.replay))
+        with open(options.replay, 'rb') as f:
+            recorded = pickle.load(f)
         recorded['display'] = args['display']
         replay_game(**recorded)
         sys.exit(0)
@@ -879,10 +919,14 @@ def read_command(argv):
         red_args['num_training'] = options.num_training
         blue_args['num_training'] = options.num_training
     nokeyboard = options.textgraphics or options.quiet or options.num_training > 0
+    team_loader = lambda is_red, factory, team_args: load_agents(is_red, factory, nokeyboard, team_args)
+    if options.sandbox:
+        import agent_sandbox
+        team_loader = agent_sandbox.load_agents
     print('\nRed team %s with %s:' % (options.red, red_args))
-    red_agents = load_agents(True, options.red, nokeyboard, red_args)
+    red_agents = team_loader(True, options.red, red_args)
     print('\nBlue team %s with %s:' % (options.blue, blue_args))
-    blue_agents = load_agents(False, options.blue, nokeyboard, blue_args)
+    blue_agents = team_loader(False, options.blue, blue_args)
     args['agents'] = sum([list(el) for el in zip(red_agents, blue_agents)], [])  # list of agents
 
     num_keyboard_agents = 0
@@ -920,7 +964,10 @@ def read_command(argv):
     args['num_games'] = options.num_games
     args['num_training'] = options.num_training
     args['record'] = options.record
+    args['seed'] = 'CSI480' if options.fix_random_seed else None
     args['catch_exceptions'] = options.catch_exceptions
+    args['profile'] = options.profile or options.profile_agents
+    args['profile_agents'] = options.profile_agents
     return args
 
 
@@ -935,13 +982,20 @@ def random_layout(seed=None):
 import traceback
 
 
-def load_agents(is_red, factory, textgraphics, cmd_line_args):
-    "Calls agent factories and returns lists of agents"
+def load_agents(is_red, factory, textgraphics, cmd_line_args, module_name=None):
+    """
+    Calls agent factories and returns lists of agents
+
+    The team module is loaded as 'player0' or 'player1' unless module_name
+    is given; pass distinct names to keep several teams loaded at once.
+    """
     try:
         if not factory.endswith(".py"):
             factory += ".py"
 
-        module = imp.load_source('player' + str(int(is_red)), factory)
+        if module_name == None:
+            module_name = 'player' + str(int(is_red))
+        module = imp.load_source(module_name, factory)
     except (NameError, ImportError):
         print('Error: The team "' + factory + '" could not be loaded! ', file=sys.stderr)
         traceback.print_exc()
@@ -989,7 +1043,8 @@ def replay_game(layout, agents, actions, display, length, red_team_name, blue_te
     display.finish()
 
 
-def run_games(layouts, agents, display, length, num_games, record, num_training, red_team_name, blue_team_name, mute_agents=False, catch_exceptions=False):
+def run_games(layouts, agents, display, length, num_games, record, num_training, red_team_name, blue_team_name, mute_agents=False, catch_exceptions=False,
+              profile=False, profile_agents=False, seed=None):
 
     rules = CaptureRules()
     games = []
@@ -1009,23 +1064,35 @@ def run_games(layouts, agents, display, length, num_games, record, num_training,
             game_display = display
             rules.quiet = False
         g = rules.new_game(layout, agents, game_display, length, mute_agents, catch_exceptions)
-        g.run()
+        g.record = None
+        if record:
+            import replay
+            # the replay is written move by move, so even a crashed game leaves one
+            g.record = 'replay-%d' % i
+            g.recorder = replay.ReplayWriter(g.record, g, red_team_name, blue_team_name, seed)
+        if profile:
+            import game_profiler
+            g.profiler = game_profiler.GameProfiler(len(agents), profile_agents)
+            g.profiler.start_game()
+        try:
+            g.run()
+        finally:
+            if record:
+                g.recorder.close(g)
         if not be_quiet:
             games.append(g)
 
-        g.record = None
+        if profile:
+            g.profiler.end_game()
+            g.profiler.write_report('profile-%d.json' % i, g)
+            if profile_agents:
+                for index in range(len(agents)):
+                    g.profiler.dump_profile(index, 'profile-%d-agent%d.prof' % (i, index))
+            if not be_quiet:
+                g.profiler.print_summary()
+                print('Profile written to profile-%d.json' % i)
         if record:
-            import time
-            import pickle
-            import game
-            #fname = ('recorded-game-%d' % (i + 1)) +  '-'.join([str(t) for t in time.localtime()[1:6]])
-            #f = file(fname, 'w')
-            components = {'layout': layout, 'agents': [game.Agent() for a in agents], 'actions': g.move_history, 'length': length, 'red_team_name': red_team_name, 'blue_team_name': blue_team_name}
-            #f.close()
             print("recorded")
-            g.record = pickle.dumps(components)
-            with open('replay-%d' % i, 'wb') as f:
-                f.write(g.record)
 
     if num_games > 1:
         scores = [game.state.data.score for game in games]
@@ -1056,6 +1123,8 @@ if __name__ == '__main__':
     """
     options = read_command(sys.argv[1:])  # Get game components based on input
     games = run_games(**options)
+    if 'agent_sandbox' in sys.modules:
+        sys.modules['agent_sandbox'].close_agents(options['agents'])
 
     save_score(games[0])
     # import cProfile
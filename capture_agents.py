@@ -22,10 +22,110 @@ Interfaces for capture agents and agent factories
 """
 
 from game import Agent
+import collections
 import distance_calculator
 from util import nearest_point
 import util
 
+# Number of full observations a CaptureAgent keeps (None keeps them all).
+# Older observations are only kept as ObservationDeltas, so agents that
+# look further back than this must pass history_length=None.
+OBSERVATION_HISTORY_LENGTH = 10
+
+# A compact record of an observation that is no longer kept in full:
+# the agent positions (None for opponents that were not visible), the food
+# eaten and the food added (dropped by a pacman that died) since the
+# previous record (or since the start of the game), the remaining capsules,
+# the score and the number of moves left
+ObservationDelta = collections.namedtuple('ObservationDelta',
+                                          ['agent_positions', 'food_eaten', 'food_added', 'capsules', 'score',
+                                           'timeleft'])
+
+
+class ObservationHistory:
+    """
+    The observations a CaptureAgent has seen this game, oldest first.
+
+    Only the last max_states observations are kept as full GameStates, and
+    only those can be indexed (history[-1] is the current observation,
+    history[-2] the previous one and so on).  Each older observation is
+    reduced to an ObservationDelta in deltas as it drops out, and food_at
+    rebuilds the food of any of them.  len() counts every observation seen,
+    while iterating and slicing only give the ones kept in full (so
+    history[-3:] gives the last three, if there are that many, but
+    history[:] gives only the last max_states).
+    """
+
+    def __init__(self, max_states=OBSERVATION_HISTORY_LENGTH):
+        if max_states != None and max_states < 2:
+            # get_previous_observation needs the last two
+            raise Exception('An observation history has to keep at least 2 observations')
+        self.max_states = max_states
+        self.clear()
+
+    def clear(self):
+        self.states = collections.deque()
+        self.deltas = []
+        self.first_food = None
+        self.last_food = None
+
+    def append(self, game_state):
+        self.states.append(game_state)
+        if self.max_states != None and len(self.states) > self.max_states:
+            self.deltas.append(self.make_delta(self.states.popleft()))
+
+    def make_delta(self, game_state):
+        food = game_state.data.food
+        if self.last_food == None:
+            self.first_food = self.last_food = game_state.data.layout.food
+        last_food = set(self.last_food.as_list())
+        current_food = set(food.as_list())
+        self.last_food = food
+        positions = tuple(game_state.get_agent_position(i) for i in range(game_state.get_num_agents()))
+        return ObservationDelta(positions, tuple(sorted(last_food - current_food)),
+                                tuple(sorted(current_food - last_food)), tuple(game_state.get_capsules()),
+                                game_state.get_score(), game_state.data.timeleft)
+
+    def food_at(self, index):
+        """
+        Returns the food grid of observation index, rebuilding it from the
+        deltas if that observation is no longer kept in full.
+        """
+        index = self.check_index(index)
+        if index >= len(self.deltas):
+            return self.states[index - len(self.deltas)].data.food
+        food = self.first_food.copy()
+        for delta in self.deltas[:index + 1]:
+            for x, y in delta.food_eaten:
+                food[x][y] = False
+            for x, y in delta.food_added:
+                food[x][y] = True
+        return food
+
+    def check_index(self, index):
+        "Returns index counted from the start, raising IndexError if it is out of range"
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('observation history index out of range')
+        return index
+
+    def __len__(self):
+        return len(self.deltas) + len(self.states)
+
+    def __iter__(self):
+        return iter(self.states)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            first = len(self.deltas)
+            return [self.states[i - first] for i in range(*index.indices(len(self))) if i >= first]
+        index = self.check_index(index)
+        if index < len(self.deltas):
+            raise IndexError('only the last %d observations are kept (see deltas for older ones, or pass '
+                             'history_length=None to CaptureAgent)' % self.max_states)
+        return self.states[index - len(self.deltas)]
+
 
 # Note: the following class is not used, but is kept for backwards
 # compatibility with team submissions that try to import it.
@@ -63,15 +163,17 @@ class CaptureAgent(Agent):
     # Methods to store key info #
     #############################
 
-    def __init__(self, index, time_for_computing=.1):
+    def __init__(self, index, time_for_computing=.1, history_length=OBSERVATION_HISTORY_LENGTH):
         """
         Lists several variables you can query:
         self.index = index for this agent
         self.red = true if you're on the red team, false otherwise
         self.agents_on_team = a list of agent objects that make up your team
         self.distancer = distance calculator (contest code provides this)
-        self.observation_history = list of GameState objects that correspond
-        to the sequential order of states that have occurred so far this game
+        self.observation_history = an ObservationHistory of the GameState objects that
+        correspond to the sequential order of states that have occurred so far this game
+        (only the last history_length, 10 by default, are kept in full and can be
+        indexed or iterated over; pass history_length=None to keep all of them)
         self.time_for_computing = an amount of time to give each turn for computing maze distances
         (part of the provided distance calculator)
         """
@@ -88,7 +190,7 @@ class CaptureAgent(Agent):
         self.distancer = None
 
         # A history of observations
-        self.observation_history = []
+        self.observation_history = ObservationHistory(history_length)
 
         # Time to spend each turn on computing maze distances
         self.time_for_computing = time_for_computing
@@ -117,7 +219,7 @@ class CaptureAgent(Agent):
             self.display = __main__._display
 
     def final(self, game_state):
-        self.observation_history = []
+        self.observation_history.clear()
 
     def register_team(self, agents_on_team):
         """
@@ -129,6 +231,9 @@ class CaptureAgent(Agent):
     def observation_function(self, game_state):
         " Changing this won't affect pacclient.py, but will affect capture.py "
         return game_state.make_observation(self.index)
+    # make_observation only reads game_state, so Game.run can hand it the
+    # game's own state instead of a copy (overriding methods get a copy)
+    observation_function.copies_state = True
 
     def debug_draw(self, cells, color, clear=False):
 
@@ -27,8 +27,20 @@ distancer.get_distance( (1,1), (10,10) )
 """
 
 import sys
+import os
 import time
 import random
+import array
+import hashlib
+import mmap
+import struct
+import tempfile
+
+try:
+    import numpy
+    _NUMPY_ENABLED = True
+except ImportError:
+    _NUMPY_ENABLED = False
 
 
 class Distancer:
@@ -73,6 +85,55 @@ class Distancer:
         return self._distances != None
 
 
+class MatrixDistancer(Distancer):
+    """
+    A Distancer that keeps its distances in a dense numpy matrix (see
+    DistanceMatrix) rather than a dictionary keyed by position pairs.
+    It uses far less memory and adds get_distances, which looks up the
+    distances from one position to many in a single call.  Requires numpy.
+
+    Example:
+    distancer = MatrixDistancer(game_state.data.layout)
+    distancer.get_maze_distances()
+    distancer.get_distances((1,1), food_list)
+    """
+
+    def __init__(self, layout, default=10000):
+        if not _NUMPY_ENABLED:
+            raise Exception("MatrixDistancer requires numpy")
+        self._distances = None
+        self.default = default
+        self.dc = MatrixDistanceCalculator(layout, self, default)
+
+    def get_distance_on_grid(self, pos1, pos2):
+        cell_index = self._distances.cell_index
+        if pos1 in cell_index and pos2 in cell_index:
+            distance = int(self._distances.matrix[cell_index[pos1], cell_index[pos2]])
+            if distance == UNREACHABLE:
+                return sys.maxsize
+            return distance
+        else:
+            raise Exception("Positions not in grid: " + str((pos1, pos2)))
+
+    def get_distances(self, pos, targets):
+        """
+        Returns a numpy array holding get_distance(pos, target) for each
+        position in targets.
+        """
+        if self._distances == None:
+            return numpy.array([manhattan_distance(pos, target) for target in targets])
+        cell_index = self._distances.cell_index
+        if not is_int(pos) or not all(target in cell_index for target in targets):
+            # half positions need snapping, so fall back to the general case
+            return numpy.array([self.get_distance(pos, target) for target in targets])
+        if pos not in cell_index:
+            raise Exception("Position not in grid: " + str(pos))
+        columns = [cell_index[target] for target in targets]
+        distances = self._distances.matrix[cell_index[pos], columns].astype(numpy.int64)
+        distances[distances == UNREACHABLE] = sys.maxsize
+        return distances
+
+
 def manhattan_distance(x, y):
     return abs(x[0] - y[0]) + abs(x[1] - y[1])
 
@@ -100,6 +161,10 @@ def get_grids1_d(x):
 ##########################################
 
 distance_map = {}
+distance_matrix_map = {}
+
+# int16 entry used by DistanceMatrix for pairs with no path between them
+UNREACHABLE = 32767
 
 
 class DistanceCalculator:
@@ -112,7 +177,15 @@ class DistanceCalculator:
         global distance_map
 
         if self.layout.walls not in distance_map:
-            distances = compute_distances(self.layout)
+            distances = None
+            cached = distance_cache.load(self.layout.walls)
+            if cached != None:
+                distances = matrix_to_dict(*cached)
+            if distances == None:
+                distances = compute_distances(self.layout)
+                all_nodes = layout_cells(self.layout)
+                distance_cache.store(self.layout.walls, all_nodes,
+                                     dict_to_matrix(all_nodes, distances))
             distance_map[self.layout.walls] = distances
         else:
             distances = distance_map[self.layout.walls]
@@ -120,8 +193,123 @@ class DistanceCalculator:
         self.distancer._distances = distances
 
 
+class MatrixDistanceCalculator(DistanceCalculator):
+    def run(self):
+        global distance_matrix_map
+
+        if self.layout.walls not in distance_matrix_map:
+            distances = None
+            cached = distance_cache.load(self.layout.walls)
+            if cached != None:
+                cells, data = cached
+                matrix = numpy.frombuffer(data, dtype=numpy.int16).reshape(len(cells), len(cells))
+                distances = DistanceMatrix(cells, matrix)
+            if distances == None:
+                distances = compute_distance_matrix(self.layout)
+                distance_cache.store(self.layout.walls, distances.cells,
+                                     distances.matrix.astype('<i2').tobytes())
+            distance_matrix_map[self.layout.walls] = distances
+        else:
+            distances = distance_matrix_map[self.layout.walls]
+
+        self.distancer._distances = distances
+
+
+class DistanceMatrix:
+    """
+    All pairs maze distances stored densely: cell_index maps an open (x,y)
+    position to its row/column in matrix, an int16 numpy array.  Pairs that
+    cannot reach each other hold UNREACHABLE.
+    """
+
+    def __init__(self, cells, matrix):
+        self.cells = cells
+        self.cell_index = dict((cell, i) for i, cell in enumerate(cells))
+        self.matrix = matrix
+
+
+def layout_cells(layout):
+    "Returns the open cells of a layout, in the order used for distance tables"
+    return layout.walls.as_list(False)
+
+
 def compute_distances(layout):
-    "Runs UCS to all other positions from each position"
+    """
+    Runs a BFS to all other positions from each position.
+
+    Every move costs 1, so a plain breadth-first search gives the same table
+    as uniform cost search without any heap operations.  The neighbors of
+    each open cell are looked up once up front instead of once per search.
+    Unreachable pairs are stored as sys.maxsize, just like compute_distances_ucs.
+    """
+    all_nodes = layout_cells(layout)
+    adjacency = build_adjacency(layout.walls, all_nodes)
+    distances = {}
+    for source_index, source in enumerate(all_nodes):
+        dist = bfs_distances(adjacency, source_index)
+        for target, target_dist in zip(all_nodes, dist):
+            distances[(target, source)] = target_dist
+    return distances
+
+
+def compute_distance_matrix(layout):
+    """
+    Runs the same BFS as compute_distances, but stores the result as a
+    DistanceMatrix instead of a dictionary of position pairs.
+    """
+    all_nodes = layout_cells(layout)
+    adjacency = build_adjacency(layout.walls, all_nodes)
+    matrix = numpy.empty((len(all_nodes), len(all_nodes)), dtype=numpy.int16)
+    for source_index in range(len(all_nodes)):
+        dist = bfs_distances(adjacency, source_index)
+        matrix[source_index] = [d if d != sys.maxsize else UNREACHABLE for d in dist]
+    return DistanceMatrix(all_nodes, matrix)
+
+
+def bfs_distances(adjacency, source_index):
+    """
+    Returns a list holding the number of steps from source_index to every
+    node of adjacency (see build_adjacency), or sys.maxsize if unreachable.
+    """
+    dist = [sys.maxsize] * len(adjacency)
+    dist[source_index] = 0
+    frontier = [source_index]
+    depth = 0
+    while frontier:
+        depth += 1
+        next_frontier = []
+        for node in frontier:
+            for other in adjacency[node]:
+                if dist[other] == sys.maxsize:
+                    dist[other] = depth
+                    next_frontier.append(other)
+        frontier = next_frontier
+    return dist
+
+
+def build_adjacency(walls, all_nodes):
+    """
+    Returns a list where entry i holds the indices (into all_nodes) of the
+    open cells one step away from all_nodes[i].
+    """
+    index = dict((node, i) for i, node in enumerate(all_nodes))
+    adjacency = []
+    for x, y in all_nodes:
+        neighbors = []
+        for neighbor in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+            if neighbor in index:
+                neighbors.append(index[neighbor])
+        adjacency.append(neighbors)
+    return adjacency
+
+
+def compute_distances_ucs(layout):
+    """
+    Runs UCS to all other positions from each position.
+
+    This is the original (slower) implementation, kept as a reference for
+    checking and timing compute_distances.
+    """
     distances = {}
     all_nodes = layout.walls.as_list(False)
     for source in all_nodes:
@@ -167,3 +355,179 @@ def get_distance_on_grid(distances, pos1, pos2):
     if key in distances:
         return distances[key]
     return 100000
+
+
+##############################
+# PERSISTENT DISTANCE CACHE  #
+##############################
+
+"""
+Distance tables are also saved to disk, so that a new process (e.g. each
+match of a tournament) playing a layout that has been seen before can
+memory-map the table instead of recomputing it.
+
+Each file is named by a hash of the wall grid and holds:
+    header: magic, format version, number of cells   (DISTANCE_CACHE_HEADER)
+    cells:  (x, y) for each open cell as int16 pairs
+    matrix: row-major N x N int16 distances, UNREACHABLE when there is no path
+all little-endian.  Files are written to a temporary name and renamed into
+place, so parallel matches never see a half written table.  Once the
+directory grows past max_bytes, the least recently used tables are removed.
+
+The cache is off unless the PACMAN_DISTANCE_CACHE environment variable
+names a directory to keep it in, so a game never writes files anywhere it
+was not asked to.  Child processes inherit the variable, so setting it once
+turns the cache on for every match of a batch or tournament:
+    PACMAN_DISTANCE_CACHE=~/.cache/pacman_distances python tournament.py ...
+"""
+
+DISTANCE_CACHE_DIR = os.path.expanduser(os.environ.get('PACMAN_DISTANCE_CACHE', ''))
+DISTANCE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+DISTANCE_CACHE_MAGIC = b'PACDIST\0'
+DISTANCE_CACHE_VERSION = 1
+DISTANCE_CACHE_HEADER = struct.Struct('<8sII')
+DISTANCE_CACHE_SUFFIX = '.dist'
+
+
+class DistanceCache:
+    """
+    A directory of distance tables keyed by wall grid.  A directory of
+    None (or '') disables the cache: load always misses and store does nothing.
+    Problems reading or writing the directory are never fatal, they just
+    mean the table is recomputed.
+    """
+
+    def __init__(self, directory=DISTANCE_CACHE_DIR, max_bytes=DISTANCE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, walls):
+        "Returns the file holding the table for the given wall Grid"
+        key = hashlib.sha1(('%d,%d\n' % (walls.width, walls.height) + str(walls)).encode()).hexdigest()
+        return os.path.join(self.directory, '%s-v%d%s' % (key, DISTANCE_CACHE_VERSION, DISTANCE_CACHE_SUFFIX))
+
+    def load(self, walls):
+        """
+        Returns (cells, data) for the given wall Grid, where data is a flat
+        int16 memoryview of the memory-mapped matrix, or None on a miss.
+        """
+        if not self.directory:
+            return None
+        path = self.path(walls)
+        try:
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError):
+            return None
+
+        cells = walls.as_list(False)
+        num_cells = len(cells)
+        cells_offset = DISTANCE_CACHE_HEADER.size
+        matrix_offset = cells_offset + 4 * num_cells
+        if len(mapped) != matrix_offset + 2 * num_cells * num_cells:
+            return None
+        magic, version, stored_cells = DISTANCE_CACHE_HEADER.unpack_from(mapped)
+        if magic != DISTANCE_CACHE_MAGIC or version != DISTANCE_CACHE_VERSION or stored_cells != num_cells:
+            return None
+        stored_positions = unpack_int16(mapped[cells_offset:matrix_offset])
+        if list(zip(stored_positions[0::2], stored_positions[1::2])) != cells:
+            return None
+
+        try:
+            # mark as recently used for eviction
+            os.utime(path, None)
+        except OSError:
+            pass
+        data = memoryview(mapped)[matrix_offset:]
+        if sys.byteorder != 'little':
+            data = memoryview(unpack_int16(data).tobytes())
+        return cells, data.cast('h')
+
+    def store(self, walls, cells, data):
+        """
+        Atomically writes the table for the given wall Grid, where data is
+        the row-major matrix as little-endian int16 bytes.
+        """
+        if not self.directory:
+            return
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            positions = array.array('h', [coordinate for cell in cells for coordinate in cell])
+            if sys.byteorder != 'little':
+                positions.byteswap()
+            fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(DISTANCE_CACHE_HEADER.pack(DISTANCE_CACHE_MAGIC, DISTANCE_CACHE_VERSION, len(cells)))
+                    f.write(positions.tobytes())
+                    f.write(data)
+                os.replace(temp_path, self.path(walls))
+            except BaseException:
+                os.remove(temp_path)
+                raise
+            self.evict()
+        except (IOError, OSError):
+            pass
+
+    def evict(self):
+        "Removes the least recently used tables until the cache fits in max_bytes"
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(DISTANCE_CACHE_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # another process got to it first
+                pass
+            total -= size
+
+
+distance_cache = DistanceCache()
+
+
+def unpack_int16(data):
+    "Returns an array of ints from little-endian int16 bytes"
+    values = array.array('h')
+    values.frombytes(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def dict_to_matrix(cells, distances):
+    """
+    Converts a distance dictionary (as made by compute_distances) into the
+    row-major little-endian int16 bytes stored by DistanceCache.
+    """
+    data = array.array('h')
+    for source in cells:
+        for target in cells:
+            distance = distances[(target, source)]
+            data.append(distance if distance != sys.maxsize else UNREACHABLE)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tobytes()
+
+
+def matrix_to_dict(cells, data):
+    "The inverse of dict_to_matrix, taking the flat int16 data from DistanceCache.load"
+    distances = {}
+    num_cells = len(cells)
+    for source_index, source in enumerate(cells):
+        row = data[source_index * num_cells:(source_index + 1) * num_cells]
+        for target, distance in zip(cells, row):
+            distances[(target, source)] = distance if distance != UNREACHABLE else sys.maxsize
+    return distances
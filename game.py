@@ -20,6 +20,7 @@ Pieter Abbeel (pabbeel@cs.berkeley.edu).
 from util import *
 import time
 import os
+import random
 import traceback
 import sys
 
@@ -75,11 +76,16 @@ class Configuration:
 
     The convention for positions, like a graph, is that (0,0) is the lower left corner, x increases
     horizontally and y increases vertically.  Therefore, north is the direction of increasing y, or (0,1).
+
+    Configurations are never changed once made (moving makes a new one), so
+    their hash is computed once, up front.
     """
+    __slots__ = ('pos', 'direction', '_hash')
 
     def __init__(self, pos, direction):
         self.pos = pos
         self.direction = direction
+        self._hash = hash(hash(pos) + 13 * hash(direction))
 
     def get_position(self):
         return (self.pos)
@@ -92,14 +98,14 @@ class Configuration:
         return x == int(x) and y == int(y)
 
     def __eq__(self, other):
-        if other == None:
+        if other is self:
+            return True
+        if other is None:
             return False
-        return (self.pos == other.pos and self.direction == other.direction)
+        return (self._hash == other._hash and self.pos == other.pos and self.direction == other.direction)
 
     def __hash__(self):
-        x = hash(self.pos)
-        y = hash(self.direction)
-        return hash(x + 13 * y)
+        return self._hash
 
     def __str__(self):
         return "(x,y)=" + str(self.pos) + ", " + str(self.direction)
@@ -124,6 +130,7 @@ class AgentState:
     """
     AgentStates hold the state of an agent (configuration, speed, scared, etc).
     """
+    __slots__ = ('start', 'configuration', 'is_pacman', 'scared_timer', 'num_carrying', 'num_returned')
 
     def __init__(self, start_configuration, is_pacman):
         self.start = start_configuration
@@ -140,15 +147,26 @@ class AgentState:
             return "Ghost: " + str(self.configuration)
 
     def __eq__(self, other):
-        if other == None:
+        if other is self:
+            return True
+        if other is None:
             return False
         return self.configuration == other.configuration and self.scared_timer == other.scared_timer
 
     def __hash__(self):
-        return hash(hash(self.configuration) + 13 * hash(self.scared_timer))
+        # not cached like Configuration's: the rules, the sandbox and agents
+        # assign configuration and scared_timer directly, so a cached hash
+        # could go stale.  The configuration's cached hash is read straight
+        # from its slot instead of through Configuration.__hash__.
+        configuration = self.configuration
+        if configuration is None:
+            return hash(hash(None) + 13 * hash(self.scared_timer))
+        return hash(configuration._hash + 13 * hash(self.scared_timer))
 
     def copy(self):
-        state = AgentState(self.start, self.is_pacman)
+        state = AgentState.__new__(AgentState)
+        state.start = self.start
+        state.is_pacman = self.is_pacman
         state.configuration = self.configuration
         state.scared_timer = self.scared_timer
         state.num_carrying = self.num_carrying
@@ -173,6 +191,10 @@ class Grid:
     The __str__ method constructs an output that is oriented like a pacman board.
     """
 
+    # the LegalActionTable of a maze's walls, set by Layout for the walls it
+    # builds (copies of a grid do not have one)
+    action_table = None
+
     def __init__(self, width, height, initial_value=False, bit_representation=None):
         if initial_value not in [False, True]:
             raise Exception('Grids can only contain booleans')
@@ -198,6 +220,8 @@ class Grid:
     def __eq__(self, other):
         if other == None:
             return False
+        if isinstance(other, BitGrid):
+            return other == self
         return self.data == other.data
 
     def __hash__(self):
@@ -286,6 +310,164 @@ class Grid:
         return bools
 
 
+class BitGrid(Grid):
+    """
+    A boolean Grid packed into the bits of a single python int, with the cell
+    (x,y) stored at bit x * height + y.  Data is still accessed via
+    grid[x][y], but since ints are immutable, copying a BitGrid is O(1) and
+    copies are independent of each other.  count uses a popcount and the hash
+    is just the hash of the int (which equals the hash of a Grid holding the
+    same cells).
+
+    Only booleans can be stored, so use Grid for anything else.
+    """
+
+    def __init__(self, width, height, initial_value=False, bit_representation=None):
+        if initial_value not in [False, True]:
+            raise Exception('Grids can only contain booleans')
+        self.CELLS_PER_INT = 30
+
+        self.width = width
+        self.height = height
+        self.bits = 0
+        if initial_value:
+            self.bits = (1 << (width * height)) - 1
+        if bit_representation:
+            self._unpack_bits(bit_representation)
+
+    def from_grid(grid):
+        "Returns a BitGrid holding the same cells as grid"
+        g = BitGrid(grid.width, grid.height)
+        g.bits = grid_bits(grid)
+        return g
+    from_grid = staticmethod(from_grid)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.width
+        if not 0 <= i < self.width:
+            raise IndexError('BitGrid column out of range')
+        return BitGridColumn(self, i)
+
+    def __setitem__(self, key, item):
+        column = self[key]
+        for y in range(self.height):
+            column[y] = item[y]
+
+    def get(self, x, y):
+        "Same as grid[x][y], without building a column"
+        return (self.bits >> (x * self.height + y)) & 1 == 1
+
+    def set(self, x, y, value):
+        "Same as grid[x][y] = value, without building a column"
+        if value:
+            self.bits |= 1 << (x * self.height + y)
+        else:
+            self.bits &= ~(1 << (x * self.height + y))
+
+    def __str__(self):
+        out = [[str(self.get(x, y))[0] for x in range(self.width)] for y in range(self.height)]
+        out.reverse()
+        return '\n'.join([''.join(x) for x in out])
+
+    def __eq__(self, other):
+        if other == None:
+            return False
+        if isinstance(other, BitGrid):
+            return self.bits == other.bits and self.width == other.width and self.height == other.height
+        return self.width == other.width and self.height == other.height and self.bits == grid_bits(other)
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def copy(self):
+        g = BitGrid(self.width, self.height)
+        g.bits = self.bits
+        return g
+
+    def deep_copy(self):
+        return self.copy()
+
+    def shallow_copy(self):
+        return self.copy()
+
+    def count(self, item=True):
+        on = popcount(self.bits)
+        if item:
+            return on
+        return self.width * self.height - on
+
+    def as_list(self, key=True):
+        bits = self.bits
+        if not key:
+            bits = ~bits & ((1 << (self.width * self.height)) - 1)
+        list = []
+        while bits:
+            lowest = bits & -bits
+            list.append(divmod(lowest.bit_length() - 1, self.height))
+            bits ^= lowest
+        return list
+
+    def columns_mask(self, start, stop):
+        "Returns an int with the bits of every cell in columns start..stop-1 set"
+        return ((1 << ((stop - start) * self.height)) - 1) << (start * self.height)
+
+
+class BitGridColumn:
+    """
+    The column grid[x] of a BitGrid, so that grid[x][y] reads and writes the
+    right bit of the grid.
+    """
+
+    def __init__(self, grid, x):
+        self.grid = grid
+        self.offset = x * grid.height
+
+    def __getitem__(self, y):
+        if y < 0:
+            y += self.grid.height
+        if not 0 <= y < self.grid.height:
+            raise IndexError('BitGrid row out of range')
+        return (self.grid.bits >> (self.offset + y)) & 1 == 1
+
+    def __setitem__(self, y, value):
+        if y < 0:
+            y += self.grid.height
+        if not 0 <= y < self.grid.height:
+            raise IndexError('BitGrid row out of range')
+        if value:
+            self.grid.bits |= 1 << (self.offset + y)
+        else:
+            self.grid.bits &= ~(1 << (self.offset + y))
+
+    def __len__(self):
+        return self.grid.height
+
+    def count(self, item=True):
+        return [self[y] for y in range(self.grid.height)].count(item)
+
+
+def grid_bits(grid):
+    "Returns the cells of any Grid packed into an int the way BitGrid stores them"
+    if isinstance(grid, BitGrid):
+        return grid.bits
+    bits = 0
+    base = 1
+    for column in grid.data:
+        for cell in column:
+            if cell:
+                bits |= base
+            base <<= 1
+    return bits
+
+
+def popcount(n):
+    "Returns the number of set bits in a non-negative int"
+    if hasattr(n, 'bit_count'):
+        return n.bit_count()
+    return bin(n).count('1')
+
+
 def reconstitute_grid(bit_rep):
     if type(bit_rep) is not type((1, 2)):
         return bit_rep
@@ -342,6 +524,19 @@ class Actions:
     direction_to_vector = staticmethod(direction_to_vector)
 
     def get_possible_actions(config, walls):
+        """
+        Returns a new list of the actions an agent at config can take.  On a
+        grid point of walls with an action_table this is a copy of the
+        table's tuple, since callers are free to change the list; hot code
+        that only reads it (is_possible_action, rollout.RolloutState) uses
+        walls.action_table.actions directly instead.
+        """
+        table = walls.action_table
+        if table != None:
+            actions = table.actions.get(config.pos)
+            if actions != None:
+                return list(actions)
+
         possible = []
         x, y = config.pos
         x_int, y_int = int(x + 0.5), int(y + 0.5)
@@ -361,7 +556,23 @@ class Actions:
 
     get_possible_actions = staticmethod(get_possible_actions)
 
+    def is_possible_action(config, action, walls):
+        "Returns whether action is one of get_possible_actions(config, walls)"
+        table = walls.action_table
+        if table != None:
+            actions = table.actions.get(config.pos)
+            if actions != None:
+                return action in actions
+        return action in Actions.get_possible_actions(config, walls)
+    is_possible_action = staticmethod(is_possible_action)
+
     def get_legal_neighbors(position, walls):
+        table = walls.action_table
+        if table != None:
+            neighbors = table.neighbors.get(position)
+            if neighbors != None:
+                return list(neighbors)
+
         x, y = position
         x_int, y_int = int(x + 0.5), int(y + 0.5)
         neighbors = []
@@ -385,6 +596,58 @@ class Actions:
     get_successor = staticmethod(get_successor)
 
 
+class LegalActionTable:
+    """
+    The possible actions and legal neighbors of every open cell of a maze,
+    worked out once from its walls so that Actions.get_possible_actions and
+    Actions.get_legal_neighbors are a dictionary lookup (and a copy into a
+    list) for agents standing on a grid point.  Both dictionaries are keyed
+    by (x, y) and hold tuples in the order the Actions methods would return
+    them.
+    """
+
+    def __init__(self, walls):
+        self.actions = {}
+        self.neighbors = {}
+        for x in range(walls.width):
+            for y in range(walls.height):
+                if walls[x][y]:
+                    continue
+                config = Configuration((x, y), Directions.STOP)
+                self.actions[(x, y)] = tuple(Actions.get_possible_actions(config, walls))
+                self.neighbors[(x, y)] = tuple(Actions.get_legal_neighbors((x, y), walls))
+
+
+# Zobrist keys by grid size, see zobrist_keys
+_zobrist_keys = {}
+
+
+def zobrist_keys(width, height):
+    """
+    Returns (food keys, capsule keys): two lists of random 64 bit keys, one
+    for each cell (x, y) of a width by height grid at index x * height + y.
+    The hash of a set of cells is the xor of their keys, so adding or
+    removing one cell changes it with a single xor.  The keys come from
+    their own seeded generator, so they are the same in every process and
+    do not use up the shared random numbers.
+    """
+    key = (width, height)
+    if key not in _zobrist_keys:
+        generator = random.Random(width * 10007 + height)
+        cells = width * height
+        _zobrist_keys[key] = ([generator.getrandbits(64) for cell in range(cells)],
+                              [generator.getrandbits(64) for cell in range(cells)])
+    return _zobrist_keys[key]
+
+
+def zobrist_hash(cells, keys, height):
+    "Returns the xor of the keys of every (x, y) in cells"
+    h = 0
+    for x, y in cells:
+        h ^= keys[int(x) * height + int(y)]
+    return h
+
+
 class GameStateData:
     """
 
@@ -401,6 +664,11 @@ class GameStateData:
             self.layout = prev_state.layout
             self._eaten = prev_state._eaten
             self.score = prev_state.score
+            self.copy_hashes(prev_state)
+        else:
+            # see food_hash and capsule_hash
+            self._food_hash = self._food_hash_of = None
+            self._capsule_hash = self._capsule_hash_of = None
 
         self._food_eaten = None
         self._food_added = None
@@ -409,17 +677,122 @@ class GameStateData:
         self._lose = False
         self._win = False
         self.score_change = 0
+        # None when every agent state belongs to this data packet alone
+        self._agent_states_owned = None
+
+    def copy_on_write(self):
+        """
+        Generates a new data packet that shares the agent states, food and
+        capsules of this one instead of copying them.
+
+        Shared values must never be changed in place: use
+        get_mutable_agent_state before changing an agent state, and replace
+        food or capsules with a copy before changing them.
+        """
+        state = GameStateData()
+        state.food = self.food
+        state.capsules = self.capsules
+        state.agent_states = self.agent_states[:]
+        state._agent_states_owned = [False] * len(self.agent_states)
+        state.layout = self.layout
+        state._eaten = self._eaten
+        state.score = self.score
+        state.copy_hashes(self)
+        return state
+
+    def detach(self):
+        """
+        Gives this data packet copies of its own of the agent states, food
+        and capsules it shares (see copy_on_write), so that changing them in
+        place does not change any other packet.
+        """
+        self.food = self.food.copy()
+        self.capsules = self.capsules[:]
+        self.agent_states = self.copy_agent_states(self.agent_states)
+        self._agent_states_owned = None
+
+    def get_mutable_agent_state(self, index):
+        """
+        Returns the agent state at index, first copying it if it is shared
+        with another data packet (see copy_on_write).
+        """
+        owned = self._agent_states_owned
+        if owned != None and not owned[index]:
+            self.agent_states[index] = self.agent_states[index].copy()
+            owned[index] = True
+        return self.agent_states[index]
 
     def deep_copy(self):
         state = GameStateData(self)
         state.food = self.food.deep_copy()
-        state.layout = self.layout.deep_copy()
+        # the layout never changes during a game, so it is shared
         state._agent_moved = self._agent_moved
         state._food_eaten = self._food_eaten
         state._food_added = self._food_added
         state._capsule_eaten = self._capsule_eaten
+        state.copy_hashes(self)
         return state
 
+    def copy_hashes(self, other):
+        """
+        Takes over the food and capsule hashes of other.  Each hash is kept
+        with the food bits or capsules it was worked out for, so it holds
+        for any packet with the same food or capsules.
+        """
+        self._food_hash = other._food_hash
+        self._food_hash_of = other._food_hash_of
+        self._capsule_hash = other._capsule_hash
+        self._capsule_hash_of = other._capsule_hash_of
+
+    def food_hash(self):
+        """
+        Returns the Zobrist hash of the food.  It is worked out from the
+        whole grid only when the food is not what it was last hashed for
+        (say because an agent changed a grid in place); set_food keeps it
+        up to date as food is eaten or dropped.
+        """
+        bits = grid_bits(self.food)
+        if self._food_hash_of != bits:
+            keys = zobrist_keys(self.food.width, self.food.height)[0]
+            self._food_hash = zobrist_hash(self.food.as_list(), keys, self.food.height)
+            self._food_hash_of = bits
+        return self._food_hash
+
+    def capsule_hash(self):
+        "Returns the Zobrist hash of the capsules (see food_hash)"
+        capsules = tuple(self.capsules)
+        if self._capsule_hash_of != capsules:
+            keys = zobrist_keys(self.layout.width, self.layout.height)[1]
+            self._capsule_hash = zobrist_hash(capsules, keys, self.layout.height)
+            self._capsule_hash_of = capsules
+        return self._capsule_hash
+
+    def set_food(self, x, y, value):
+        """
+        Sets food[x][y] to value on a new copy of the food grid (the old one
+        may be shared, see copy_on_write), updating the food hash with one
+        xor instead of hashing the grid again.
+        """
+        food_hash = self.food_hash()
+        food = self.food.copy()
+        if food[x][y] != value:
+            food[x][y] = value
+            food_hash ^= zobrist_keys(food.width, food.height)[0][x * food.height + y]
+        self.food = food
+        self._food_hash = food_hash
+        self._food_hash_of = grid_bits(food)
+
+    def remove_capsule(self, position):
+        "Removes a capsule from a new copy of the capsule list, updating its hash"
+        capsule_hash = self.capsule_hash()
+        capsules = self.capsules[:]
+        capsules.remove(position)
+        x, y = position
+        capsule_hash ^= zobrist_keys(self.layout.width, self.layout.height)[1][x * self.layout.height + y]
+        self.capsules = capsules
+        self._capsule_hash = capsule_hash
+        self._capsule_hash_of = tuple(capsules)
+
     def copy_agent_states(self, agent_states):
         copied_states = []
         for agent_state in agent_states:
@@ -446,14 +819,12 @@ class GameStateData:
     def __hash__(self):
         """
         Allows states to be keys of dictionaries.
+
+        The food and capsules go in through their Zobrist hashes, which are
+        kept up to date as they change, so hashing a state costs the same
+        however big the board is.
         """
-        for i, state in enumerate(self.agent_states):
-            try:
-                int(hash(state))
-            except TypeError as e:
-                print(e)
-                #hash(state)
-        return int((hash(tuple(self.agent_states)) + 13 * hash(self.food) + 113 * hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575)
+        return hash((tuple(self.agent_states), self.food_hash(), self.capsule_hash(), self.score))
 
     def __str__(self):
         width, height = self.layout.width, self.layout.height
@@ -517,6 +888,8 @@ class GameStateData:
         #self.capsules = []
         self.capsules = layout.capsules[:]
         self.layout = layout
+        self.food_hash()
+        self.capsule_hash()
         self.score = 0
         self.score_change = 0
 
@@ -556,6 +929,10 @@ class Game:
         self.total_agent_times = [0 for agent in agents]
         self.total_agent_time_warnings = [0 for agent in agents]
         self.agent_timeout = False
+        # a game_profiler.GameProfiler to time each phase of each move, if any
+        self.profiler = None
+        # a replay.ReplayWriter to write each move to as it is played, if any
+        self.recorder = None
         import io
         self.agent_output = [io.StringIO() for agent in agents]
 
@@ -573,6 +950,17 @@ class Game:
         self.agent_crashed = True
         self.rules.agent_crash(self, agent_index)
 
+    def _timeout_function(self, agent, name, timeout):
+        """
+        Returns the agent's method called name, made to raise
+        TimeoutFunctionException after timeout seconds.  Agents running in
+        a worker process (see agent_sandbox.py) time their own calls;
+        others are wrapped in a TimeoutFunction.
+        """
+        if hasattr(agent, 'call_with_timeout'):
+            return lambda *args: agent.call_with_timeout(name, timeout, *args)
+        return TimeoutFunction(getattr(agent, name), timeout)
+
     OLD_STDOUT = None
     OLD_STDERR = None
 
@@ -600,6 +988,7 @@ class Game:
         """
         self.display.initialize(self.state.data)
         self.num_moves = 0
+        profiler = self.profiler
 
         ###self.display.initialize(self.state.make_observation(1).data)
         # inform learning agents of the game start
@@ -617,10 +1006,14 @@ class Game:
                 self.mute(i)
                 if self.catch_exceptions:
                     try:
-                        timed_func = TimeoutFunction(agent.register_initial_state, int(self.rules.get_max_startup_time(i)))
+                        timed_func = self._timeout_function(agent, 'register_initial_state', self.rules.get_max_startup_time(i))
                         try:
                             start_time = time.time()
+                            if profiler != None:
+                                profiler.begin(i, 'register_initial_state')
                             timed_func(self.state.deep_copy())
+                            if profiler != None:
+                                profiler.end()
                             time_taken = time.time() - start_time
                             self.total_agent_times[i] += time_taken
                         except TimeoutFunctionException:
@@ -634,7 +1027,13 @@ class Game:
                         self.unmute()
                         return
                 else:
+                    start_time = time.time()
+                    if profiler != None:
+                        profiler.begin(i, 'register_initial_state')
                     agent.register_initial_state(self.state.deep_copy())
+                    if profiler != None:
+                        profiler.end()
+                    self.total_agent_times[i] += time.time() - start_time
                 ## TODO: could this exceed the total time
                 self.unmute()
 
@@ -646,15 +1045,25 @@ class Game:
             agent = self.agents[agent_index]
             move_time = 0
             skip_action = False
-            # Generate an observation of the state
+            # Generate an observation of the state.  An observation_function
+            # marked copies_state (see CaptureAgent.observation_function) is
+            # handed the game's own state, since it only reads it to make an
+            # observation of the agent's own; any other gets a deep copy
             if 'observation_function' in dir(agent):
+                observed_state = self.state
+                if not getattr(agent.observation_function, 'copies_state', False):
+                    observed_state = self.state.deep_copy()
                 self.mute(agent_index)
                 if self.catch_exceptions:
                     try:
-                        timed_func = TimeoutFunction(agent.observation_function, int(self.rules.get_move_timeout(agent_index)))
+                        timed_func = self._timeout_function(agent, 'observation_function', self.rules.get_move_timeout(agent_index))
                         try:
                             start_time = time.time()
-                            observation = timed_func(self.state.deep_copy())
+                            if profiler != None:
+                                profiler.begin(agent_index, 'observation_function')
+                            observation = timed_func(observed_state)
+                            if profiler != None:
+                                profiler.end()
                         except TimeoutFunctionException:
                             skip_action = True
                         move_time += time.time() - start_time
@@ -664,7 +1073,13 @@ class Game:
                         self.unmute()
                         return
                 else:
-                    observation = agent.observation_function(self.state.deep_copy())
+                    start_time = time.time()
+                    if profiler != None:
+                        profiler.begin(agent_index, 'observation_function')
+                    observation = agent.observation_function(observed_state)
+                    if profiler != None:
+                        profiler.end()
+                    move_time += time.time() - start_time
                 self.unmute()
             else:
                 observation = self.state.deep_copy()
@@ -674,12 +1089,16 @@ class Game:
             self.mute(agent_index)
             if self.catch_exceptions:
                 try:
-                    timed_func = TimeoutFunction(agent.get_action, int(self.rules.get_move_timeout(agent_index)) - int(move_time))
+                    timed_func = self._timeout_function(agent, 'get_action', self.rules.get_move_timeout(agent_index) - move_time)
                     try:
                         start_time = time.time()
                         if skip_action:
                             raise TimeoutFunctionException()
+                        if profiler != None:
+                            profiler.begin(agent_index, 'get_action')
                         action = timed_func(observation)
+                        if profiler != None:
+                            profiler.end()
                     except TimeoutFunctionException:
                         print("Agent %d timed out on a single move!" % agent_index, file=sys.stderr)
                         self.agent_timeout = True
@@ -713,11 +1132,20 @@ class Game:
                     self.unmute()
                     return
             else:
+                start_time = time.time()
+                if profiler != None:
+                    profiler.begin(agent_index, 'get_action')
                 action = agent.get_action(observation)
+                if profiler != None:
+                    profiler.end()
+                move_time += time.time() - start_time
+                self.total_agent_times[agent_index] += move_time
             self.unmute()
 
             # Execute the action
             self.move_history.append((agent_index, action))
+            if profiler != None:
+                profiler.begin(agent_index, 'generate_successor')
             if self.catch_exceptions:
                 try:
                     self.state = self.state.generate_successor(agent_index, action)
@@ -728,14 +1156,26 @@ class Game:
                     return
             else:
                 self.state = self.state.generate_successor(agent_index, action)
+            if profiler != None:
+                profiler.end()
+            if self.recorder != None:
+                self.recorder.record_move(agent_index, action, self.state)
 
             # Change the display
+            if profiler != None:
+                profiler.begin(agent_index, 'display.update')
             self.display.update(self.state.data)
+            if profiler != None:
+                profiler.end()
             ###idx = agent_index - agent_index % 2 + 1
             ###self.display.update( self.state.make_observation(idx).data )
 
             # Allow for game specific conditions (winning, losing, etc.)
+            if profiler != None:
+                profiler.begin(agent_index, 'rules.process')
             self.rules.process(self.state, self)
+            if profiler != None:
+                profiler.end()
             # Track progress
             if agent_index == num_agents + 1:
                 self.num_moves += 1
@@ -750,7 +1190,11 @@ class Game:
             if "final" in dir(agent):
                 try:
                     self.mute(agent_index)
+                    if profiler != None:
+                        profiler.begin(agent_index, 'final')
                     agent.final(self.state)
+                    if profiler != None:
+                        profiler.end()
                     self.unmute()
                 except Exception as data:
                     if not self.catch_exceptions:
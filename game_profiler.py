@@ -0,0 +1,225 @@
+"""game_profiler.py
+
+Champlain College CSI-480, Fall 2017
+The following code was adapted by Joshua Auerbach (jauerbach@champlain.edu)
+from the UC Berkeley Pacman Projects (see license and attribution below).
+
+----------------------
+Licensing Information:  You are free to use or extend these projects for
+educational purposes provided that (1) you do not distribute or publish
+solutions, (2) you retain this notice, and (3) you provide clear
+attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+
+Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+The core projects and autograders were primarily created by John DeNero
+(denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+Student side autograding was added by Brad Miller, Nick Hay, and
+Pieter Abbeel (pabbeel@cs.berkeley.edu).
+"""
+
+"""
+Records where the time of a game goes.
+
+A Game with a GameProfiler in its profiler attribute times every phase of
+every move with time.perf_counter: the agent's observation_function and
+get_action, and the engine's generate_successor, rules.process and
+display.update (plus register_initial_state and final once per game).
+Each time is charged to the agent whose move it was.  With profile_agents,
+the agents' own calls also run under a cProfile.Profile per agent, so the
+report can say which of their functions the time went to.
+
+report() returns all of it as a dictionary that json.dumps can write: for
+each agent and phase the number of calls, total, mean, percentiles and
+maximum in seconds, and a histogram over HISTOGRAM_EDGES.  Time that none
+of the phases account for (muting agents, bookkeeping in Game.run) is
+reported as other.
+
+Agents running in worker processes (see agent_sandbox.py) are timed the
+same way, including the trip over the pipe, but their cProfile only sees
+the game's process waiting on them.
+
+Example:
+python capture.py -r my_team -b baseline_team -q --profile_agents
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import time
+
+AGENT_PHASES = ['register_initial_state', 'observation_function', 'get_action', 'final']
+ENGINE_PHASES = ['generate_successor', 'rules.process', 'display.update']
+PHASES = AGENT_PHASES + ENGINE_PHASES
+
+# Upper edges of the histogram buckets, in seconds; the last bucket counts
+# everything slower than the last edge
+HISTOGRAM_EDGES = [1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3, 2e-3, 5e-3,
+                   1e-2, 2e-2, 5e-2, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0]
+
+# How many functions of each agent's cProfile go in the report
+TOP_FUNCTIONS = 25
+
+
+def percentile(sorted_times, fraction):
+    "The time below which fraction of sorted_times lie (nearest rank)"
+    if not sorted_times:
+        return 0.0
+    rank = int(round(fraction * (len(sorted_times) - 1)))
+    return sorted_times[rank]
+
+
+def summarize(times):
+    "Returns the statistics and histogram of a list of times, for a report"
+    times = sorted(times)
+    counts = [0] * (len(HISTOGRAM_EDGES) + 1)
+    bucket = 0
+    for t in times:
+        while bucket < len(HISTOGRAM_EDGES) and t > HISTOGRAM_EDGES[bucket]:
+            bucket += 1
+        counts[bucket] += 1
+    total = sum(times)
+    return {'calls': len(times),
+            'total': total,
+            'mean': total / len(times) if times else 0.0,
+            'p50': percentile(times, 0.5),
+            'p90': percentile(times, 0.9),
+            'p99': percentile(times, 0.99),
+            'max': times[-1] if times else 0.0,
+            'histogram': counts}
+
+
+class GameProfiler:
+    """
+    Per-agent, per-phase timings of one game.  Call start_game and
+    end_game around Game.run, which calls begin and end around each phase.
+    A phase that never ends (because the agent timed out or crashed) is
+    dropped.
+    """
+
+    def __init__(self, num_agents, profile_agents=False):
+        self.num_agents = num_agents
+        self.profile_agents = profile_agents
+        self.times = [dict((phase, []) for phase in PHASES) for i in range(num_agents)]
+        self.profiles = [None] * num_agents
+        if profile_agents:
+            self.profiles = [cProfile.Profile() for i in range(num_agents)]
+        self.phase = None
+        self.agent_index = None
+        self.start_time = None
+        self.game_start_time = None
+        self.game_time = 0.0
+
+    def start_game(self):
+        self.game_start_time = time.perf_counter()
+
+    def end_game(self):
+        self.abandon()
+        if self.game_start_time != None:
+            self.game_time = time.perf_counter() - self.game_start_time
+
+    def begin(self, agent_index, phase):
+        "Starts timing phase for agent_index"
+        self.abandon()
+        self.phase = phase
+        self.agent_index = agent_index
+        if self.profile_agents and phase in AGENT_PHASES:
+            self.profiles[agent_index].enable()
+        self.start_time = time.perf_counter()
+
+    def end(self):
+        "Stops timing the phase begun last and returns how long it took"
+        elapsed = time.perf_counter() - self.start_time
+        if self.profile_agents and self.phase in AGENT_PHASES:
+            self.profiles[self.agent_index].disable()
+        self.times[self.agent_index][self.phase].append(elapsed)
+        self.phase = None
+        return elapsed
+
+    def abandon(self):
+        "Drops a phase that did not finish, stopping its cProfile"
+        if self.phase == None:
+            return
+        if self.profile_agents and self.phase in AGENT_PHASES:
+            self.profiles[self.agent_index].disable()
+        self.phase = None
+
+    def top_functions(self, agent_index, limit=TOP_FUNCTIONS):
+        """
+        Returns the functions agent_index spent the most time in (counting
+        what they call), as a list of dictionaries.
+        """
+        profile = self.profiles[agent_index]
+        if profile == None:
+            return []
+        stats = pstats.Stats(profile, stream=io.StringIO())
+        if not stats.stats:
+            return []
+        functions = []
+        for (filename, line, name), (primitive_calls, calls, own_time, cumulative_time, callers) in stats.stats.items():
+            functions.append({'function': '%s:%d(%s)' % (filename, line, name), 'calls': calls,
+                              'own_time': own_time, 'cumulative_time': cumulative_time})
+        functions.sort(key=lambda f: f['cumulative_time'], reverse=True)
+        return functions[:limit]
+
+    def dump_profile(self, agent_index, filename):
+        "Writes the cProfile of agent_index in pstats format (for snakeviz and the like)"
+        if self.profiles[agent_index] != None:
+            self.profiles[agent_index].dump_stats(filename)
+
+    def report(self, game=None):
+        """
+        Returns the timings as a dictionary, with the outcome of game
+        (the Game that was profiled) if it is given.
+        """
+        agents = []
+        phase_totals = dict((phase, []) for phase in PHASES)
+        accounted = 0.0
+        for index in range(self.num_agents):
+            phases = {}
+            for phase in PHASES:
+                times = self.times[index][phase]
+                phase_totals[phase].extend(times)
+                accounted += sum(times)
+                if times:
+                    phases[phase] = summarize(times)
+            agent = {'index': index, 'phases': phases}
+            if game != None and game.agents[index] != None:
+                agent['agent'] = type(game.agents[index]).__name__
+            if self.profile_agents:
+                agent['top_functions'] = self.top_functions(index)
+            agents.append(agent)
+
+        report = {'histogram_edges': HISTOGRAM_EDGES,
+                  'game_time': self.game_time,
+                  'other_time': max(0.0, self.game_time - accounted),
+                  'phases': dict((phase, summarize(times)) for phase, times in phase_totals.items() if times),
+                  'agents': agents}
+        if game != None:
+            report['moves'] = len(game.move_history)
+            report['score'] = game.state.data.score
+            report['crashed'] = game.agent_crashed
+            report['timed_out'] = game.agent_timeout
+        return report
+
+    def write_report(self, filename, game=None):
+        "Writes report(game) to filename as JSON"
+        with open(filename, 'w') as f:
+            json.dump(self.report(game), f, indent=1, sort_keys=True)
+
+    def print_summary(self):
+        "Prints a table of where the time of the game went"
+        print('%-8s %-24s %7s %10s %10s %10s %10s' % ('Agent', 'Phase', 'Calls', 'Total (s)',
+                                                      'Mean (ms)', 'p99 (ms)', 'Max (ms)'))
+        for index in range(self.num_agents):
+            for phase in PHASES:
+                times = self.times[index][phase]
+                if not times:
+                    continue
+                stats = summarize(times)
+                print('%-8d %-24s %7d %10.3f %10.3f %10.3f %10.3f' % (
+                    index, phase, stats['calls'], stats['total'], 1000 * stats['mean'],
+                    1000 * stats['p99'], 1000 * stats['max']))
+        accounted = sum(sum(times) for phases in self.times for times in phases.values())
+        print('Game time: %.3f s, of which %.3f s outside the phases above' % (
+            self.game_time, max(0.0, self.game_time - accounted)))
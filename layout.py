@@ -19,6 +19,8 @@ Pieter Abbeel (pabbeel@cs.berkeley.edu).
 
 from util import manhattan_distance
 from game import Grid
+from game import BitGrid
+from game import LegalActionTable
 import os
 import random
 from functools import reduce
@@ -35,13 +37,15 @@ class Layout:
         self.width = len(layout_text[0])
         self.height = len(layout_text)
         self.walls = Grid(self.width, self.height, False)
-        self.food = Grid(self.width, self.height, False)
+        self.food = BitGrid(self.width, self.height, False)
         self.capsules = []
         self.agent_positions = []
         self.num_ghosts = 0
         self.process_layout_text(layout_text)
         self.layout_text = layout_text
         self.total_food = len(self.food.as_list())
+        # the walls never change, so their legal moves can be looked up
+        self.walls.action_table = LegalActionTable(self.walls)
         # self.initialize_visibility_matrix()
 
     def get_num_ghosts(self):
@@ -97,7 +101,29 @@ class Layout:
         return "\n".join(self.layout_text)
 
     def deep_copy(self):
-        return Layout(self.layout_text[:])
+        """
+        Returns an independent copy of this layout without re-parsing the
+        layout text.
+
+        Game states never change their layout, so they share it rather than
+        copying it (see GameStateData.deep_copy); this is only needed by
+        code that wants to edit a layout.
+        """
+        layout = Layout.__new__(Layout)
+        layout.__dict__.update(self.__dict__)
+        layout.walls = self.walls.copy()
+        # Grid.copy does not carry the table over; code that edits the
+        # copy's walls has to build it again afterwards
+        layout.walls.action_table = LegalActionTable(layout.walls)
+        layout.food = self.food.copy()
+        layout.capsules = self.capsules[:]
+        layout.agent_positions = self.agent_positions[:]
+        layout.layout_text = self.layout_text[:]
+        return layout
+
+    def __deepcopy__(self, memo):
+        # layouts are immutable once built, so copy.deepcopy of a game state shares it
+        return self
 
     def process_layout_text(self, layout_text):
         """
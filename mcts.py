@@ -0,0 +1,337 @@
+"""mcts.py
+
+Champlain College CSI-480, Fall 2017
+The following code was adapted by Joshua Auerbach (jauerbach@champlain.edu)
+from the UC Berkeley Pacman Projects (see license and attribution below).
+
+----------------------
+Licensing Information:  You are free to use or extend these projects for
+educational purposes provided that (1) you do not distribute or publish
+solutions, (2) you retain this notice, and (3) you provide clear
+attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+
+Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+The core projects and autograders were primarily created by John DeNero
+(denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+Student side autograding was added by Brad Miller, Nick Hay, and
+Pieter Abbeel (pabbeel@cs.berkeley.edu).
+"""
+
+"""
+Monte Carlo tree search (UCT) for capture agents.
+
+MonteCarloTreeSearch grows a search tree from the current observation on a
+rollout.RolloutSimulator until its time limit runs out, then picks the most
+visited move.  Every agent whose position is known takes its turn in the
+tree, in the usual turn order; agents that cannot be seen do not move, but
+the clock still runs for their turns.  Each agent picks moves with UCB1 for
+its own team, so opponents are assumed to play against us.
+
+Positions reached by different move orders share a node: nodes are kept in
+a transposition table keyed by the simulator's state_key and the agent to
+move.  Below the tree each iteration plays a short rollout with the
+rollout policy and scores where it ends with the evaluation function (for
+the searching agent's team), and that value is backed up along the path.
+
+The tree is kept from one move to the next.  When the observation at the
+next turn is a position the tree already holds (our move, our teammate's
+and the opponents' replies were all in it), that node becomes the new root
+with everything already searched below it, and nodes it cannot reach are
+dropped.  Otherwise the search starts a new tree.
+
+MCTSAgent is a CaptureAgent whose choose_action runs the search.  Subclass
+it and override evaluate_state and rollout_action to give it better
+policies, or build a MonteCarloTreeSearch directly for other agents.
+
+Example:
+python capture.py -r mcts -b baseline_team
+"""
+
+import math
+import random
+import time
+
+from capture_agents import CaptureAgent
+from game import Directions
+import rollout
+
+# Search time per move, in seconds.  CaptureRules.get_move_warning_time
+# allows one second per move, and the rest is left for observing the
+# state and choosing among the results.
+MOVE_TIME_LIMIT = 0.8
+
+
+def create_team(first_index, second_index, is_red,
+                first='MCTSAgent', second='MCTSAgent', time_limit=str(MOVE_TIME_LIMIT)):
+    """
+    Returns two MCTSAgents; time_limit (seconds of search per move) can be
+    set with --red_opts or --blue_opts.
+    """
+    time_limit = float(time_limit)
+    return [eval(first)(first_index, time_limit=time_limit),
+            eval(second)(second_index, time_limit=time_limit)]
+
+
+def random_rollout_policy(simulator, agent_index):
+    """
+    Picks a random legal move for agent_index, never stopping and only
+    turning back at dead ends.
+    """
+    actions = list(simulator.get_legal_actions(agent_index))
+    actions.remove(Directions.STOP)
+    reverse = Directions.REVERSE[simulator.get_agent_state(agent_index).get_direction()]
+    if reverse in actions and len(actions) > 1:
+        actions.remove(reverse)
+    return random.choice(actions)
+
+
+def score_evaluation(simulator, agent_index):
+    """
+    Scores a position for the team of agent_index: the game score, plus
+    half a point for each dot a teammate is carrying and a tenth of a point
+    for each dot of the other team's that has been eaten (less the same for
+    the opponents).
+    """
+    red = simulator.is_on_red_team(agent_index)
+    value = simulator.get_score()
+    for index in range(simulator.get_num_agents()):
+        carrying = simulator.get_agent_state(index).num_carrying
+        value += 0.5 * carrying if simulator.is_on_red_team(index) else -0.5 * carrying
+    value += 0.1 * (simulator.get_red_food().count() - simulator.get_blue_food().count())
+    if red:
+        return value
+    return -value
+
+
+class SearchNode:
+    """
+    A position in the search tree, with the agent to move.  total is the
+    sum of the values (for the searching team) backed up through it.
+    """
+    __slots__ = ('key', 'agent', 'untried', 'children', 'visits', 'total')
+
+    def __init__(self, key, agent, actions):
+        self.key = key
+        self.agent = agent
+        self.untried = actions
+        self.children = {}
+        self.visits = 0
+        self.total = 0.0
+
+    def value(self):
+        if self.visits == 0:
+            return 0.0
+        return self.total / self.visits
+
+
+class MonteCarloTreeSearch:
+    """
+    UCT search for one agent.  evaluation(simulator, index) scores a
+    position for the team of index, and rollout_policy(simulator, agent)
+    returns the move agent plays in a rollout.
+
+    Each search is limited by time_limit seconds of wall-clock time, and
+    also by max_iterations if that is given (which is handy for
+    repeatable tests).  Nodes are not expanded more than max_depth moves
+    below the root, and rollouts are rollout_depth moves long.  With
+    reuse_tree False, every search starts from an empty tree.
+    """
+
+    def __init__(self, game_state, index, evaluation=score_evaluation,
+                 rollout_policy=random_rollout_policy, time_limit=MOVE_TIME_LIMIT,
+                 exploration=math.sqrt(2), max_depth=40, rollout_depth=10, max_iterations=None,
+                 reuse_tree=True):
+        self.index = index
+        self.evaluation = evaluation
+        self.rollout_policy = rollout_policy
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.max_depth = max_depth
+        self.rollout_depth = rollout_depth
+        self.max_iterations = max_iterations
+        self.reuse_tree = reuse_tree
+
+        self.simulator = rollout.RolloutSimulator(game_state)
+        self.table = {}
+        self.root = None
+        self.iterations = 0
+        # visits under the root carried over from the previous search
+        self.reused_visits = 0
+
+    def choose_action(self, game_state):
+        """
+        Searches from game_state until the time runs out and returns the
+        move the search visited most.
+        """
+        self.search(game_state)
+        return self.best_action()
+
+    def search(self, game_state):
+        """
+        Grows the tree from game_state for the time limit, starting from
+        the matching node of the last search if there is one.
+        """
+        start_time = time.time()
+        simulator = self.simulator
+        simulator.load(game_state)
+        root = None
+        if self.reuse_tree:
+            root = self.table.get((simulator.state_key(), self.index))
+        if root == None:
+            self.table = {}
+            self.root = self.get_node(self.index)
+        else:
+            self.promote(root)
+        self.reused_visits = self.root.visits
+        self.iterations = 0
+        while time.time() - start_time < self.time_limit:
+            if self.max_iterations != None and self.iterations >= self.max_iterations:
+                break
+            self.iterate()
+            self.iterations += 1
+
+    def promote(self, root):
+        "Makes root the root of the tree, dropping every node it does not lead to"
+        table = {root.key: root}
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for child in node.children.values():
+                if child.key not in table:
+                    table[child.key] = child
+                    stack.append(child)
+        self.table = table
+        self.root = root
+
+    def best_action(self):
+        "Returns the most visited move at the root (or STOP before any search)"
+        best_action = Directions.STOP
+        best_visits = -1
+        for action, child in self.root.children.items():
+            if child.visits > best_visits:
+                best_action = action
+                best_visits = child.visits
+        return best_action
+
+    def iterate(self):
+        "Selects, expands, rolls out and backs up one path through the tree"
+        simulator = self.simulator
+        simulator.reset()
+        node = self.root
+        path = [node]
+        depth = 0
+
+        # selection, down through nodes that have tried all of their moves
+        while not node.untried and node.children and depth < self.max_depth:
+            if self.is_terminal():
+                break
+            action = self.select(node)
+            simulator.apply(node.agent, action)
+            self.next_agent(node.agent)
+            node = node.children[action]
+            path.append(node)
+            depth += 1
+
+        # expansion
+        if node.untried and depth < self.max_depth and not self.is_terminal():
+            action = node.untried.pop()
+            simulator.apply(node.agent, action)
+            child = self.get_node(self.next_agent(node.agent))
+            node.children[action] = child
+            node = child
+            path.append(node)
+
+        # rollout
+        agent = node.agent
+        for step in range(self.rollout_depth):
+            if self.is_terminal():
+                break
+            simulator.apply(agent, self.rollout_policy(simulator, agent))
+            agent = self.next_agent(agent)
+
+        value = self.evaluation(simulator, self.index)
+        for node in path:
+            node.visits += 1
+            node.total += value
+
+    def select(self, node):
+        "The child move of node with the best UCB1 bound for the agent to move"
+        sign = 1.0
+        if self.simulator.is_on_red_team(node.agent) != self.simulator.is_on_red_team(self.index):
+            sign = -1.0
+        log_visits = math.log(max(node.visits, 1))
+        best_action = None
+        best_bound = None
+        for action, child in node.children.items():
+            if child.visits == 0:
+                return action
+            bound = sign * child.total / child.visits + self.exploration * math.sqrt(log_visits / child.visits)
+            if best_bound == None or bound > best_bound:
+                best_action = action
+                best_bound = bound
+        return best_action
+
+    def get_node(self, agent):
+        "The node for the simulator's position with agent to move, from the table if it is there"
+        key = (self.simulator.state_key(), agent)
+        node = self.table.get(key)
+        if node == None:
+            actions = list(self.simulator.get_legal_actions(agent))
+            random.shuffle(actions)
+            node = self.table[key] = SearchNode(key, agent, actions)
+        return node
+
+    def next_agent(self, agent):
+        """
+        Returns the next agent after agent, in turn order, whose position is
+        known, skipping the turns of the agents in between on the simulator.
+        """
+        simulator = self.simulator
+        positions = simulator.positions
+        next = (agent + 1) % len(positions)
+        while positions[next] == None and next != agent:
+            simulator.skip_turn(next)
+            next = (next + 1) % len(positions)
+        return next
+
+    def is_terminal(self):
+        return self.simulator.is_over() or self.simulator.get_timeleft() <= 0
+
+
+class MCTSAgent(CaptureAgent):
+    """
+    A CaptureAgent that chooses each move with MonteCarloTreeSearch.
+    """
+
+    def __init__(self, index, time_for_computing=.1, time_limit=MOVE_TIME_LIMIT, **args):
+        CaptureAgent.__init__(self, index, time_for_computing)
+        self.time_limit = time_limit
+        self.search_args = args
+        self.search = None
+
+    def register_initial_state(self, game_state):
+        CaptureAgent.register_initial_state(self, game_state)
+        self.search = MonteCarloTreeSearch(game_state, self.index, self.evaluate_state, self.rollout_action,
+                                           time_limit=self.time_limit, **self.search_args)
+
+    def choose_action(self, game_state):
+        return self.search.choose_action(game_state)
+
+    def evaluate_state(self, simulator, index):
+        """
+        Scores a simulated position for the team of index: score_evaluation,
+        less a hundredth of a point for every step between each of us and
+        the nearest dot we can eat, so that the search heads for food even
+        when none is within reach.
+        """
+        value = score_evaluation(simulator, index)
+        food_list = self.get_food(simulator).as_list()
+        if food_list:
+            for teammate in self.get_team(simulator):
+                position = simulator.get_agent_position(teammate)
+                value -= 0.01 * min([self.distancer.get_distance(position, food) for food in food_list])
+        return value
+
+    def rollout_action(self, simulator, agent_index):
+        "The move agent_index plays in a rollout (see random_rollout_policy)"
+        return random_rollout_policy(simulator, agent_index)
@@ -19,6 +19,7 @@ Pieter Abbeel (pabbeel@cs.berkeley.edu).
 
 from capture_agents import CaptureAgent
 import random
+import rollout
 import time
 import util
 from game import Directions
@@ -48,6 +49,28 @@ def create_team(first_index, second_index, is_red,
     # The following line is an example only; feel free to change it.
     return [eval(first)(first_index), eval(second)(second_index)]
 
+###################
+# Feature schemas #
+###################
+
+# the features of each behaviour, by slot, so that every candidate action
+# (or end state) can be scored in one matrix-vector product
+GUARD_FEATURES = util.register_feature_schema('my_team.guard', ['distance_to_center'])
+GUARD_DISTANCE_TO_CENTER = GUARD_FEATURES.slot('distance_to_center')
+
+OFFENSIVE_FEATURES = util.register_feature_schema('my_team.offence',
+    ['state_score', 'num_foods', 'sum_distance_to_food', 'closest_enemy',
+     'teammate_distance', 'closest_capsule_distance'])
+STATE_SCORE = OFFENSIVE_FEATURES.slot('state_score')
+NUM_FOODS = OFFENSIVE_FEATURES.slot('num_foods')
+SUM_DISTANCE_TO_FOOD = OFFENSIVE_FEATURES.slot('sum_distance_to_food')
+CLOSEST_ENEMY = OFFENSIVE_FEATURES.slot('closest_enemy')
+TEAMMATE_DISTANCE = OFFENSIVE_FEATURES.slot('teammate_distance')
+CLOSEST_CAPSULE_DISTANCE = OFFENSIVE_FEATURES.slot('closest_capsule_distance')
+
+DEFENSIVE_FEATURES = util.register_feature_schema('my_team.defence', ['distance_to_center'])
+DEFENSIVE_DISTANCE_TO_CENTER = DEFENSIVE_FEATURES.slot('distance_to_center')
+
 ##########
 # Agents #
 ##########
@@ -87,6 +110,7 @@ class DummyAgent(CaptureAgent):
         self.set_center(game_state)
         self.eaten_food = 0
         self.prev_food_state = self.get_food_you_are_defending(game_state)
+        self.rollout = rollout.RolloutSimulator(game_state)
         self.opponent_indices = self.get_opponents(game_state)
         self.team_indices = self.get_team(game_state)
         
@@ -339,7 +363,8 @@ class DummyAgent(CaptureAgent):
 
     def choose_guard_action(self, game_state):
         actions = game_state.get_legal_actions(self.index)
-        values = [self.evaluate_guard(game_state, a) for a in actions]
+        fill = lambda row, action: self.fill_guard_features(row, game_state, action)
+        values = GUARD_FEATURES.evaluate_all(fill, actions, self.get_guard_weights(game_state, None))
         max_values = max(values)
         best_actions = [a for a, v in zip(actions, values) if v == max_values]
         return random.choice(best_actions)
@@ -350,15 +375,18 @@ class DummyAgent(CaptureAgent):
         return features * weights
 
     def get_guard_features(self, game_state, action):
-        features = util.Counter()
+        row = [0] * len(GUARD_FEATURES.names)
+        self.fill_guard_features(row, game_state, action)
+        return GUARD_FEATURES.vector(row)
+
+    def fill_guard_features(self, row, game_state, action):
         successor = self.get_successor(game_state, action)
         successor_state = successor.get_agent_state(self.index)
         successor_pos = successor_state.get_position()
         min_distance = 99999999999999
         if self.get_maze_distance(successor_pos, self.center) < min_distance:
             min_distance = self.get_maze_distance(successor_pos, self.center)
-        features['distance_to_center'] = min_distance
-        return features
+        row[GUARD_DISTANCE_TO_CENTER] = min_distance
 
     def get_guard_weights(self, game_state, action):
         return {'distance_to_center': -1}
@@ -412,51 +440,43 @@ class DummyAgent(CaptureAgent):
 
 
     def monte_carlo_search(self, depth, game_state, iterations):
-        # define a game_state that we will iteratively search through
-        search_state = None
+        # every random search starts from the same snapshot of game_state,
+        # which the simulator resets in place instead of deep copying
+        simulator = self.rollout
+        simulator.load(game_state)
 
         # get the distance to the nearest food
         food_list = self.get_food(game_state).as_list()
         if len(food_list) > 0:
             min_distance = min([self.get_maze_distance(game_state.get_agent_state(self.index).get_position(), food) for food in food_list])
-        # keep track of discovered end_states
-        end_states = []
+        # the features of each end state, scored together at the end
+        end_states = OFFENSIVE_FEATURES.new_matrix(iterations)
         # do random searches for the number of iterations defined
-        while iterations > 0:
-            search_state = game_state.deep_copy()
-            #print search_state.get_agent_state(self.index).get_position()
+        for row in end_states:
+            simulator.reset()
             # if min_distance = 0, we want the action that called MonteCarlo
-            if min_distance == 0:
-                end_states.append(game_state)
-            # otherwise commit to random searches for depth specified
-            else:
+            # (the snapshot itself); otherwise commit to random searches for
+            # depth specified
+            if min_distance != 0:
                 tree = depth
                 while tree > 0:
-                    actions = search_state.get_legal_actions(self.index)
+                    actions = list(simulator.get_legal_actions(self.index))
                     # stopping is a waste of time
                     actions.remove(Directions.STOP)
-              
+
                     # reversing direction is also a waste of time
-                    rev = Directions.REVERSE[search_state.get_agent_state(self.index).configuration.direction]
+                    rev = Directions.REVERSE[simulator.get_agent_state(self.index).get_direction()]
                     if rev in actions and len(actions) > 1:
                         actions.remove(rev)
-              
+
                     action = random.choice(actions)
-                    #print(action)
-                    search_state = self.get_successor(search_state, action)
+                    simulator.apply(self.index, action)
 
                     tree -= 1
-                end_states.append(search_state)
-                #print search_state.get_agent_state(self.index).get_position()
-            iterations -= 1
+            self.fill_offensive_features(row, simulator)
         # return values (to choose_offensive_action)
-        max_val = -100000
-        pls = None
-        for end_state in end_states:
-            if self.evaluate_offensive(end_state) > max_val:
-                maxval = self.evaluate_offensive(end_state)
-                pls = self.get_offensive_features(end_state)
-            return [self.evaluate_offensive(end_state) for end_state in end_states]
+        weights = OFFENSIVE_FEATURES.weight_vector(self.get_offensive_weights(game_state))
+        return OFFENSIVE_FEATURES.score(end_states, weights)
 
     def food_in_proximity(self, game_state):
         food_list = self.get_food(game_state).as_list()
@@ -472,10 +492,21 @@ class DummyAgent(CaptureAgent):
         weights = self.get_offensive_weights(game_state)
         return features * weights
 
+    def evaluate_offensive_states(self, game_states):
+        "Returns evaluate_offensive of every state, scored all at once"
+        if len(game_states) == 0:
+            return []
+        return OFFENSIVE_FEATURES.evaluate_all(self.fill_offensive_features, game_states,
+                                               self.get_offensive_weights(game_states[0]))
+
     def get_offensive_features(self, game_state):
-        features = util.Counter()
+        row = [0] * len(OFFENSIVE_FEATURES.names)
+        self.fill_offensive_features(row, game_state)
+        return OFFENSIVE_FEATURES.vector(row)
+
+    def fill_offensive_features(self, row, game_state):
         food_list = self.get_food(game_state).as_list()
-        features['state_score'] = -len(food_list)
+        row[STATE_SCORE] = -len(food_list)
 
         myPos = game_state.get_agent_state(self.index).get_position()
         better_food_list = [f for f in food_list if self.get_maze_distance(myPos, f) <= 8]
@@ -484,8 +515,8 @@ class DummyAgent(CaptureAgent):
         for food in better_food_list:
           sum_foods += 1
           sum_distance += self.get_maze_distance(myPos, food)
-        features['num_foods'] = sum_foods
-        features['sum_distance_to_food'] = sum_distance
+        row[NUM_FOODS] = sum_foods
+        row[SUM_DISTANCE_TO_FOOD] = sum_distance
 
         #Calculate Distance to nearest ghost
         min_distance = 999999
@@ -503,15 +534,15 @@ class DummyAgent(CaptureAgent):
         if min_distance == 0:
           min_distance = 0.01
         if min_distance < 6:
-          features['closest_enemy'] = 5 - min_distance #float(1)/(5-min_distance**0.5)
+          row[CLOSEST_ENEMY] = 5 - min_distance #float(1)/(5-min_distance**0.5)
         else:
-          features['closest_enemy'] = 0 #float(1)/(5**0.5)
+          row[CLOSEST_ENEMY] = 0 #float(1)/(5**0.5)
 
         distance = self.get_maze_distance(game_state.get_agent_position(self.teammate_index[0]),game_state.get_agent_position(self.index))
         if distance > 0:
-          features['teammate_distance'] = float(1)/distance
+          row[TEAMMATE_DISTANCE] = float(1)/distance
         else:
-          features['teammate_distance'] = 5
+          row[TEAMMATE_DISTANCE] = 5
 
         capsules = self.get_capsules(game_state)
         min_distance = 9999999
@@ -522,9 +553,9 @@ class DummyAgent(CaptureAgent):
         if min_distance == 0:
           min_distance = 0.01
         if min_distance > 1000:
-          features['closest_capsule_distance'] = 1
+          row[CLOSEST_CAPSULE_DISTANCE] = 1
         else: 
-          features['closest_capsule_distance'] = float(1)/min_distance
+          row[CLOSEST_CAPSULE_DISTANCE] = float(1)/min_distance
 
         # distance = self.get_maze_distance(game_state.get_agent_position(self.teammate_index[0]),game_state.get_agent_position(self.index))
         # if distance > 0:
@@ -532,8 +563,6 @@ class DummyAgent(CaptureAgent):
         # else:
         #   features['teammate_distance'] = 5
 
-        return features
-
     def get_offensive_weights(self, game_state):
         return {'stateScore' : 60, 'num_foods': 50, 'sum_distance_to_food': -5, 'closest_enemy': -10, 'teammate_distance': -90, 'closest_capsule_distance': 80}
 
@@ -549,7 +578,8 @@ class DummyAgent(CaptureAgent):
             successor_pos = successor_state.get_position()
             if not self.in_home_territory(game_state, successor_pos, 0) and not game_state.get_agent_state(self.index).is_pacman:
                 actions.remove(action)
-        values = [self.evaluate_defensive(game_state, a) for a in actions]
+        fill = lambda row, action: self.fill_defensive_features(row, game_state, action)
+        values = DEFENSIVE_FEATURES.evaluate_all(fill, actions, self.get_defensive_weights(game_state, None))
         if len(values) > 0:
             max_values = max(values)
         else:
@@ -563,15 +593,18 @@ class DummyAgent(CaptureAgent):
         return features * weights
 
     def get_defensive_features(self, game_state, action):
-        features = util.Counter()
+        row = [0] * len(DEFENSIVE_FEATURES.names)
+        self.fill_defensive_features(row, game_state, action)
+        return DEFENSIVE_FEATURES.vector(row)
+
+    def fill_defensive_features(self, row, game_state, action):
         successor = self.get_successor(game_state, action)
         successor_state = successor.get_agent_state(self.index)
         successor_pos = successor_state.get_position()
         min_distance = 9999999999
         if (not self.defence_destination == None) and self.get_maze_distance(successor_pos, self.defence_destination) < min_distance:
             min_distance = self.get_maze_distance(successor_pos, self.defence_destination)
-        features['distance_to_center'] = min_distance
-        return features
+        row[DEFENSIVE_DISTANCE_TO_CENTER] = min_distance
 
     def get_defensive_weights(self, game_state, action):
         return {'distance_to_center': 1}
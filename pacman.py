@@ -46,6 +46,7 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
+from game import Configuration
 from util import nearest_point
 from util import manhattan_distance
 import util
@@ -377,8 +378,7 @@ class PacmanRules:
         # Eat food
         if state.data.food[x][y]:
             state.data.score_change += 10
-            state.data.food = state.data.food.copy()
-            state.data.food[x][y] = False
+            state.data.set_food(x, y, False)
             state.data._food_eaten = position
             # TODO: cache num_food?
             num_food = state.get_num_food()
@@ -387,7 +387,7 @@ class PacmanRules:
                 state.data._win = True
         # Eat capsule
         if(position in state.get_capsules()):
-            state.data.capsules.remove(position)
+            state.data.remove_capsule(position)
             state.data._capsule_eaten = position
             # Reset all ghosts' scared timers
             for index in range(1, len(state.data.agent_states)):
@@ -433,7 +433,8 @@ class GhostRules:
     def decrement_timer(ghost_state):
         timer = ghost_state.scared_timer
         if timer == 1:
-            ghost_state.configuration.pos = nearest_point(ghost_state.configuration.pos)
+            ghost_state.configuration = Configuration(nearest_point(ghost_state.configuration.pos),
+                                                      ghost_state.configuration.direction)
         ghost_state.scared_timer = max(0, timer - 1)
     decrement_timer = staticmethod(decrement_timer)
 
@@ -0,0 +1,311 @@
+"""replay.py
+
+Champlain College CSI-480, Fall 2017
+The following code was adapted by Joshua Auerbach (jauerbach@champlain.edu)
+from the UC Berkeley Pacman Projects (see license and attribution below).
+
+----------------------
+Licensing Information:  You are free to use or extend these projects for
+educational purposes provided that (1) you do not distribute or publish
+solutions, (2) you retain this notice, and (3) you provide clear
+attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+
+Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+The core projects and autograders were primarily created by John DeNero
+(denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+Student side autograding was added by Brad Miller, Nick Hay, and
+Pieter Abbeel (pabbeel@cs.berkeley.edu).
+"""
+
+"""
+A compact replay format for capture games, written while the game is played.
+
+A replay file is MAGIC followed by records, and is only ever appended to:
+
+  header    a 4 byte length and that many bytes of JSON: the layout text,
+            number of agents, game length, team names, random seed (if
+            known), starting agent, keyframe interval and whether moves
+            carry checksums
+  move      one byte, agent index * 8 + action code (see ACTIONS), then a
+            4 byte state_checksum of the state after the move if the
+            header says so
+  keyframe  KEYFRAME, the number of moves played (4 bytes), and a 4 byte
+            length and that many bytes of the pickled
+            agent_sandbox.compact_state of the state after that move
+  end       END, then a 4 byte length and JSON with the final score,
+            number of moves and whether an agent crashed or timed out
+
+Numbers are unsigned little endian.  ReplayWriter flushes every record as
+it is written, so a game that crashes (or a process that is killed) still
+leaves a replay of every move played so far; Replay reads up to the last
+whole record.
+
+A keyframe is written every keyframe_interval moves, so Replay.state_at
+can get to any move by expanding the keyframe before it and playing at
+most keyframe_interval - 1 moves from there, instead of the whole game.
+
+Example:
+python capture.py --record -q
+python capture.py --replay replay-0 --replay_start 900
+"""
+
+import json
+import pickle
+import struct
+import zlib
+
+from agent_sandbox import compact_state, expand_state
+import capture
+from game import Agent, Directions, Game
+import layout
+
+MAGIC = b'CAPREPLAY1\n'
+KEYFRAME = 0x80
+END = 0x81
+
+# Action codes of move records
+ACTIONS = [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST, Directions.STOP]
+ACTION_CODES = dict((action, code) for code, action in enumerate(ACTIONS))
+
+# Moves between keyframes
+KEYFRAME_INTERVAL = 100
+
+LENGTH = struct.Struct('<I')
+CHECKSUM = struct.Struct('<I')
+KEYFRAME_HEADER = struct.Struct('<BII')
+
+
+def is_replay_file(filename):
+    "Whether filename starts like a replay in this format"
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def state_checksum(state):
+    """
+    A 32 bit checksum of the agents, food, capsules, score and time left
+    of a state, which is the same from one run of Python to the next
+    (unlike hash(state), since strings hash differently in each run).
+    """
+    data = state.data
+    agents = []
+    for agent_state in data.agent_states:
+        configuration = agent_state.configuration
+        if configuration == None:
+            agents.append(None)
+        else:
+            agents.append((configuration.pos, configuration.direction, agent_state.is_pacman,
+                           agent_state.scared_timer, agent_state.num_carrying, agent_state.num_returned))
+    summary = (agents, data.food_hash(), data.capsule_hash(), data.score, data.timeleft)
+    return zlib.crc32(repr(summary).encode())
+
+
+def initial_state(layout, num_agents, length):
+    "The state at the start of a game of length moves on layout"
+    state = capture.GameState()
+    state.initialize(layout, num_agents)
+    state.data.timeleft = length
+    return state
+
+
+class ReplayWriter:
+    """
+    Writes the replay of game to filename as it is played.  Set it as the
+    game's recorder before Game.run, which calls record_move after every
+    move, and close it afterwards.
+    """
+
+    def __init__(self, filename, game, red_team_name='Red', blue_team_name='Blue', seed=None,
+                 keyframe_interval=KEYFRAME_INTERVAL, checksums=True):
+        self.filename = filename
+        self.keyframe_interval = keyframe_interval
+        self.checksums = checksums
+        self.num_moves = 0
+        header = {'layout': game.state.data.layout.layout_text,
+                  'num_agents': len(game.agents),
+                  'length': game.length,
+                  'red_team_name': red_team_name,
+                  'blue_team_name': blue_team_name,
+                  'seed': seed,
+                  'starting_index': game.starting_index,
+                  'keyframe_interval': keyframe_interval,
+                  'checksums': checksums}
+        self.file = open(filename, 'wb')
+        self.file.write(MAGIC)
+        self.write_json(header)
+
+    def write_json(self, value):
+        data = json.dumps(value, sort_keys=True).encode()
+        self.file.write(LENGTH.pack(len(data)) + data)
+        self.file.flush()
+
+    def record_move(self, agent_index, action, state):
+        "Appends a move, and a keyframe of state after it when one is due"
+        record = bytes([agent_index * 8 + ACTION_CODES[action]])
+        if self.checksums:
+            record += CHECKSUM.pack(state_checksum(state))
+        self.num_moves += 1
+        if self.num_moves % self.keyframe_interval == 0:
+            keyframe = pickle.dumps(compact_state(state), pickle.HIGHEST_PROTOCOL)
+            record += KEYFRAME_HEADER.pack(KEYFRAME, self.num_moves, len(keyframe)) + keyframe
+        self.file.write(record)
+        self.file.flush()
+
+    def close(self, game=None):
+        "Writes the end of the replay, with the outcome of game if it is given"
+        if self.file.closed:
+            return
+        if game != None:
+            self.file.write(bytes([END]))
+            self.write_json({'score': game.state.data.score,
+                             'moves': self.num_moves,
+                             'crashed': game.agent_crashed,
+                             'timed_out': game.agent_timeout})
+        self.file.close()
+
+
+class Replay:
+    """
+    A replay read from a file.  moves is the list of (agent index, action)
+    pairs played, checksums the state_checksum after each of them (if the
+    replay has them) and end the outcome written when the game finished,
+    or None if the replay was cut off.
+    """
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            data = f.read()
+        if not data.startswith(MAGIC):
+            raise Exception('%s is not a replay file' % filename)
+        offset = len(MAGIC)
+        header, offset = self.read_json(data, offset)
+        if header == None:
+            raise Exception('%s has no replay header' % filename)
+        self.header = header
+        self.layout = layout.Layout(header['layout'])
+        self.num_agents = header['num_agents']
+        self.length = header['length']
+        self.red_team_name = header['red_team_name']
+        self.blue_team_name = header['blue_team_name']
+        self.seed = header['seed']
+        self.starting_index = header['starting_index']
+
+        self.moves = []
+        self.checksums = []
+        # (data offset, length) of the pickled keyframe after each multiple of the interval
+        self.keyframes = {}
+        self.end = None
+        checksums = header['checksums']
+        size = len(data)
+        while offset < size:
+            code = data[offset]
+            if code < KEYFRAME:
+                if checksums:
+                    if offset + 1 + CHECKSUM.size > size:
+                        break
+                    self.checksums.append(CHECKSUM.unpack_from(data, offset + 1)[0])
+                    offset += CHECKSUM.size
+                self.moves.append((code >> 3, ACTIONS[code & 7]))
+                offset += 1
+            elif code == KEYFRAME:
+                if offset + KEYFRAME_HEADER.size > size:
+                    break
+                code, move, length = KEYFRAME_HEADER.unpack_from(data, offset)
+                offset += KEYFRAME_HEADER.size
+                if offset + length > size:
+                    break
+                self.keyframes[move] = (offset, length)
+                offset += length
+            elif code == END:
+                self.end, offset = self.read_json(data, offset + 1)
+                break
+            else:
+                raise Exception('%s has an unknown record at byte %d' % (filename, offset))
+        self.data = data
+        self._initial_state = None
+
+    def read_json(self, data, offset):
+        "Returns the JSON record at offset and the offset after it, or None if it is cut off"
+        if offset + LENGTH.size > len(data):
+            return None, len(data)
+        length = LENGTH.unpack_from(data, offset)[0]
+        offset += LENGTH.size
+        if offset + length > len(data):
+            return None, len(data)
+        return json.loads(data[offset:offset + length].decode()), offset + length
+
+    def __len__(self):
+        return len(self.moves)
+
+    def initial_state(self):
+        "The state before the first move"
+        if self._initial_state == None:
+            self._initial_state = initial_state(self.layout, self.num_agents, self.length)
+        return self._initial_state
+
+    def state_at(self, move):
+        """
+        Returns the state after the first move moves of the game, starting
+        from the last keyframe at or before it.
+        """
+        if move < 0 or move > len(self.moves):
+            raise Exception('The replay has moves 0 to %d, not %d' % (len(self.moves), move))
+        initial_state = self.initial_state()
+        # expanding keyframes needs the layout's food count in capture.TOTAL_FOOD
+        capture.TOTAL_FOOD = self.layout.total_food
+        start = move
+        while start > 0 and start not in self.keyframes:
+            start -= 1
+        if start == 0:
+            state = initial_state
+        else:
+            offset, length = self.keyframes[start]
+            state = expand_state(pickle.loads(self.data[offset:offset + length]), initial_state)
+        for agent_index, action in self.moves[start:move]:
+            state = state.generate_successor(agent_index, action)
+        return state
+
+    def verify(self):
+        """
+        Plays the whole game again and returns the number of the first move
+        whose state does not match its checksum or keyframe, or None if they
+        all do.
+        """
+        state = self.initial_state()
+        capture.TOTAL_FOOD = self.layout.total_food
+        for move, (agent_index, action) in enumerate(self.moves):
+            state = state.generate_successor(agent_index, action)
+            checksum = state_checksum(state)
+            if self.checksums and checksum != self.checksums[move]:
+                return move + 1
+            if move + 1 in self.keyframes and state_checksum(self.state_at(move + 1)) != checksum:
+                return move + 1
+        return None
+
+
+def play_replay(filename, display, start=0):
+    """
+    Shows the replay in filename on display, from the state after start
+    moves to the end.
+    """
+    replay = Replay(filename)
+    state = replay.state_at(start)
+    rules = capture.CaptureRules()
+    game = Game([Agent(index) for index in range(replay.num_agents)], display, rules,
+                starting_index=replay.starting_index)
+    game.length = replay.length
+    game.move_history = list(replay.moves[:start])
+    game.state = state
+    display.red_team = replay.red_team_name
+    display.blue_team = replay.blue_team_name
+    display.initialize(state.data)
+
+    for agent_index, action in replay.moves[start:]:
+        state = state.generate_successor(agent_index, action)
+        game.state = state
+        game.move_history.append((agent_index, action))
+        display.update(state.data)
+        rules.process(state, game)
+
+    display.finish()
+    return game
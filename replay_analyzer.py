@@ -0,0 +1,323 @@
+"""replay_analyzer.py
+
+Champlain College CSI-480, Fall 2017
+The following code was adapted by Joshua Auerbach (jauerbach@champlain.edu)
+from the UC Berkeley Pacman Projects (see license and attribution below).
+
+----------------------
+Licensing Information:  You are free to use or extend these projects for
+educational purposes provided that (1) you do not distribute or publish
+solutions, (2) you retain this notice, and (3) you provide clear
+attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+
+Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+The core projects and autograders were primarily created by John DeNero
+(denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+Student side autograding was added by Brad Miller, Nick Hay, and
+Pieter Abbeel (pabbeel@cs.berkeley.edu).
+"""
+
+"""
+Mines recorded capture games for statistics.
+
+Replay files (see replay.py, or the pickled replays of capture.py --record
+before it and of unpack.py) are played again headlessly over a pool of
+worker processes, on a rollout.RolloutSimulator, which applies a move in
+place instead of copying the state the way generate_successor does.  Each
+game gives:
+
+  a row of games.csv: teams, seed, moves, final score and winner, the food
+      each team returned and most it carried at once, deaths of each agent,
+      the move the score first changed (and for which team), and how much
+      of its time each team spent in the other team's territory
+  rows of the move table, one per move with the columns in MOVE_COLUMNS
+  heat maps of how often a red and a blue agent stood on each cell
+
+The move table and heat maps are written as numpy .npz files, one array
+per column (moves.npz) or per game (heatmaps.npz, each 2 x width x height),
+or as moves.csv and heatmaps.json when numpy is not available.  Games are
+numbered in the order their files are given.
+
+Example:
+python batch_runner.py -n 200 -r my_team --replay_dir replays
+python replay_analyzer.py replays -o analysis
+"""
+
+import array
+import csv
+import json
+import multiprocessing
+import os
+import pickle
+import sys
+import traceback
+
+try:
+    import numpy
+    _NUMPY_ENABLED = True
+except ImportError:
+    _NUMPY_ENABLED = False
+
+import replay
+import rollout
+
+GAME_FIELDS = ['game', 'file', 'red', 'blue', 'seed', 'width', 'height', 'moves', 'complete', 'score', 'winner',
+               'red_returned', 'blue_returned', 'red_max_carrying', 'blue_max_carrying', 'deaths',
+               'first_score_move', 'first_score_team', 'red_invading', 'blue_invading', 'error']
+
+MOVE_COLUMNS = ['game', 'move', 'agent', 'action', 'score', 'red_carrying', 'blue_carrying',
+                'red_returned', 'blue_returned', 'red_food_left', 'blue_food_left',
+                'red_pacmen', 'blue_pacmen', 'red_deaths', 'blue_deaths']
+
+
+def load_game(filename):
+    """
+    Returns the layout, number of agents, length, moves and a dictionary of
+    what else is known (team names, seed, whether it is complete) of the
+    replay in filename.
+    """
+    if replay.is_replay_file(filename):
+        recorded = replay.Replay(filename)
+        return (recorded.layout, recorded.num_agents, recorded.length, recorded.moves,
+                {'red': recorded.red_team_name, 'blue': recorded.blue_team_name, 'seed': recorded.seed,
+                 'complete': recorded.end != None})
+    with open(filename, 'rb') as f:
+        recorded = pickle.load(f)
+    return (recorded['layout'], len(recorded['agents']), recorded['length'], recorded['actions'],
+            {'red': recorded.get('red_team_name'), 'blue': recorded.get('blue_team_name'), 'seed': None,
+             'complete': True})
+
+
+def analyze_game(filename):
+    """
+    Plays the replay in filename again and returns its row of games.csv
+    (without the game number), its move table (a dictionary of an
+    array.array per column, without the game column) and its heat maps
+    (an array.array of 2 * width * height counts, red then blue, indexed
+    by x * height + y).
+    """
+    layout, num_agents, length, moves, info = load_game(filename)
+    simulator = rollout.RolloutSimulator(replay.initial_state(layout, num_agents, length))
+    width, height = simulator.width, simulator.height
+    teams = simulator.teams
+    red_team, blue_team = simulator.red_team, simulator.blue_team
+    positions = simulator.positions
+    is_pacman = simulator.is_pacman
+    num_carrying = simulator.num_carrying
+    num_returned = simulator.num_returned
+    board = simulator.board
+    next_positions = simulator.moves
+
+    red_mask = ((1 << (int(width / 2) * height)) - 1)
+    blue_mask = ((1 << (width * height)) - 1) ^ red_mask
+    food_bits = None
+    red_food_left = blue_food_left = 0
+
+    columns = dict((column, array.array('i')) for column in MOVE_COLUMNS if column != 'game')
+    heatmaps = array.array('i', bytes(4 * 2 * width * height))
+    deaths = [0] * num_agents
+    max_carrying = [0, 0]
+    invading = [0, 0]
+    first_score_move = None
+    first_score_team = None
+
+    for move, (agent_index, action) in enumerate(moves):
+        before = list(positions)
+        expected = next_positions.get((before[agent_index], action))
+        simulator.apply(agent_index, action)
+        # the journal is only needed to undo moves, which this never does
+        simulator.journal_size = 0
+        del simulator.marks[:]
+
+        red_deaths = blue_deaths = 0
+        for index in range(num_agents):
+            if positions[index] != (expected if index == agent_index else before[index]):
+                deaths[index] += 1
+                if teams[index]:
+                    red_deaths += 1
+                else:
+                    blue_deaths += 1
+
+        if board[rollout.FOOD] != food_bits:
+            food_bits = board[rollout.FOOD]
+            red_food_left = bin(food_bits & red_mask).count('1')
+            blue_food_left = bin(food_bits & blue_mask).count('1')
+        score = board[rollout.SCORE]
+        if first_score_move == None and score != 0:
+            first_score_move = move + 1
+            first_score_team = 'Red' if score > 0 else 'Blue'
+
+        red_carrying = sum(num_carrying[i] for i in red_team)
+        blue_carrying = sum(num_carrying[i] for i in blue_team)
+        max_carrying[0] = max(max_carrying[0], red_carrying)
+        max_carrying[1] = max(max_carrying[1], blue_carrying)
+        red_pacmen = sum(1 for i in red_team if is_pacman[i])
+        blue_pacmen = sum(1 for i in blue_team if is_pacman[i])
+        invading[0] += red_pacmen
+        invading[1] += blue_pacmen
+        for index in range(num_agents):
+            x, y = positions[index]
+            heatmaps[(0 if teams[index] else width * height) + x * height + y] += 1
+
+        for column, value in [('move', move + 1), ('agent', agent_index), ('action', replay.ACTION_CODES[action]),
+                              ('score', score), ('red_carrying', red_carrying), ('blue_carrying', blue_carrying),
+                              ('red_returned', sum(num_returned[i] for i in red_team)),
+                              ('blue_returned', sum(num_returned[i] for i in blue_team)),
+                              ('red_food_left', red_food_left), ('blue_food_left', blue_food_left),
+                              ('red_pacmen', red_pacmen), ('blue_pacmen', blue_pacmen),
+                              ('red_deaths', red_deaths), ('blue_deaths', blue_deaths)]:
+            columns[column].append(value)
+
+    score = board[rollout.SCORE]
+    turns = max(1, len(moves))
+    row = {'file': filename, 'red': info['red'], 'blue': info['blue'], 'seed': info['seed'],
+           'width': width, 'height': height, 'moves': len(moves), 'complete': info['complete'],
+           'score': score, 'winner': 'Red' if score > 0 else 'Blue' if score < 0 else 'Tie',
+           'red_returned': sum(num_returned[i] for i in red_team),
+           'blue_returned': sum(num_returned[i] for i in blue_team),
+           'red_max_carrying': max_carrying[0], 'blue_max_carrying': max_carrying[1],
+           'deaths': ' '.join(str(d) for d in deaths),
+           'first_score_move': first_score_move, 'first_score_team': first_score_team,
+           'red_invading': invading[0] / float(len(red_team) * turns),
+           'blue_invading': invading[1] / float(len(blue_team) * turns),
+           'error': None}
+    return row, columns, heatmaps
+
+
+def _analyze_game_catching_exceptions(filename):
+    try:
+        return analyze_game(filename)
+    except Exception:
+        return {'file': filename, 'error': traceback.format_exc()}, None, None
+
+
+def find_replays(paths):
+    "The files in paths, with directories replaced by the files in them, sorted"
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            filenames.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                    if os.path.isfile(os.path.join(path, name))))
+        else:
+            filenames.append(path)
+    return filenames
+
+
+def analyze_replays(filenames, output, processes=None, callback=None):
+    """
+    Analyzes every replay in filenames over a pool of processes and writes
+    games.csv, the move table and the heat maps to the directory output.
+    callback, if given, is called with each game's row as it is done.
+    Returns the list of rows.
+    """
+    if not os.path.isdir(output):
+        os.makedirs(output)
+    rows = []
+    columns = dict((column, array.array('i')) for column in MOVE_COLUMNS)
+    heatmaps = {}
+    pool = multiprocessing.Pool(processes)
+    try:
+        for game, (row, game_columns, game_heatmaps) in enumerate(
+                pool.imap(_analyze_game_catching_exceptions, filenames, chunksize=4)):
+            row['game'] = game
+            rows.append(row)
+            if row['error'] == None:
+                columns['game'].extend([game] * row['moves'])
+                for column, values in game_columns.items():
+                    columns[column].extend(values)
+                heatmaps[game] = (row['width'], row['height'], game_heatmaps)
+            if callback != None:
+                callback(row)
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    with open(os.path.join(output, 'games.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, GAME_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+    write_moves(columns, output)
+    write_heatmaps(heatmaps, output)
+    return rows
+
+
+def write_moves(columns, output):
+    "Writes the move table to moves.npz, or moves.csv without numpy"
+    if _NUMPY_ENABLED:
+        numpy.savez(os.path.join(output, 'moves.npz'),
+                    **dict((column, numpy.frombuffer(values, dtype=numpy.int32)) for column, values in columns.items()))
+        return
+    with open(os.path.join(output, 'moves.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(MOVE_COLUMNS)
+        writer.writerows(zip(*[columns[column] for column in MOVE_COLUMNS]))
+
+
+def write_heatmaps(heatmaps, output):
+    """
+    Writes the heat maps of each game to heatmaps.npz, as game_<number>
+    arrays indexed by [team (0 red, 1 blue), x, y], or to heatmaps.json as
+    nested lists without numpy
+    """
+    if _NUMPY_ENABLED:
+        numpy.savez(os.path.join(output, 'heatmaps.npz'),
+                    **dict(('game_%d' % game, numpy.frombuffer(counts, dtype=numpy.int32).reshape(2, width, height))
+                           for game, (width, height, counts) in heatmaps.items()))
+        return
+    nested = {}
+    for game, (width, height, counts) in heatmaps.items():
+        nested['game_%d' % game] = [[list(counts[(team * width + x) * height:(team * width + x + 1) * height])
+                                     for x in range(width)] for team in range(2)]
+    with open(os.path.join(output, 'heatmaps.json'), 'w') as f:
+        json.dump(nested, f)
+
+
+def print_summary(rows):
+    "Prints how many games were analyzed and their average statistics"
+    games = [row for row in rows if row['error'] == None]
+    errors = len(rows) - len(games)
+    if errors:
+        print('%d replay(s) could not be read, see the error field of games.csv' % errors)
+    if not games:
+        return
+    print('Games:         %d (%d cut off)' % (len(games), len([row for row in games if not row['complete']])))
+    print('Average Score:', sum(row['score'] for row in games) / float(len(games)))
+    print('Average Moves:', sum(row['moves'] for row in games) / float(len(games)))
+    scored = [row['first_score_move'] for row in games if row['first_score_move'] != None]
+    if scored:
+        print('Average Move of First Score: %.1f (%d games never scored)' % (sum(scored) / float(len(scored)),
+                                                                            len(games) - len(scored)))
+
+
+def read_command(argv):
+    """
+    Processes the command used to run the replay analyzer from the command line.
+    """
+    from optparse import OptionParser
+    usage_str = """
+                USAGE:      python replay_analyzer.py <options> <replay files or directories>
+                EXAMPLES:   (1) python replay_analyzer.py replays -o analysis
+                - analyzes every replay in the replays directory
+                (2) python replay_analyzer.py -p 4 replay-0 replay-1
+                - analyzes two replays with four worker processes
+                """
+    parser = OptionParser(usage_str)
+    parser.add_option('-o', '--output', default='analysis',
+                      help='Directory to write games.csv, the move table and heat maps to [Default: %default]')
+    parser.add_option('-p', '--processes', type='int', default=None,
+                      help='Number of worker processes [Default: one per core]')
+
+    options, paths = parser.parse_args(argv)
+    assert len(paths) > 0, "No replay files given"
+    return {'filenames': find_replays(paths), 'output': options.output, 'processes': options.processes}
+
+
+if __name__ == '__main__':
+    args = read_command(sys.argv[1:])
+    print('Analyzing %d replays, writing results to %s' % (len(args['filenames']), args['output']))
+    rows = analyze_replays(**args)
+    print_summary(rows)
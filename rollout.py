@@ -0,0 +1,457 @@
+"""rollout.py
+
+Champlain College CSI-480, Fall 2017
+The following code was adapted by Joshua Auerbach (jauerbach@champlain.edu)
+from the UC Berkeley Pacman Projects (see license and attribution below).
+
+----------------------
+Licensing Information:  You are free to use or extend these projects for
+educational purposes provided that (1) you do not distribute or publish
+solutions, (2) you retain this notice, and (3) you provide clear
+attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+
+Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+The core projects and autograders were primarily created by John DeNero
+(denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+Student side autograding was added by Brad Miller, Nick Hay, and
+Pieter Abbeel (pabbeel@cs.berkeley.edu).
+"""
+
+"""
+A capture game simulator for random rollouts.
+
+Searching with generate_successor builds a new GameState (and copies of
+whatever it changes) for every move, and starting each rollout from a
+deep_copy of the root copies everything again.  A RolloutSimulator instead
+takes a snapshot of a capture GameState once, keeping only what the capture
+rules read and write (agent positions, directions, pacman flags, scared
+timers, carried and returned food, the food bits, the capsules, the score
+and the time left) in flat lists.  Moves are applied to the snapshot in
+place, following capture.AgentRules, and every change is written to a
+journal so that undo can take a move back and reset can return to the
+snapshot between rollouts without building anything.
+
+The simulator answers the GameState accessors that evaluation functions
+usually call (get_agent_state, get_agent_position, get_blue_food,
+get_red_capsules, get_legal_actions, ...), so the end of a rollout can be
+scored by the same feature code as a real GameState.  Those answers
+describe the current simulated position, so use them before the next
+apply, undo or reset.
+
+Typical use:
+
+    simulator = RolloutSimulator(game_state)   # once per game
+    simulator.load(game_state)                 # once per search
+    for rollout in range(iterations):
+        simulator.reset()
+        for step in range(depth):
+            simulator.apply(index, random.choice(simulator.get_legal_actions(index)))
+        score(simulator)
+"""
+
+import capture
+from game import Actions, Configuration, Directions, LegalActionTable, grid_bits, zobrist_keys, BitGrid
+
+# Slots of RolloutSimulator.board
+FOOD = 0
+SCORE = 1
+TIMELEFT = 2
+WIN = 3
+ZOBRIST = 4  # GameStateData.food_hash() ^ GameStateData.capsule_hash()
+
+
+class RolloutAgentState:
+    """
+    A read only view of one agent in a RolloutSimulator, with the parts of
+    the game.AgentState interface that evaluation code reads.
+    """
+    __slots__ = ('simulator', 'index')
+
+    def __init__(self, simulator, index):
+        self.simulator = simulator
+        self.index = index
+
+    def get_position(self):
+        return self.simulator.positions[self.index]
+
+    def get_direction(self):
+        return self.simulator.directions[self.index]
+
+    def is_pacman(self):
+        return self.simulator.is_pacman[self.index]
+    is_pacman = property(is_pacman)
+
+    def scared_timer(self):
+        return self.simulator.scared_timers[self.index]
+    scared_timer = property(scared_timer)
+
+    def num_carrying(self):
+        return self.simulator.num_carrying[self.index]
+    num_carrying = property(num_carrying)
+
+    def num_returned(self):
+        return self.simulator.num_returned[self.index]
+    num_returned = property(num_returned)
+
+    def configuration(self):
+        "A new Configuration for the agent, or None if it is not observed"
+        position = self.get_position()
+        if position == None:
+            return None
+        return Configuration(position, self.get_direction())
+    configuration = property(configuration)
+
+
+class RolloutSimulator:
+    """
+    Plays capture moves on a compact, mutable snapshot of a GameState.
+
+    The move table is built from the layout once, when the simulator is
+    made, so keep one simulator per agent for the whole game and load the
+    state to search from at each turn.
+    """
+
+    def __init__(self, game_state):
+        walls = game_state.get_walls()
+        self.walls = walls
+        self.width = walls.width
+        self.height = walls.height
+        self.food_keys, self.capsule_keys = zobrist_keys(walls.width, walls.height)
+
+        # next position of every legal (position, action) pair
+        table = walls.action_table
+        if table == None:
+            table = LegalActionTable(walls)
+        self.action_table = table.actions
+        self.moves = {}
+        for position, actions in table.actions.items():
+            x, y = position
+            for action in actions:
+                dx, dy = Actions._directions[action]
+                self.moves[(position, action)] = (x + dx, y + dy)
+
+        # the journal is a flat list of (values, index, old value) triples,
+        # filled up to journal_size, and marks holds the journal size
+        # before each move that has not been undone
+        self.journal = []
+        self.journal_size = 0
+        self.marks = []
+        self.load(game_state)
+
+    def load(self, game_state):
+        """
+        Takes a new snapshot of game_state (which must be on the same
+        layout) and makes it the state that reset returns to.
+        """
+        data = game_state.data
+        agent_states = data.agent_states
+        self.teams = list(game_state.teams)
+        self.red_team = game_state.get_red_team_indices()
+        self.blue_team = game_state.get_blue_team_indices()
+
+        self.positions = []
+        self.directions = []
+        for agent_state in agent_states:
+            if agent_state.configuration == None:
+                self.positions.append(None)
+                self.directions.append(None)
+            else:
+                x, y = agent_state.configuration.pos
+                self.positions.append((int(x), int(y)))
+                self.directions.append(agent_state.configuration.direction)
+        self.start_positions = [agent_state.start.pos for agent_state in agent_states]
+        self.start_directions = [agent_state.start.direction for agent_state in agent_states]
+        self.is_pacman = [agent_state.is_pacman for agent_state in agent_states]
+        self.scared_timers = [agent_state.scared_timer for agent_state in agent_states]
+        self.num_carrying = [agent_state.num_carrying for agent_state in agent_states]
+        self.num_returned = [agent_state.num_returned for agent_state in agent_states]
+        self.agent_views = [RolloutAgentState(self, index) for index in range(len(agent_states))]
+
+        self.capsule_positions = list(data.capsules)
+        self.capsules_present = [True] * len(self.capsule_positions)
+        self.board = [grid_bits(data.food), data.score, data.timeleft, data._win,
+                      data.food_hash() ^ data.capsule_hash()]
+
+        self.journal_size = 0
+        del self.marks[:]
+
+    ##########################
+    # Applying and undoing   #
+    ##########################
+
+    def change(self, values, index, value):
+        "values[index] = value, recorded in the journal"
+        old = values[index]
+        if old == value:
+            return
+        size = self.journal_size
+        journal = self.journal
+        if size == len(journal):
+            journal.extend([None] * max(30, size))
+        journal[size] = values
+        journal[size + 1] = index
+        journal[size + 2] = old
+        self.journal_size = size + 3
+        values[index] = value
+
+    def apply(self, agent_index, action):
+        """
+        Moves agent_index by action, with the same rules (eating, returning
+        food, collisions and scared timers) as GameState.generate_successor.
+        """
+        position = self.positions[agent_index]
+        next = self.moves.get((position, action))
+        if next == None:
+            raise Exception("Illegal action " + str(action))
+        self.marks.append(self.journal_size)
+        change = self.change
+
+        change(self.positions, agent_index, next)
+        if action != Directions.STOP:
+            change(self.directions, agent_index, action)
+
+        # Change agent type, and bank the food carried home
+        is_red = self.teams[agent_index]
+        is_pacman = is_red != (next[0] < self.width / 2)
+        change(self.is_pacman, agent_index, is_pacman)
+        eats = is_pacman
+        carrying = self.num_carrying[agent_index]
+        if carrying > 0 and not is_pacman:
+            self.add_score(carrying if is_red else -carrying)
+            change(self.num_returned, agent_index, self.num_returned[agent_index] + carrying)
+            change(self.num_carrying, agent_index, 0)
+            target = (capture.TOTAL_FOOD / 2) - capture.MIN_FOOD
+            if (sum(self.num_returned[i] for i in self.red_team) >= target or
+                    sum(self.num_returned[i] for i in self.blue_team) >= target):
+                change(self.board, WIN, True)
+            # apply_action checks the last agent's pacman flag after banking
+            # food (its win check reuses the agent_state name), so match it
+            eats = self.is_pacman[-1]
+
+        if eats:
+            self.consume(next, is_red)
+        self.check_death(agent_index)
+        change(self.scared_timers, agent_index, max(0, self.scared_timers[agent_index] - 1))
+        change(self.board, TIMELEFT, self.board[TIMELEFT] - 1)
+
+    def skip_turn(self, agent_index):
+        """
+        Runs the clock for a turn of agent_index without moving it, which
+        stands in for the move of an agent whose position is unknown.
+        Undone like a move.
+        """
+        self.marks.append(self.journal_size)
+        self.change(self.scared_timers, agent_index, max(0, self.scared_timers[agent_index] - 1))
+        self.change(self.board, TIMELEFT, self.board[TIMELEFT] - 1)
+
+    def undo(self):
+        "Takes back the last move that has not been undone"
+        self.rewind(self.marks.pop())
+
+    def reset(self):
+        "Takes back every move, returning to the loaded snapshot"
+        self.rewind(0)
+        del self.marks[:]
+
+    def rewind(self, size):
+        journal = self.journal
+        i = self.journal_size
+        while i > size:
+            i -= 3
+            journal[i][journal[i + 1]] = journal[i + 2]
+            journal[i] = None
+        self.journal_size = size
+
+    def depth(self):
+        "Returns the number of moves (and skipped turns) applied since the snapshot"
+        return len(self.marks)
+
+    def state_key(self):
+        """
+        Returns a hashable summary of the current position that two
+        positions share only if the capture rules treat them the same from
+        here on (pacman flags follow from the positions, and the returned
+        food only matters through the score and the win flag).  The food
+        and capsules are summed up by their Zobrist hash, which moves keep
+        up to date, so the key does not grow with the board.
+        """
+        board = self.board
+        return (tuple(self.positions), tuple(self.scared_timers), tuple(self.num_carrying),
+                board[ZOBRIST], board[SCORE], board[TIMELEFT], board[WIN])
+
+    ##########################
+    # Capture rules          #
+    ##########################
+
+    def consume(self, position, is_red):
+        "AgentRules.consume for a pacman of the red (or blue) team at position"
+        board = self.board
+        x, y = position
+        bit = 1 << (x * self.height + y)
+        if board[FOOD] & bit:
+            team = self.red_team if is_red else self.blue_team
+            for agent_index in team:
+                if self.positions[agent_index] == position:
+                    self.change(self.num_carrying, agent_index, self.num_carrying[agent_index] + 1)
+                    break
+            self.change(board, FOOD, board[FOOD] & ~bit)
+            self.change(board, ZOBRIST, board[ZOBRIST] ^ self.food_keys[x * self.height + y])
+
+        # red pacmen eat the capsules on the blue half and the other way round
+        halfway = self.width / 2
+        if (x > halfway) != is_red:
+            return
+        for i, capsule in enumerate(self.capsule_positions):
+            if capsule == position and self.capsules_present[i]:
+                self.change(self.capsules_present, i, False)
+                self.change(board, ZOBRIST, board[ZOBRIST] ^ self.capsule_keys[x * self.height + y])
+                for index in (self.blue_team if is_red else self.red_team):
+                    self.change(self.scared_timers, index, capture.SCARED_TIME)
+                break
+
+    def check_death(self, agent_index):
+        "AgentRules.check_death after agent_index has moved"
+        # points for the mover's team, as seen by the score
+        points = capture.KILL_POINTS if self.teams[agent_index] else -capture.KILL_POINTS
+        other_team = self.blue_team if self.teams[agent_index] else self.red_team
+        positions = self.positions
+        is_pacman = self.is_pacman[agent_index]
+        for index in other_team:
+            if self.is_pacman[index] == is_pacman or positions[index] == None:
+                continue
+            if positions[index] != positions[agent_index]:
+                continue
+            if is_pacman:
+                if self.scared_timers[index] <= 0:
+                    self.dump_food_from_death(agent_index)
+                    self.respawn(agent_index)
+                else:
+                    self.respawn(index)
+                self.add_score(-points)
+            else:
+                if self.scared_timers[agent_index] <= 0:
+                    self.dump_food_from_death(index)
+                    self.respawn(index)
+                    self.add_score(points)
+                else:
+                    self.respawn(agent_index)
+                    self.add_score(-points)
+
+    def add_score(self, change):
+        if change:
+            self.change(self.board, SCORE, self.board[SCORE] + change)
+
+    def respawn(self, index):
+        change = self.change
+        change(self.is_pacman, index, False)
+        change(self.positions, index, self.start_positions[index])
+        change(self.directions, index, self.start_directions[index])
+        change(self.scared_timers, index, 0)
+
+    def dump_food_from_death(self, index):
+        """
+        AgentRules.dump_food_from_death: drops the food a dying pacman
+        carries on free cells of its side, breadth first from where it died.
+        """
+        if not capture.DUMP_FOOD_ON_DEATH or self.num_carrying[index] == 0:
+            return
+        x, y = self.positions[index]
+        is_red = x < self.width / 2
+        occupied = set(p for p in self.positions if p != None)
+        occupied.update(c for c, present in zip(self.capsule_positions, self.capsules_present) if present)
+
+        food = self.board[FOOD]
+        zobrist = self.board[ZOBRIST]
+        num_to_dump = self.num_carrying[index]
+        queue = [(x, y)]
+        seen = set()
+        while num_to_dump > 0:
+            if not len(queue):
+                raise Exception('Exhausted BFS! uh oh')
+            popped = queue.pop(0)
+            if popped in seen:
+                continue
+            seen.add(popped)
+            x, y = popped
+            if (0 < x < self.width and 0 < y < self.height and not self.walls[x][y]
+                    and not food & (1 << (x * self.height + y))
+                    and (x < self.width / 2) == is_red and popped not in occupied):
+                food |= 1 << (x * self.height + y)
+                zobrist ^= self.food_keys[x * self.height + y]
+                num_to_dump -= 1
+            queue.extend((x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+        self.change(self.board, FOOD, food)
+        self.change(self.board, ZOBRIST, zobrist)
+        self.change(self.num_carrying, index, 0)
+
+    ##########################
+    # GameState accessors    #
+    ##########################
+
+    def get_legal_actions(self, agent_index=0):
+        "The legal actions of agent_index, as a tuple that must not be changed"
+        return self.action_table[self.positions[agent_index]]
+
+    def get_agent_state(self, index):
+        return self.agent_views[index]
+
+    def get_agent_position(self, index):
+        return self.positions[index]
+
+    def get_initial_agent_position(self, index):
+        return self.start_positions[index]
+
+    def get_num_agents(self):
+        return len(self.positions)
+
+    def get_score(self):
+        return self.board[SCORE]
+
+    def get_timeleft(self):
+        return self.board[TIMELEFT]
+
+    def get_food(self):
+        "A BitGrid of all the food left"
+        food = BitGrid(self.width, self.height)
+        food.bits = self.board[FOOD]
+        return food
+
+    def get_red_food(self):
+        food = self.get_food()
+        food.bits &= food.columns_mask(0, int(self.width / 2))
+        return food
+
+    def get_blue_food(self):
+        food = self.get_food()
+        food.bits &= food.columns_mask(int(self.width / 2), self.width)
+        return food
+
+    def has_food(self, x, y):
+        return self.board[FOOD] >> (x * self.height + y) & 1 == 1
+
+    def get_capsules(self):
+        return [c for c, present in zip(self.capsule_positions, self.capsules_present) if present]
+
+    def get_red_capsules(self):
+        return [c for c in self.get_capsules() if c[0] <= self.width / 2]
+
+    def get_blue_capsules(self):
+        return [c for c in self.get_capsules() if c[0] > self.width / 2]
+
+    def get_walls(self):
+        return self.walls
+
+    def has_wall(self, x, y):
+        return self.walls[x][y]
+
+    def get_red_team_indices(self):
+        return self.red_team[:]
+
+    def get_blue_team_indices(self):
+        return self.blue_team[:]
+
+    def is_on_red_team(self, agent_index):
+        return self.teams[agent_index]
+
+    def is_over(self):
+        return self.board[WIN]
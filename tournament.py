@@ -0,0 +1,238 @@
+"""tournament.py
+
+Champlain College CSI-480, Fall 2017
+The following code was adapted by Joshua Auerbach (jauerbach@champlain.edu)
+from the UC Berkeley Pacman Projects (see license and attribution below).
+
+----------------------
+Licensing Information:  You are free to use or extend these projects for
+educational purposes provided that (1) you do not distribute or publish
+solutions, (2) you retain this notice, and (3) you provide clear
+attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+
+Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+The core projects and autograders were primarily created by John DeNero
+(denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+Student side autograding was added by Brad Miller, Nick Hay, and
+Pieter Abbeel (pabbeel@cs.berkeley.edu).
+"""
+
+"""
+Runs a round robin tournament between team modules and rates them.
+
+Every pair of teams plays on every layout, once with each team as red, and
+the games are played in parallel by batch_runner.  Each finished game is
+appended to a results log (JSON lines) as soon as it is played.  The Elo
+ratings are updated while the tournament runs, but in the order the games
+were scheduled rather than the order they finished in: a finished game is
+rated once every game scheduled before it has finished (or failed), so the
+same tournament always gets the same ratings.  Running the same tournament
+again with the same log only plays the games that are not in the log yet,
+so an interrupted tournament picks up where it stopped.
+
+Example:
+python tournament.py baseline_team my_team random_team -l default_capture,office_capture
+python tournament.py baseline_team my_team --seeds_file ../driver/SEEDS -g 2
+"""
+
+import json
+import os
+import sys
+
+import batch_runner
+
+ELO_INITIAL_RATING = 1500
+ELO_K_FACTOR = 32
+
+
+class EloRatings:
+    """
+    Elo ratings for a set of teams, updated one game at a time.
+    """
+
+    def __init__(self, teams, initial_rating=ELO_INITIAL_RATING, k_factor=ELO_K_FACTOR):
+        self.k_factor = k_factor
+        self.ratings = dict((team, float(initial_rating)) for team in teams)
+        self.records = dict((team, [0, 0, 0]) for team in teams)  # wins, losses, ties
+
+    def expected_score(self, team, opponent):
+        "Returns the expected score (between 0 and 1) of team against opponent"
+        return 1.0 / (1.0 + 10 ** ((self.ratings[opponent] - self.ratings[team]) / 400.0))
+
+    def update(self, red, blue, score):
+        """
+        Updates the ratings with the result of a game, where score is the
+        final game score (positive if red won).
+        """
+        if score > 0:
+            red_result = 1.0
+        elif score < 0:
+            red_result = 0.0
+        else:
+            red_result = 0.5
+        change = self.k_factor * (red_result - self.expected_score(red, blue))
+        self.ratings[red] += change
+        self.ratings[blue] -= change
+
+        for team, result in [(red, red_result), (blue, 1.0 - red_result)]:
+            self.records[team][{1.0: 0, 0.0: 1, 0.5: 2}[result]] += 1
+
+    def standings(self):
+        "Returns (team, rating, wins, losses, ties) tuples, best rating first"
+        table = [(team, rating) + tuple(self.records[team]) for team, rating in self.ratings.items()]
+        table.sort(key=lambda row: -row[1])
+        return table
+
+
+def schedule(teams, layouts, games_per_layout=1, seed=0, length=1200):
+    """
+    Returns the batch_runner jobs for a round robin: every pair of teams
+    plays games_per_layout times on every layout with each side as red.
+    Both games of a side swap use the same seed.
+    """
+    jobs = []
+    game_seed = seed
+    for i, team in enumerate(teams):
+        for opponent in teams[i + 1:]:
+            for layout_name in layouts:
+                for repeat in range(games_per_layout):
+                    for red, blue in [(team, opponent), (opponent, team)]:
+                        jobs.append(batch_runner.make_job(len(jobs), red, blue, layout_name, game_seed, length))
+                    game_seed += 1
+    return jobs
+
+
+def job_key(job):
+    "Identifies a scheduled game independently of its position in the schedule"
+    return (job['red'], job['blue'], job['layout'], job['seed'], job['length'])
+
+
+def read_results(filename):
+    """
+    Returns the results already recorded in a results log, in the order
+    they were written, skipping games that failed (they will be replayed)
+    and a partially written last line.
+    """
+    results = []
+    if not os.path.exists(filename):
+        return results
+    with open(filename) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if result.get('error') == None:
+                results.append(result)
+    return results
+
+
+def run_tournament(teams, layouts, output, games_per_layout=1, seed=0, length=1200,
+                   processes=None, catch_exceptions=True):
+    """
+    Plays every scheduled game that is not in the output log yet, and
+    returns the EloRatings after all of the games in the log.
+    """
+    if output.endswith('.csv'):
+        raise Exception('A tournament log is JSON lines, so that it can be resumed, not ' + output)
+    jobs = schedule(teams, layouts, games_per_layout, seed, length)
+    ratings = EloRatings(teams)
+
+    # results by job_key (the first one logged for each game), the keys of
+    # games that failed in this run, and the number of scheduled games
+    # rated so far
+    played = {}
+    failed = set()
+    rated = [0]
+
+    def rate_finished():
+        "Rates the games at the front of the schedule that have finished"
+        while rated[0] < len(jobs):
+            key = job_key(jobs[rated[0]])
+            if key in played:
+                result = played[key]
+                ratings.update(result['red'], result['blue'], result['score'])
+            elif key not in failed:
+                break
+            rated[0] += 1
+
+    for result in read_results(output):
+        played.setdefault(job_key(result), result)
+    rate_finished()
+    remaining = [job for job in jobs if job_key(job) not in played]
+    print('%d games scheduled, %d already played, %d to play' % (len(jobs), len(jobs) - len(remaining),
+                                                                len(remaining)))
+
+    def record(result):
+        key = job_key(result)
+        if result['error'] != None:
+            failed.add(key)
+            print('Game %d (%s vs %s on %s) failed' % (result['job'], result['red'], result['blue'], result['layout']))
+        else:
+            played.setdefault(key, result)
+            print('Game %d: %s (red) vs %s (blue) on %s: %s' % (result['job'], result['red'], result['blue'],
+                                                                 result['layout'], result['winner']))
+        already_rated = rated[0]
+        rate_finished()
+        if rated[0] > already_rated:
+            print('Ratings after %d of %d games: %s' % (rated[0], len(jobs), ', '.join(
+                '%s %.1f' % (team, rating) for team, rating, wins, losses, ties in ratings.standings())))
+
+    if remaining:
+        batch_runner.run_jobs(remaining, output, processes, catch_exceptions, append=True, callback=record)
+    return ratings
+
+
+def print_standings(ratings):
+    print('%-24s %8s %6s %6s %6s' % ('team', 'rating', 'wins', 'losses', 'ties'))
+    for team, rating, wins, losses, ties in ratings.standings():
+        print('%-24s %8.1f %6d %6d %6d' % (team, rating, wins, losses, ties))
+
+
+def read_command(argv):
+    """
+    Processes the command used to run a tournament from the command line.
+    """
+    from optparse import OptionParser
+    usage_str = """
+                USAGE:      python tournament.py <options> team1 team2 [team3 ...]
+                EXAMPLES:   (1) python tournament.py baseline_team my_team random_team -l default_capture,office_capture
+                - every pair of teams plays on both layouts, once as each color
+                (2) python tournament.py baseline_team my_team --seeds_file ../driver/SEEDS -g 2
+                - plays twice on each random maze listed by generate_tournament_layouts.py
+                """
+    parser = OptionParser(usage_str)
+    parser.add_option('-l', '--layouts', default='default_capture',
+                      help=batch_runner.capture.default('Comma separated layouts to play on'))
+    parser.add_option('--seeds_file', default=None,
+                      help='Play on the RANDOM<seed> mazes for each seed in this file (as written by generate_tournament_layouts.py)')
+    parser.add_option('-g', '--games_per_layout', type='int', default=1,
+                      help=batch_runner.capture.default('Games per pair of teams, layout and side'))
+    parser.add_option('-s', '--seed', type='int', default=0,
+                      help=batch_runner.capture.default('Seed of the first game'))
+    parser.add_option('-i', '--time', type='int', dest='time',
+                      help=batch_runner.capture.default('TIME limit of a game in moves'), default=1200, metavar='TIME')
+    parser.add_option('-p', '--processes', type='int', default=None,
+                      help='Number of worker processes [Default: one per core]')
+    parser.add_option('-o', '--output', default='tournament.jsonl',
+                      help=batch_runner.capture.default('Results log (JSON lines); an existing log is resumed'))
+
+    options, teams = parser.parse_args(argv)
+    if len(teams) < 2:
+        parser.error('a tournament needs at least two teams')
+    if options.output.endswith('.csv'):
+        parser.error('the results log is JSON lines (so that it can be resumed), not .csv')
+    if options.seeds_file != None:
+        with open(options.seeds_file) as f:
+            layouts = ['RANDOM%d' % int(line) for line in f if line.strip()]
+    else:
+        layouts = options.layouts.split(',')
+    return {'teams': teams, 'layouts': layouts, 'output': options.output,
+            'games_per_layout': options.games_per_layout, 'seed': options.seed,
+            'length': options.time, 'processes': options.processes}
+
+
+if __name__ == '__main__':
+    args = read_command(sys.argv[1:])
+    ratings = run_tournament(**args)
+    print_standings(ratings)
@@ -22,6 +22,13 @@ import util
 import game
 import time
 import copy
+import random
+
+try:
+    import numpy
+    _NUMPY_ENABLED = True
+except ImportError:
+    _NUMPY_ENABLED = False
 
 class InferenceModule:
     """
@@ -102,6 +109,55 @@ class InferenceModule:
         """
         return self.get_belief_distribution().arg_max()
 
+    def record_possible_captures(self, position, game_state):
+        """
+        Remembers which of our agents are close enough to the opponent (seen
+        exactly at position) that one of them might eat it, or be eaten by it,
+        before the next observation.
+        """
+        # check if danger of being eaten
+        # simple check to just see whether close to one of our agents, then 
+        # will detect if our agent was the one eaten later
+        # this simplifies edge cases at the center of the board, rather
+        # than having a more complex criteria here based on agent types
+
+        self.possibly_eaten_by = []   
+
+        for index in self.our_indices:
+            if self.distancer.get_distance(game_state.get_agent_position(index),
+                             position) < 2.1:
+                # POSSIBLY EATEN BY agent
+                self.possibly_eaten_by.append((index, game_state.get_agent_position(index)))
+
+    def check_eaten(self, game_state):
+        """
+        Uses the possible captures recorded when the opponent was last seen to
+        decide whether it has been eaten since.  If so, the opponent is placed
+        back at its starting position and True is returned.
+        """
+        if len(self.possibly_eaten_by) > 0:
+            eaten = True
+            for index, position in self.possibly_eaten_by:
+                # if in starting position then we were the one eaten,
+                # unless we were already there (in which case, if we can't see
+                # the opponent exactly, they were eaten)
+                if ((game_state.get_agent_position(index) == 
+                                 game_state.get_initial_agent_position(index))
+                      and (position != game_state.get_agent_position(index))) :
+                    # WE WERE EATEN  
+                    eaten = False
+                    break
+        
+            if eaten:
+                # THE OPPONENT WE ARE TRACKING WAS EATEN, SO THEY RETURNED
+                # TO STARTING POSITION
+                self.observe_exact(self.get_initial_position(game_state), game_state)
+                return True
+         
+        # reset this data structure       
+        self.possibly_eaten_by = []
+        return False
+
     ######################################
     # Methods that need to be overridden #
     ######################################
@@ -137,20 +193,7 @@ class ExactInference(InferenceModule):
     def observe_exact(self, position, game_state):
         self.beliefs = util.Counter()
         self.beliefs[position] = 1.0
-        
-        # check if danger of being eaten
-        # simple check to just see whether close to one of our agents, then 
-        # will detect if our agent was the one eaten later
-        # this simplifies edge cases at the center of the board, rather
-        # than having a more complex criteria here based on agent types
-
-        self.possibly_eaten_by = []   
-
-        for index in self.our_indices:
-            if self.distancer.get_distance(game_state.get_agent_position(index),
-                             position) < 2.1:
-                # POSSIBLY EATEN BY agent
-                self.possibly_eaten_by.append((index, game_state.get_agent_position(index)))
+        self.record_possible_captures(position, game_state)
 
 
     def observe(self, observation, game_state, observer):
@@ -168,28 +211,8 @@ class ExactInference(InferenceModule):
             self.observe_exact(self.get_initial_position(game_state), game_state)
             return
             
-        if len(self.possibly_eaten_by) > 0:
-            eaten = True
-            for index, position in self.possibly_eaten_by:
-                # if in starting position then we were the one eaten,
-                # unless we were already there (in which case, if we can't see
-                # the opponent exactly, they were eaten)
-                if ((game_state.get_agent_position(index) == 
-                                 game_state.get_initial_agent_position(index))
-                      and (position != game_state.get_agent_position(index))) :
-                    # WE WERE EATEN  
-                    eaten = False
-                    break
-        
-            if eaten:
-                # THE OPPONENT WE ARE TRACKING WAS EATEN, SO THEY RETURNED
-                # TO STARTING POSITION
-                self.observe_exact(self.get_initial_position(game_state), game_state)
-                return
-         
-        # reset this data structure       
-        self.possibly_eaten_by = []
-
+        if self.check_eaten(game_state):
+            return
 
         noisy_distance = observation
         observer_position = game_state.get_agent_position(observer)
@@ -221,5 +244,344 @@ class ExactInference(InferenceModule):
 
     def get_belief_distribution(self):
         return self.beliefs
-        
-    
+
+
+class TeamTracker:
+    """
+    Tracks the opponents for a whole team, so that teammates share one set
+    of beliefs instead of each updating it on their own turns.
+
+    Whenever a teammate is about to act it calls update, which advances
+    each opponent's beliefs once for every move that opponent has made
+    since the last update (worked out from the moves left in the game),
+    and then folds in the sonar reading the acting teammate was given.  So
+    every real move is elapsed exactly once, and the readings of both
+    teammates are used.  The rest of the team's code should only read the
+    beliefs, through the get_ methods.
+    """
+
+    def __init__(self, inference_initializer=ExactInference):
+        """
+        inference_initializer is called as inference_initializer(opponent,
+        distancer, game_state) to make the inference module for each opponent.
+        """
+        self.inference_initializer = inference_initializer
+        self.inferences = []
+        # set by initialize, which must come before the first update
+        self.num_agents = None
+
+    def initialize(self, game_state, distancer, opponents):
+        "Starts tracking opponents from their initial positions at the start of a game"
+        self.inferences = [self.inference_initializer(opponent, distancer, game_state)
+                           for opponent in opponents]
+        self.num_agents = game_state.get_num_agents()
+        self.last_timeleft = game_state.data.timeleft
+        self.last_observer = None
+
+    def update(self, game_state, observer):
+        """
+        Brings the beliefs up to date with game_state, the observation of the
+        teammate observer at the start of its turn.  Further calls for the
+        same turn do nothing.
+        """
+        if self.num_agents == None:
+            raise Exception('TeamTracker.update was called before initialize: one agent of the team has to '
+                            'initialize the shared tracker in register_initial_state')
+        moves = self.last_timeleft - game_state.data.timeleft
+        if moves == 0 and observer == self.last_observer:
+            return
+
+        # the agents that moved since the last update are the ones right
+        # before the observer in the turn order
+        moved = [(observer - k) % self.num_agents for k in range(1, moves + 1)]
+        for inference in self.inferences:
+            if game_state.get_agent_position(inference.index) == None and inference.check_eaten(game_state):
+                # the opponent was sent back to its start before the moves it
+                # has made since, which still need to be elapsed
+                inference.possibly_eaten_by = []
+            for step in range(moved.count(inference.index)):
+                inference.elapse_time(game_state)
+            inference.observe_state(game_state, observer)
+
+        self.last_timeleft = game_state.data.timeleft
+        self.last_observer = observer
+
+    def get_inference(self, opponent):
+        "Returns the inference module tracking opponent"
+        for inference in self.inferences:
+            if inference.index == opponent:
+                return inference
+        return None
+
+    def get_belief_distribution(self, opponent):
+        return self.get_inference(opponent).get_belief_distribution()
+
+    def get_belief_distributions(self):
+        "Returns the belief distributions over every opponent's position"
+        return [inference.get_belief_distribution() for inference in self.inferences]
+
+    def get_most_likely_position(self, opponent):
+        return self.get_inference(opponent).get_most_likely_position()
+
+
+class TransitionTable:
+    """
+    The opponent motion model of ExactInference for one maze, as a sparse
+    matrix in padded row format: row t of sources lists the cells (by index
+    into cells, in ascending order) that can move to cell t in one step,
+    padded with the dummy index len(cells).  Every cell moves to each of its
+    legal neighbors (including staying put) with probability inv_degree;
+    row c of targets lists those neighbors, padded with c itself.
+
+    order lists the cells in the order ExactInference.elapse_time first
+    reaches them, so that sums over a belief vector can be taken in the
+    same order (and come out bit for bit the same).
+    """
+
+    def __init__(self, walls):
+        self.cells = walls.as_list(False)
+        self.cell_index = dict((cell, i) for i, cell in enumerate(self.cells))
+        self.xs = numpy.array([x for x, y in self.cells])
+        self.ys = numpy.array([y for x, y in self.cells])
+
+        sources = [[] for cell in self.cells]
+        targets = []
+        degrees = []
+        order = []
+        reached = set()
+        for i, cell in enumerate(self.cells):
+            configuration = game.Configuration(cell, game.Directions.STOP)
+            actions = game.Actions.get_possible_actions(configuration, walls)
+            degrees.append(len(actions))
+            targets.append([])
+            for action in actions:
+                target = self.cell_index[game.Actions.get_successor(cell, action)]
+                sources[target].append(i)
+                targets[i].append(target)
+                if target not in reached:
+                    reached.add(target)
+                    order.append(target)
+
+        width = max(len(row) for row in sources)
+        padding = len(self.cells)
+        self.sources = numpy.array([row + [padding] * (width - len(row)) for row in sources])
+        self.inv_degree = numpy.array([1.0 / degree for degree in degrees])
+        width = max(degrees)
+        self.targets = numpy.array([row + [i] * (width - len(row)) for i, row in enumerate(targets)])
+        self.degree = numpy.array(degrees)
+        self.order = numpy.array(order)
+        self.observer_distances = {}
+
+    def distances_from(self, position):
+        "Returns the Manhattan distance from position to every cell (cached per position)"
+        distances = self.observer_distances.get(position)
+        if distances is None:
+            x, y = position
+            distances = numpy.abs(self.xs - x) + numpy.abs(self.ys - y)
+            self.observer_distances[position] = distances
+        return distances
+
+
+# TransitionTables already built, keyed by maze
+_transition_tables = {}
+
+
+def get_transition_table(walls):
+    key = (walls.width, walls.height, tuple(walls.as_list()))
+    if key not in _transition_tables:
+        _transition_tables[key] = TransitionTable(walls)
+    return _transition_tables[key]
+
+
+class SonarModel:
+    """
+    The probabilities of noisy distance readings, as a table indexed by
+    (noisy distance - true distance) - offset.  The table covers a range of
+    differences far wider than the sonar noise; readings outside it are
+    clipped to the ends, which have zero probability.
+    """
+
+    def __init__(self, game_state):
+        walls = game_state.get_walls()
+        self.offset = -2 * (walls.width + walls.height)
+        self.probs = numpy.array([float(game_state.get_distance_prob(0, difference))
+                                  for difference in range(self.offset, 1 - self.offset)])
+
+    def likelihoods(self, noisy_distance, true_distances):
+        "Returns the probability of noisy_distance for each of an array of true distances"
+        differences = numpy.clip(noisy_distance - true_distances - self.offset, 0, len(self.probs) - 1)
+        return self.probs[differences]
+
+
+class VectorizedExactInference(InferenceModule):
+    """
+    ExactInference with the beliefs held in a NumPy vector over the legal
+    positions.  elapse_time is a sparse matrix-vector product with the
+    maze's TransitionTable and observe multiplies by a sonar likelihood
+    vector looked up from the true distances to the observer, so neither
+    copies the game state or builds per-position objects.
+
+    Every update adds and normalizes in the same order as ExactInference,
+    so the beliefs (and most likely positions) are exactly the same.
+    """
+
+    def __init__(self, opponent_agent_index, distancer, game_state):
+        if not _NUMPY_ENABLED:
+            raise Exception("VectorizedExactInference requires numpy")
+        self.table = get_transition_table(game_state.get_walls())
+        self.sonar = SonarModel(game_state)
+        InferenceModule.__init__(self, opponent_agent_index, distancer, game_state)
+
+    def observe_exact(self, position, game_state):
+        self.belief = numpy.zeros(len(self.table.cells))
+        index = self.table.cell_index[position]
+        self.belief[index] = 1.0
+        # cells in the order the equivalent util.Counter would hold them
+        self.support = numpy.array([index])
+        self.record_possible_captures(position, game_state)
+
+    def observe(self, observation, game_state, observer):
+        """
+        Updates beliefs based on the distance observation and Pacman's position.
+
+        The noisy_distance is the estimated Manhattan distance to the 
+        opponent being tracked
+        """
+        if not (self.belief > 0).any():
+            # THIS SHOULD NOT HAPPEN
+            print ("***************ALERT: ALL ZEROS********************", self.index)
+            # but just in case, we will assume it was because opponent was eaten
+            # and we somehow missed that
+            self.observe_exact(self.get_initial_position(game_state), game_state)
+            return
+
+        if self.check_eaten(game_state):
+            return
+
+        true_distances = self.table.distances_from(game_state.get_agent_position(observer))
+        support = numpy.flatnonzero(self.belief > 0)
+        values = self.sonar.likelihoods(observation, true_distances[support]) * self.belief[support]
+        total = sum(values.tolist())
+        if total != 0:
+            values = values / total
+        self.belief = numpy.zeros(len(self.table.cells))
+        self.belief[support] = values
+        self.support = support
+
+    def elapse_time(self, game_state):
+        """
+        Update the beliefs in response to a time step passing from the current
+        state.
+        """
+        table = self.table
+        contributions = numpy.append(table.inv_degree * self.belief, 0.0)
+        belief = contributions[table.sources[:, 0]]
+        for column in range(1, table.sources.shape[1]):
+            belief = belief + contributions[table.sources[:, column]]
+        total = sum(belief[table.order].tolist())
+        if total != 0:
+            belief = belief / total
+        self.belief = belief
+        self.support = table.order
+
+    def get_belief_distribution(self):
+        cells = self.table.cells
+        return util.Counter(zip([cells[i] for i in self.support], self.belief[self.support].tolist()))
+
+    def get_most_likely_position(self):
+        if len(self.support) == 0:
+            return None
+        return self.table.cells[self.support[numpy.argmax(self.belief[self.support])]]
+
+    beliefs = property(get_belief_distribution)
+
+
+class ParticleFilterInference(InferenceModule):
+    """
+    Approximate inference that tracks a fixed number of particles (possible
+    opponent positions, held as an array of cell indices) instead of a
+    probability for every legal position.  Each turn costs time in
+    proportion to num_particles rather than to the size of the maze, so
+    num_particles trades accuracy against speed.
+
+    The particles are moved with the same motion model as ExactInference
+    (each legal action, including stopping, equally likely) and resampled in
+    proportion to the likelihood of each sonar reading.  Random numbers come
+    from a generator seeded from the random module, so games with a fixed
+    seed are still reproducible.
+    """
+
+    def __init__(self, opponent_agent_index, distancer, game_state, num_particles=300):
+        if not _NUMPY_ENABLED:
+            raise Exception("ParticleFilterInference requires numpy")
+        self.num_particles = num_particles
+        self.table = get_transition_table(game_state.get_walls())
+        self.sonar = SonarModel(game_state)
+        self.random = numpy.random.RandomState(random.randrange(2 ** 32))
+        InferenceModule.__init__(self, opponent_agent_index, distancer, game_state)
+
+    def observe_exact(self, position, game_state):
+        self.particles = numpy.full(self.num_particles, self.table.cell_index[position])
+        self.record_possible_captures(position, game_state)
+
+    def initialize_uniformly(self, weights=None):
+        """
+        Spreads the particles over the legal positions, in proportion to
+        weights (one per legal position) if given.
+        """
+        if weights is None:
+            weights = numpy.ones(len(self.table.cells))
+        self.particles = self.resample(numpy.arange(len(self.table.cells)), weights)
+
+    def resample(self, particles, weights):
+        """
+        Returns num_particles particles drawn from particles in proportion to
+        weights (low variance systematic resampling).
+        """
+        cumulative = numpy.cumsum(weights)
+        points = (self.random.random_sample() + numpy.arange(self.num_particles)) \
+            * (cumulative[-1] / self.num_particles)
+        chosen = numpy.minimum(numpy.searchsorted(cumulative, points, side='right'), len(particles) - 1)
+        return particles[chosen]
+
+    def observe(self, observation, game_state, observer):
+        """
+        Reweights and resamples the particles by the likelihood of the noisy
+        distance observation from the observer's position.
+
+        If no particle is consistent with the observation the opponent must
+        have been eaten (or has gone somewhere the particles missed), so the
+        particles are spread over every position consistent with it.
+        """
+        if self.check_eaten(game_state):
+            return
+
+        true_distances = self.table.distances_from(game_state.get_agent_position(observer))
+        weights = self.sonar.likelihoods(observation, true_distances[self.particles])
+        if weights.sum() > 0:
+            self.particles = self.resample(self.particles, weights)
+            return
+
+        weights = self.sonar.likelihoods(observation, true_distances)
+        if weights.sum() > 0:
+            self.initialize_uniformly(weights)
+        else:
+            self.initialize_uniformly()
+
+    def elapse_time(self, game_state):
+        "Moves every particle by a random legal action."
+        degree = self.table.degree[self.particles]
+        moves = (self.random.random_sample(self.num_particles) * degree).astype(int)
+        self.particles = self.table.targets[self.particles, moves]
+
+    def get_belief_distribution(self):
+        counts = numpy.bincount(self.particles, minlength=len(self.table.cells)).tolist()
+        beliefs = util.Counter()
+        for cell, count in zip(self.table.cells, counts):
+            if count > 0:
+                beliefs[cell] = count / float(self.num_particles)
+        return beliefs
+
+    def get_most_likely_position(self):
+        counts = numpy.bincount(self.particles, minlength=len(self.table.cells))
+        return self.table.cells[int(numpy.argmax(counts))]
@@ -20,9 +20,16 @@ Pieter Abbeel (pabbeel@cs.berkeley.edu).
 import sys
 import inspect
 import heapq
+import operator
 import random
 import io
 
+try:
+    import numpy
+    _NUMPY_ENABLED = True
+except ImportError:
+    _NUMPY_ENABLED = False
+
 
 class FixedRandom:
     def __init__(self):
@@ -444,6 +451,330 @@ class Counter(dict):
         return addend
 
 
+class FastCounter(Counter):
+    """
+    A Counter for hot numeric code.  It has the same interface as Counter
+    (and is one, so it can be passed wherever a Counter is expected), but
+    reading a missing key returns 0 without inserting it, and arg_max,
+    normalize and the arithmetic operators make a single pass over the
+    keys.  Results are the same as Counter's, including the order in
+    which floats are added.
+
+    >>> a = FastCounter()
+    >>> a['test']
+    0
+    >>> 'test' in a
+    False
+    >>> a['test'] += 2
+    >>> a['test']
+    2
+    """
+    __getitem__ = dict.__getitem__
+
+    def __missing__(self, key):
+        return 0
+
+    def arg_max(self):
+        """
+        Returns the key with the highest value (the first one if several
+        share it).
+        """
+        if len(self) == 0:
+            return None
+        return max(self, key=self.get)
+
+    def normalize(self):
+        total = float(self.total_count())
+        if total == 0:
+            return
+        for key, value in list(self.items()):
+            self[key] = value / total
+
+    def copy(self):
+        return FastCounter(self)
+
+    def __mul__(self, y):
+        """
+        The dot product of two counters (or a counter and a dictionary).
+
+        >>> a = FastCounter({'first': -2, 'second': 4, 'third': 1.5})
+        >>> a * {'first': 3, 'second': 5}
+        14
+        """
+        sum = 0
+        x = self
+        if len(x) > len(y):
+            x, y = y, x
+        for key, value in x.items():
+            if key in y:
+                sum += value * y[key]
+        return sum
+
+    def __radd__(self, y):
+        for key, value in list(y.items()):
+            self[key] += value
+
+    def __add__(self, y):
+        addend = FastCounter(self)
+        for key, value in y.items():
+            if key in self:
+                addend[key] = self[key] + value
+            else:
+                addend[key] = value
+        return addend
+
+    def __sub__(self, y):
+        addend = FastCounter(self)
+        for key, value in y.items():
+            if key in self:
+                addend[key] = self[key] - value
+            else:
+                addend[key] = -1 * value
+        return addend
+
+
+# name -> position dictionaries of the FeatureVector schemas in use
+_feature_indices = {}
+
+
+class FeatureVector:
+    """
+    A dense vector of numbers over a fixed, ordered tuple of feature names
+    (its schema), with the numeric interface of Counter.  Values live in a
+    plain list, so vectors of the same schema are multiplied or added
+    position by position without hashing any keys.
+
+    Every feature in the schema is present (starting at 0), reading a name
+    outside the schema returns 0 without changing anything, and setting
+    one raises an exception.
+
+    The gain is in products with another FeatureVector of the same schema
+    (a weight vector made once) and in arg_max, total_count and normalize.
+    A product with a dictionary of weights still looks each feature up by
+    name, and is no faster than FastCounter's.
+
+    >>> names = ('first', 'second', 'third')
+    >>> a = FeatureVector(names, [-2, 4, 1])
+    >>> b = FeatureVector(names)
+    >>> b['first'] = 3
+    >>> b['second'] = 5
+    >>> a * b
+    14
+    >>> a * {'first': 3, 'second': 5}
+    14
+    >>> a['unknown']
+    0
+
+    The values can be any sequence, including a row of a NumPy array (with
+    numpy installed):
+
+    >>> import numpy
+    >>> FeatureVector(names, numpy.array([1.0, 0.0, 2.0])) * b
+    3.0
+    """
+    __slots__ = ('names', 'index', 'data')
+
+    def __init__(self, names, data=None):
+        names = tuple(names)
+        index = _feature_indices.get(names)
+        if index == None:
+            index = _feature_indices[names] = dict((name, i) for i, name in enumerate(names))
+        self.names = names
+        self.index = index
+        # "is None" rather than "== None", since data may be a NumPy array
+        if data is None:
+            self.data = [0] * len(names)
+        else:
+            if len(data) != len(names):
+                raise Exception('A FeatureVector needs one value per feature')
+            if _NUMPY_ENABLED and isinstance(data, numpy.ndarray):
+                data = data.tolist()
+            self.data = list(data)
+
+    def __getitem__(self, name):
+        i = self.index.get(name)
+        if i == None:
+            return 0
+        return self.data[i]
+
+    def __setitem__(self, name, value):
+        i = self.index.get(name)
+        if i == None:
+            raise Exception('Unknown feature ' + str(name))
+        self.data[i] = value
+
+    def get(self, name, default=None):
+        i = self.index.get(name)
+        if i == None:
+            return default
+        return self.data[i]
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def keys(self):
+        return list(self.names)
+
+    def values(self):
+        return list(self.data)
+
+    def items(self):
+        return list(zip(self.names, self.data))
+
+    def __eq__(self, other):
+        return isinstance(other, FeatureVector) and self.names == other.names and self.data == other.data
+
+    def __repr__(self):
+        return 'FeatureVector(%r, %r)' % (self.names, self.data)
+
+    def copy(self):
+        vector = FeatureVector.__new__(FeatureVector)
+        vector.names = self.names
+        vector.index = self.index
+        vector.data = self.data[:]
+        return vector
+
+    def arg_max(self):
+        """
+        Returns the feature with the highest value (the first one if several
+        share it).
+        """
+        if len(self.names) == 0:
+            return None
+        return self.names[self.data.index(max(self.data))]
+
+    def total_count(self):
+        return sum(self.data)
+
+    def normalize(self):
+        total = float(self.total_count())
+        if total == 0:
+            return
+        self.data = [value / total for value in self.data]
+
+    def divide_all(self, divisor):
+        divisor = float(divisor)
+        self.data = [value / divisor for value in self.data]
+
+    def same_schema(self, other):
+        return isinstance(other, FeatureVector) and (other.names is self.names or other.names == self.names)
+
+    def __mul__(self, y):
+        """
+        The dot product with another FeatureVector, or with a Counter or
+        dictionary of weights by feature name.
+        """
+        if self.same_schema(y):
+            return sum(map(operator.mul, self.data, y.data))
+        total = 0
+        for name, value in zip(self.names, self.data):
+            if name in y:
+                total += value * y[name]
+        return total
+
+    def __add__(self, y):
+        if not self.same_schema(y):
+            raise Exception('Only FeatureVectors with the same features can be added')
+        return FeatureVector(self.names, [a + b for a, b in zip(self.data, y.data)])
+
+    def __sub__(self, y):
+        if not self.same_schema(y):
+            raise Exception('Only FeatureVectors with the same features can be subtracted')
+        return FeatureVector(self.names, [a - b for a, b in zip(self.data, y.data)])
+
+
+class FeatureSchema:
+    """
+    Fixed slots for a named set of features.  A linear evaluation function
+    can write the features of each of many candidates (actions, or states)
+    straight into the rows of one matrix by slot number, and then score
+    every candidate against one weight vector, instead of building and
+    dotting a Counter per candidate.
+
+    Schemas are made with register_feature_schema.  The matrix is a list of
+    lists: the batches are a handful of actions or rollouts wide, which is
+    too few for NumPy to make up for the cost of creating its arrays.
+    """
+
+    def __init__(self, name, feature_names):
+        self.name = name
+        self.names = tuple(feature_names)
+        self.index = dict((feature, i) for i, feature in enumerate(self.names))
+        # the weights last given to evaluate_all and their weight_vector
+        self._weights = None
+        self._weight_vector = None
+
+    def slot(self, feature):
+        "Returns the column of feature in this schema's rows"
+        return self.index[feature]
+
+    def new_matrix(self, rows):
+        "Returns a zeroed feature matrix with the given number of rows"
+        return [[0] * len(self.names) for row in range(rows)]
+
+    def weight_vector(self, weights):
+        """
+        Returns the weights (a dictionary or Counter by feature name) as a
+        vector over the slots.  Weights of features not in the schema are
+        ignored, as they are in a Counter product.
+        """
+        return [weights.get(feature, 0) for feature in self.names]
+
+    def score(self, matrix, weight_vector):
+        "Returns the list of each row of matrix dotted with weight_vector"
+        return [sum(map(operator.mul, row, weight_vector)) for row in matrix]
+
+    def evaluate_all(self, fill_features, items, weights):
+        """
+        Calls fill_features(row, item) to write the features of each item
+        into its own row, and returns the score of every item under weights.
+
+        The weight vector is only rebuilt when weights is a different object
+        from the last call, so fixed weights (a class attribute, say) are
+        looked up by name once; change weights by replacing the dictionary
+        rather than editing it in place.
+        """
+        matrix = self.new_matrix(len(items))
+        for row, item in zip(matrix, items):
+            fill_features(row, item)
+        if weights is not self._weights:
+            self._weight_vector = self.weight_vector(weights)
+            self._weights = weights
+        return self.score(matrix, self._weight_vector)
+
+    def vector(self, row):
+        "Returns a FeatureVector of one row of features"
+        return FeatureVector(self.names, row)
+
+
+# FeatureSchemas by name
+_feature_schemas = {}
+
+
+def register_feature_schema(name, feature_names):
+    """
+    Returns the FeatureSchema called name for feature_names, making it the
+    first time.  Registering a name again (say when a team module is loaded
+    for both sides) returns the same schema, as long as the features agree.
+    """
+    schema = _feature_schemas.get(name)
+    if schema == None:
+        schema = _feature_schemas[name] = FeatureSchema(name, feature_names)
+    elif schema.names != tuple(feature_names):
+        raise Exception('Feature schema ' + name + ' is already registered with different features')
+    return schema
+
+
+def get_feature_schema(name):
+    return _feature_schemas[name]
+
+
 def raise_not_defined():
     file_name = inspect.stack()[1][1]
     line = inspect.stack()[1][2]
@@ -624,6 +955,7 @@ def pause():
 #
 import signal
 import time
+import threading
 
 
 class TimeoutFunctionException(Exception):
@@ -632,6 +964,18 @@ class TimeoutFunctionException(Exception):
 
 
 class TimeoutFunction:
+    """
+    Wraps function so that calling it raises TimeoutFunctionException once
+    it has run for timeout seconds (which need not be a whole number).
+
+    In the main thread of a platform with SIGALRM an interval timer
+    interrupts the function when the time is up.  Signals can only be
+    handled by the main thread, so anywhere else the function runs to the
+    end and the exception is raised afterwards if it took too long.
+    Agents in worker processes (see agent_sandbox.py) are timed without
+    either.
+    """
+
     def __init__(self, function, timeout):
         self.timeout = timeout
         self.function = function
@@ -640,17 +984,16 @@ class TimeoutFunction:
         raise TimeoutFunctionException()
 
     def __call__(self, *args, **key_args):
-        # If we have SIGALRM signal, use it to cause an exception if and
-        # when this function runs too long.  Otherwise check the time taken
-        # after the method has returned, and throw an exception then.
-        if hasattr(signal, 'SIGALRM'):
+        if hasattr(signal, 'SIGALRM') and threading.current_thread() is threading.main_thread():
+            if self.timeout <= 0:
+                self.handle_timeout(None, None)
             old = signal.signal(signal.SIGALRM, self.handle_timeout)
-            signal.alarm(self.timeout)
+            signal.setitimer(signal.ITIMER_REAL, self.timeout)
             try:
                 result = self.function(*args, **key_args)
             finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
                 signal.signal(signal.SIGALRM, old)
-            signal.alarm(0)
         else:
             start_time = time.time()
             result = self.function(*args, **key_args)